@@ -0,0 +1 @@
+"""Benchmarks of cornice_swagger, run with ``python -m benchmarks``."""
@@ -0,0 +1,135 @@
+"""Synthetic Cornice applications documented by the benchmarks."""
+
+import colander
+from cornice import Service
+from cornice.validators import colander_validator
+from pyramid.config import Configurator
+
+
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+"""Methods given to the services, in this order."""
+
+
+def build_schema(name, depth, width, enum_size):
+    """
+    Build a mapping schema class with fields of various types.
+
+    :param name:
+        Name of the class, fields are also prefixed with it so schemas of
+        different services differ.
+    :param depth:
+        Nesting levels of mappings, the first field of each level holding the
+        next one.
+    :param width:
+        Number of fields of each level.
+    :param enum_size:
+        Number of choices of the string fields, no choices if 0.
+
+    :rtype: type
+    """
+    attributes = {}
+    choices = ["{}_choice_{}".format(name.lower(), i) for i in range(enum_size)]
+    for index in range(width):
+        field = "{}_{}".format(name.lower(), index)
+        kind = index % 5
+        if index == 0 and depth > 1:
+            node = build_schema(name + "Child", depth - 1, width, enum_size)()
+        elif kind == 1:
+            validator = colander.OneOf(choices) if choices else None
+            node = colander.SchemaNode(
+                colander.String(), validator=validator, description="Field " + field
+            )
+        elif kind == 2:
+            node = colander.SchemaNode(
+                colander.Integer(), validator=colander.Range(0, 100), missing=0
+            )
+        elif kind == 3:
+            node = colander.SequenceSchema(colander.SchemaNode(colander.String()))
+        else:
+            node = colander.SchemaNode(colander.DateTime(), missing=colander.drop)
+        attributes[field] = node
+    return type(name, (colander.MappingSchema,), attributes)
+
+
+def build_services(services=100, methods=3, depth=3, width=6, enum_size=10):
+    """
+    Build cornice services with colander request and response schemas.
+
+    :param services:
+        Number of services.
+    :param methods:
+        Number of views of each service, see `METHODS`.
+    :param depth:
+        Nesting levels of the body schemas.
+    :param width:
+        Number of fields of each level of the body schemas.
+    :param enum_size:
+        Number of choices of the string fields.
+
+    :rtype: list
+    """
+
+    class PaginationSchema(colander.MappingSchema):
+        limit = colander.SchemaNode(colander.Integer(), missing=20)
+        offset = colander.SchemaNode(colander.Integer(), missing=0)
+
+    class ErrorSchema(colander.MappingSchema):
+        code = colander.SchemaNode(colander.Integer())
+        message = colander.SchemaNode(colander.String())
+
+    class NotFoundResponseSchema(colander.MappingSchema):
+        body = ErrorSchema()
+
+    result = []
+    for index in range(services):
+        name = "Resource{}".format(index)
+        body_schema = build_schema(name, depth, width, enum_size)
+        service = Service(name.lower(), "/resources{}/{{id}}".format(index))
+
+        for method in METHODS[:methods]:
+            attributes = {"querystring": PaginationSchema()}
+            if method in ("POST", "PUT", "PATCH"):
+                attributes["body"] = body_schema()
+            request_schema = type(name + method.title(), (colander.MappingSchema,), attributes)
+            response_schema = type(
+                name + "ResponseSchema", (colander.MappingSchema,), {"body": body_schema()}
+            )
+            service.add_view(
+                method,
+                view,
+                validators=(colander_validator,),
+                schema=request_schema(),
+                response_schemas={
+                    "200": response_schema(description="Ok"),
+                    "404": NotFoundResponseSchema(description="Not found"),
+                },
+                tags=["resources{}".format(index % 10)],
+            )
+        result.append(service)
+    return result
+
+
+def view(request):
+    return {}
+
+
+def make_app(services, **spec_kwargs):
+    """
+    Build a pyramid application serving some services along with the
+    OpenAPI document and the API explorer.
+
+    :param services:
+        Cornice services of the application.
+    :param spec_kwargs:
+        Arguments given to `cornice_enable_openapi_view`.
+
+    :returns: WSGI application.
+    """
+    config = Configurator(settings={})
+    config.include("cornice")
+    config.include("cornice_swagger")
+    for service in services:
+        config.add_cornice_service(service)
+    config.cornice_enable_openapi_view(**spec_kwargs)
+    config.cornice_enable_openapi_explorer()
+    return config.make_wsgi_app()
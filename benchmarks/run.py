@@ -0,0 +1,358 @@
+"""Benchmarks of the generation and serving of OpenAPI documents.
+
+Each scenario builds a synthetic application and measures:
+
+* ``generate``: `CorniceSwagger.generate()` with a new generator,
+* ``regenerate``: `CorniceSwagger.generate()` with a generator caching the
+  fragments of all the services, as done by the OpenAPI JSON view,
+* ``spec_view``: the first request to the OpenAPI JSON view, generating,
+  encoding and compressing the document,
+* ``spec_view_cached``: next requests to the OpenAPI JSON view,
+* ``ui_view``: requests to the API explorer page.
+
+Run ``python -m benchmarks`` from the repository root. Results are compared
+to ``benchmarks/baseline.json`` and the run fails when the best time, the
+peak memory or the number of allocated memory blocks of a benchmark exceeds
+its baseline times the threshold of the metric. Fast benchmarks are called
+several times per timing, so that each timing lasts at least `MIN_TIMING`.
+Timings depend on the machine, record a local baseline with ``--save`` before
+comparing.
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from cornice.service import clear_services
+from webob import Request
+
+from benchmarks.app import build_services, make_app
+from cornice_swagger import CorniceSwagger
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SCENARIOS = {
+    "small": dict(services=20, methods=2, depth=2, width=4, enum_size=5),
+    "large": dict(services=200, methods=3, depth=3, width=6, enum_size=10),
+    "deep": dict(services=50, methods=3, depth=8, width=4, enum_size=5),
+    "enums": dict(services=50, methods=3, depth=2, width=6, enum_size=500),
+    "refs": dict(
+        services=100,
+        methods=3,
+        depth=3,
+        width=6,
+        enum_size=10,
+        def_ref_depth=-1,
+        param_ref=True,
+        resp_ref=True,
+    ),
+}
+"""Arguments of `build_services` and of `CorniceSwagger` by scenario name."""
+
+GENERATOR_ARGUMENTS = ("def_ref_depth", "param_ref", "resp_ref")
+
+METRICS = ("time", "peak_memory", "allocated_blocks")
+"""Metrics compared to the baseline."""
+
+MIN_TIMING = 0.1
+"""Seconds each timing should last at least, fast benchmarks are called
+several times per timing so timer and scheduling noise stays small."""
+
+
+def measure(func, repeat, min_timing=MIN_TIMING):
+    """
+    Measure a function.
+
+    :param func:
+        Function called without arguments.
+    :param repeat:
+        Number of timings.
+    :param min_timing:
+        Seconds each timing should last at least, the number of calls per
+        timing is computed from a first untimed call.
+
+    :rtype: dict
+    :returns: Best and median wall time of a call in seconds, number of
+        memory blocks allocated by an additional call and still alive after
+        it, e.g. its result, and peak and retained memory in bytes of another
+        traced call.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    number = max(1, math.ceil(min_timing / (time.perf_counter() - start)))
+
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    times.sort()
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    result = func()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+
+    return {
+        "time": times[0],
+        "median_time": times[len(times) // 2],
+        "peak_memory": peak - before,
+        "retained_memory": current - before,
+        "allocated_blocks": blocks,
+    }
+
+
+def run_scenario(arguments, repeat):
+    """
+    Build the application of a scenario and run its benchmarks.
+
+    :param arguments:
+        Arguments of `build_services` and of `CorniceSwagger`.
+    :param repeat:
+        Number of timed calls of each benchmark.
+
+    :rtype: dict
+    :returns: Measures indexed by benchmark name.
+    """
+    arguments = dict(arguments)
+    generator_kwargs = {
+        name: arguments.pop(name) for name in GENERATOR_ARGUMENTS if name in arguments
+    }
+    services = build_services(**arguments)
+    spec_kwargs = dict(title="Benchmark", version="1.0")
+    app = make_app(services, **spec_kwargs)
+    registry = app.registry
+
+    def generate():
+        return CorniceSwagger(services, **generator_kwargs).generate(**spec_kwargs)
+
+    cached_generator = CorniceSwagger(services, **generator_kwargs)
+    cached_generator.cache_fragments = True
+    cached_generator.generate(**spec_kwargs)
+
+    def regenerate():
+        return cached_generator.generate(**spec_kwargs)
+
+    def get(path):
+        response = Request.blank(path).get_response(app)
+        assert response.status_code == 200, response.status
+        return response
+
+    def spec_view():
+        # a new cache converts all services again
+        del registry.cornice_swagger_spec_cache
+        return get("/api-explorer/swagger.json")
+
+    def spec_view_cached():
+        return get("/api-explorer/swagger.json")
+
+    def ui_view():
+        return get("/api-explorer")
+
+    try:
+        spec_view_cached()
+        return {
+            "generate": measure(generate, repeat),
+            "regenerate": measure(regenerate, repeat),
+            "spec_view": measure(spec_view, repeat),
+            "spec_view_cached": measure(spec_view_cached, repeat),
+            "ui_view": measure(ui_view, repeat),
+        }
+    finally:
+        clear_services()
+
+
+def compare(results, baseline, thresholds):
+    """
+    Compare results to a baseline.
+
+    :param results:
+        Measures indexed by scenario and benchmark names.
+    :param baseline:
+        Baseline measures, with the same layout.
+    :param thresholds:
+        Ratio to the baseline above which a measure is a regression, indexed
+        by metric, see `METRICS`.
+
+    :rtype: list
+    :returns: ``(scenario, benchmark, metric, ratio)`` tuples of the
+        regressions.
+    """
+    regressions = []
+    for scenario, benchmarks in results.items():
+        for benchmark, measures in benchmarks.items():
+            reference = baseline.get(scenario, {}).get(benchmark)
+            if reference is None:
+                continue
+            for metric, threshold in thresholds.items():
+                if not reference.get(metric):
+                    continue
+                ratio = measures[metric] / reference[metric]
+                if ratio > threshold:
+                    regressions.append((scenario, benchmark, metric, ratio))
+    return regressions
+
+
+def format_results(results, baseline):
+    """Format results as a table, with their ratio to the baseline."""
+    lines = [
+        "{:<10} {:<18} {:>12} {:>8} {:>12} {:>8} {:>8} {:>8}".format(
+            "scenario", "benchmark", "time (ms)", "ratio", "peak (KiB)", "ratio", "blocks", "ratio"
+        )
+    ]
+    for scenario, benchmarks in results.items():
+        for benchmark, measures in benchmarks.items():
+            reference = baseline.get(scenario, {}).get(benchmark, {})
+            ratios = []
+            for metric in METRICS:
+                if reference.get(metric):
+                    ratios.append("{:.2f}".format(measures[metric] / reference[metric]))
+                else:
+                    ratios.append("-")
+            lines.append(
+                "{:<10} {:<18} {:>12.3f} {:>8} {:>12.1f} {:>8} {:>8} {:>8}".format(
+                    scenario,
+                    benchmark,
+                    measures["time"] * 1000,
+                    ratios[0],
+                    measures["peak_memory"] / 1024,
+                    ratios[1],
+                    measures["allocated_blocks"],
+                    ratios[2],
+                )
+            )
+    return "\n".join(lines)
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fp:
+        return json.load(fp)["results"]
+
+
+def save_baseline(path, results):
+    baseline = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w") as fp:
+        json.dump(baseline, fp, indent=2, sort_keys=True)
+        fp.write("\n")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark the generation and serving of OpenAPI documents.",
+    )
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=10, help="timings per benchmark (default: 10)"
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="ratio of the best time to the baseline failing the run (default: 1.5)",
+    )
+    parser.add_argument(
+        "-m",
+        "--memory-threshold",
+        type=float,
+        default=1.25,
+        help=(
+            "ratio of the peak memory and of the allocated blocks to the baseline "
+            "failing the run (default: 1.25)"
+        ),
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE, help="baseline file (default: benchmarks/baseline.json)"
+    )
+    parser.add_argument("--save", action="store_true", help="save the results as baseline")
+    parser.add_argument("-o", "--output", help="also write the results to this JSON file")
+
+    custom = parser.add_argument_group(
+        "custom scenario", "run a single scenario built with these arguments instead"
+    )
+    custom.add_argument("--services", type=int)
+    custom.add_argument("--methods", type=int)
+    custom.add_argument("--depth", type=int)
+    custom.add_argument("--width", type=int)
+    custom.add_argument("--enum-size", type=int)
+    custom.add_argument("--def-ref-depth", type=int)
+    custom.add_argument("--param-ref", action="store_true", default=None)
+    custom.add_argument("--resp-ref", action="store_true", default=None)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    custom = {
+        name: getattr(args, name) for name in SCENARIOS["refs"] if getattr(args, name) is not None
+    }
+    if custom:
+        scenarios = {"custom": dict(SCENARIOS["large"], **custom)}
+    else:
+        names = args.scenario or list(SCENARIOS)
+        scenarios = {name: SCENARIOS[name] for name in names}
+
+    results = {}
+    for name, arguments in scenarios.items():
+        print("Running {}...".format(name), file=sys.stderr)
+        results[name] = run_scenario(arguments, args.repeat)
+
+    baseline = load_baseline(args.baseline)
+    print(format_results(results, baseline))
+
+    if args.output:
+        save_baseline(args.output, results)
+    if args.save:
+        save_baseline(args.baseline, dict(baseline, **results))
+        print("Saved baseline to {}".format(args.baseline))
+        return 0
+
+    thresholds = {
+        "time": args.threshold,
+        "peak_memory": args.memory_threshold,
+        "allocated_blocks": args.memory_threshold,
+    }
+    regressions = compare(results, baseline, thresholds)
+    for scenario, benchmark, metric, ratio in regressions:
+        print(
+            "Regression: {} {} {} is {:.2f} times the baseline".format(
+                scenario, benchmark, metric, ratio
+            )
+        )
+    return 1 if regressions else 0
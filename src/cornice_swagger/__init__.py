@@ -1,6 +1,13 @@
+import warnings
+
+from pyramid.events import ApplicationCreated
+from pyramid.exceptions import ConfigurationError
 from pyramid.security import NO_PERMISSION_REQUIRED
 
+from cornice_swagger.assets import UIAssets, default_ui_assets_path
+from cornice_swagger.cache import SpecFile, get_spec_cache, preload_shared_spec, warm_spec_cache
 from cornice_swagger.swagger import CorniceSwagger
+from cornice_swagger.views import get_swagger_ui_script_generator
 
 
 __author__ = """Josip Delic"""
@@ -11,10 +18,27 @@ __version__ = "0.3.0"
 __all__ = ["CorniceSwagger"]
 
 
+VIEW_OPTIONS = ("response_schemas", "tags", "operation_id", "api_security")
+"""Documentation-only arguments of cornice views."""
+
+
+def openapi_view_options(view, info):
+    """View deriver accepting `VIEW_OPTIONS` as view options. They are read
+    from the cornice services by `CorniceSwagger`, so views are returned
+    unchanged and requests don't evaluate anything."""
+    return view
+
+
+openapi_view_options.options = VIEW_OPTIONS
+
+
 class CorniceSwaggerPredicate(object):
-    """Predicate to add simple information to Cornice Swagger."""
+    """Deprecated predicate formerly registered for `VIEW_OPTIONS`, which
+    are now view options, see `openapi_view_options`."""
 
     def __init__(self, schema, config):
+        message = "CorniceSwaggerPredicate is deprecated, view options are used instead"
+        warnings.warn(message, DeprecationWarning)
         self.schema = schema
 
     def phash(self):
@@ -26,10 +50,7 @@ class CorniceSwaggerPredicate(object):
 
 def includeme(config):
     # Custom view parameters
-    config.add_view_predicate("response_schemas", CorniceSwaggerPredicate)
-    config.add_view_predicate("tags", CorniceSwaggerPredicate)
-    config.add_view_predicate("operation_id", CorniceSwaggerPredicate)
-    config.add_view_predicate("api_security", CorniceSwaggerPredicate)
+    config.add_view_deriver(openapi_view_options)
     config.add_directive("cornice_enable_openapi_view", cornice_enable_openapi_view)
     config.add_directive("cornice_enable_openapi_explorer", cornice_enable_openapi_explorer)
 
@@ -39,6 +60,14 @@ def cornice_enable_openapi_view(
     api_path="/api-explorer/swagger.json",
     permission=NO_PERMISSION_REQUIRED,
     route_factory=None,
+    cache_control=None,
+    spec_file=None,
+    warm=False,
+    shards=None,
+    api_shards_path="/api-explorer/shards",
+    stream=False,
+    max_stale=0,
+    prefork=False,
     **kwargs,
 ):
     """
@@ -50,26 +79,103 @@ def cornice_enable_openapi_view(
         pyramid permission for those views
     :param route_factory:
         factory for context object for those routes
+    :param cache_control:
+        value of the `Cache-Control` header sent with the swagger JSON,
+        e.g. ``"public, max-age=300"``. Default sends none.
+    :param spec_file:
+        path of a swagger JSON definition pre-generated with the
+        ``cornice-swagger generate`` command, serving it directly from disk
+        without generating anything at runtime
+    :param warm:
+        generate the swagger JSON definition when the application is created
+        instead of on the first request, so generation errors fail at boot
+    :param shards:
+        also serve the swagger JSON definition split in smaller self-contained
+        documents, either ``"tags"`` for one document per tag or a list of
+        path prefixes for one document per prefix
+    :param api_shards_path:
+        where to expose the index of shards, each shard being exposed under
+        ``{api_shards_path}/{shard}.json``
+    :param stream:
+        generate the swagger JSON definition for each request and stream it
+        while services are converted instead of caching it, keeping memory
+        usage low for very large applications
+    :param max_stale:
+        seconds the last swagger JSON definition may still be served once
+        services or kwargs changed, while the new one is generated in a
+        background thread. Responses then carry an `Age` header. Default
+        waits for the new one
+    :param prefork:
+        generate the swagger JSON definition once when the application is
+        created and serve it from a memory mapping shared by the processes
+        forked afterwards, e.g. the workers of gunicorn with ``preload_app``.
+        Services added later are not documented
     :param kwargs:
         kwargs that will be passed to CorniceSwagger's `generate()`
 
     This registers and configures the view that serves api definitions
     """
     config.registry.settings["cornice_swagger.spec_kwargs"] = kwargs
+    config.registry.settings["cornice_swagger.spec_cache_control"] = cache_control
+    config.registry.settings["cornice_swagger.spec_shards"] = shards
+    config.registry.settings["cornice_swagger.spec_max_stale"] = max_stale
+    get_spec_cache(config.registry).invalidate()
     config.add_route("cornice_swagger.open_api_path", api_path, factory=route_factory)
+
+    if stream:
+        if spec_file is not None or shards or warm or prefork:
+            raise ConfigurationError(
+                "stream can't be used with spec_file, shards, warm or prefork"
+            )
+        view = "cornice_swagger.views.open_api_stream_view"
+    elif prefork:
+        if spec_file is not None or shards:
+            raise ConfigurationError("prefork can't be used with spec_file or shards")
+        view = "cornice_swagger.views.open_api_shared_view"
+        config.add_subscriber(preload_shared_spec, ApplicationCreated)
+    elif spec_file is not None:
+        if shards:
+            raise ConfigurationError("shards can't be served from a spec_file")
+        config.registry.cornice_swagger_spec_file = SpecFile(spec_file)
+        view = "cornice_swagger.views.open_api_file_view"
+    else:
+        view = "cornice_swagger.views.open_api_json_view"
+        if warm:
+            config.add_subscriber(warm_spec_cache, ApplicationCreated)
+
     config.add_view(
-        "cornice_swagger.views.open_api_json_view",
-        renderer="json",
+        view,
         permission=permission,
         route_name="cornice_swagger.open_api_path",
     )
 
+    if shards:
+        config.add_route("cornice_swagger.open_api_shards", api_shards_path, factory=route_factory)
+        config.add_route(
+            "cornice_swagger.open_api_shard",
+            # shards are named after tags, which may hold slashes
+            api_shards_path.rstrip("/") + "/{shard:.+}.json",
+            factory=route_factory,
+        )
+        config.add_view(
+            "cornice_swagger.views.open_api_shards_index_view",
+            permission=permission,
+            route_name="cornice_swagger.open_api_shards",
+        )
+        config.add_view(
+            "cornice_swagger.views.open_api_shard_view",
+            permission=permission,
+            route_name="cornice_swagger.open_api_shard",
+        )
+
 
 def cornice_enable_openapi_explorer(
     config,
     api_explorer_path="/api-explorer",
     permission=NO_PERMISSION_REQUIRED,
     route_factory=None,
+    ui_assets="cdn",
+    ui_assets_path=None,
     **kwargs,
 ):
     """
@@ -81,12 +187,39 @@ def cornice_enable_openapi_explorer(
         pyramid permission for those views
     :param route_factory:
         factory for context object for those routes
+    :param ui_assets:
+        where Swagger UI css and javascript files are loaded from, either
+        ``"cdn"`` (default) or ``"local"`` to serve them from this application
+        under `api_explorer_path` with content-hashed urls and immutable
+        caching headers
+    :param ui_assets_path:
+        directory holding the Swagger UI distribution files when serving them
+        locally, defaults to the one shipped by the `swagger-ui-bundle` package
 
     This registers and configures the view that serves api explorer
     """
+    if ui_assets not in ("cdn", "local"):
+        raise ConfigurationError("ui_assets should be either 'cdn' or 'local'")
+
+    get_swagger_ui_script_generator(config.registry)
     config.add_route("cornice_swagger.api_explorer_path", api_explorer_path, factory=route_factory)
     config.add_view(
         "cornice_swagger.views.swagger_ui_template_view",
         permission=permission,
         route_name="cornice_swagger.api_explorer_path",
     )
+
+    if ui_assets == "local":
+        config.registry.cornice_swagger_ui_assets = UIAssets(
+            ui_assets_path or default_ui_assets_path()
+        )
+        config.add_route(
+            "cornice_swagger.ui_asset",
+            api_explorer_path.rstrip("/") + "/assets/{filename}",
+            factory=route_factory,
+        )
+        config.add_view(
+            "cornice_swagger.views.swagger_ui_asset_view",
+            permission=permission,
+            route_name="cornice_swagger.ui_asset",
+        )
@@ -0,0 +1,216 @@
+"""Analysis of the size of OpenAPI documents."""
+
+import hashlib
+import heapq
+import json
+from collections import namedtuple
+
+from cornice_swagger.dedup import DEDUPLICATORS, dedup_document
+from cornice_swagger.shards import DEFAULT_SHARD, HTTP_METHODS
+
+
+RepeatedSubtree = namedtuple("RepeatedSubtree", ["pointer", "count", "size"])
+"""Value found several times in a document: JSON pointer of its first
+occurrence, number of occurrences and size of one occurrence."""
+
+
+def get_pointer(parent, key):
+    """Return the JSON pointer of the child of a value."""
+    return "{}/{}".format(parent, str(key).replace("~", "~0").replace("/", "~1"))
+
+
+class SizeReport(object):
+    """Size of an OpenAPI document, in bytes of compact JSON, broken down by
+    section, path, tag and definition, along with the values it repeats and
+    the bytes deduplication and description stripping would save.
+
+    Operations are counted in the size of each of their tags, operations
+    without tags under ``default``. Repeated values are reported when they
+    are larger than `min_size`, their occurrences inside a larger repeated
+    value being part of the larger one and not counted.
+    """
+
+    min_size = 128
+    """Size in bytes under which repeated values are not reported."""
+
+    def __init__(self, spec, min_size=None):
+        """
+        :param spec:
+            OpenAPI document, e.g. the output of `CorniceSwagger.generate`.
+        :param min_size:
+            Overrides `min_size`.
+        """
+
+        if min_size is not None:
+            self.min_size = min_size
+        self._encode = json.JSONEncoder(separators=(",", ":")).encode
+        self._sizes = {}
+        self._digests = {}
+        self._counts = {}
+        self.description_bytes = 0
+
+        self.total = self._measure(spec)
+        self.sections = {key: self._size(value) for key, value in spec.items()}
+        self.paths = {
+            path: self._size(path_obj) for path, path_obj in spec.get("paths", {}).items()
+        }
+        self.definitions = {
+            name: self._size(schema) for name, schema in spec.get("definitions", {}).items()
+        }
+        self.tags = {}
+        for path_obj in spec.get("paths", {}).values():
+            for method, op in path_obj.items():
+                if method not in HTTP_METHODS:
+                    continue
+                for tag in op.get("tags") or [DEFAULT_SHARD]:
+                    self.tags[tag] = self.tags.get(tag, 0) + self._size(op)
+
+        found = {}
+        self._find_repeated(spec, "#", found)
+        self.repeated = [RepeatedSubtree(*value) for value in found.values() if value[1] > 1]
+        self.repeated.sort(key=lambda subtree: -subtree.size * (subtree.count - 1))
+
+        document = dict(spec)
+        for cls in DEDUPLICATORS:
+            if cls.section in spec:
+                document[cls.section] = dict(spec[cls.section])
+        _, report = dedup_document(document, [cls({}) for cls in DEDUPLICATORS])
+        self.dedup_bytes = report.bytes_saved
+
+    @property
+    def repeated_bytes(self):
+        """Bytes taken by the occurrences of the repeated values after their
+        first one."""
+        return sum(subtree.size * (subtree.count - 1) for subtree in self.repeated)
+
+    def _size(self, value):
+        if isinstance(value, (dict, list)):
+            return self._sizes[id(value)]
+        return len(self._encode(value))
+
+    def _measure(self, value):
+        """Compute the size and digest of a value and its children."""
+        if isinstance(value, dict):
+            parts = []
+            size = 2 + max(len(value) - 1, 0)
+            for key, child in value.items():
+                encoded_key = self._encode(str(key))
+                child_size = self._measure(child)
+                size += len(encoded_key) + 1 + child_size
+                parts.append(encoded_key + ":" + self._digest(child))
+                if key == "description" and isinstance(child, str):
+                    self.description_bytes += len(encoded_key) + 1 + child_size
+                    self.description_bytes += 1 if len(value) > 1 else 0
+            parts.sort()
+            encoded = "{" + ",".join(parts) + "}"
+        elif isinstance(value, list):
+            size = 2 + max(len(value) - 1, 0)
+            size += sum(self._measure(child) for child in value)
+            encoded = "[" + ",".join(self._digest(child) for child in value) + "]"
+        else:
+            return len(self._encode(value))
+
+        value_digest = hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+        self._sizes[id(value)] = size
+        self._digests[id(value)] = value_digest
+        if size >= self.min_size:
+            self._counts[value_digest] = self._counts.get(value_digest, 0) + 1
+        return size
+
+    def _digest(self, value):
+        if isinstance(value, (dict, list)):
+            return self._digests[id(value)]
+        return self._encode(value)
+
+    def _find_repeated(self, value, pointer, found):
+        """Count the occurrences of the values found several times, skipping
+        the ones inside a larger repeated value."""
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            return
+
+        value_digest = self._digests[id(value)]
+        if self._counts.get(value_digest, 0) > 1:
+            if value_digest in found:
+                found[value_digest][1] += 1
+            else:
+                found[value_digest] = [pointer, 1, self._sizes[id(value)]]
+            return
+
+        for key, child in items:
+            self._find_repeated(child, get_pointer(pointer, key), found)
+
+    def top(self, n=10, by="paths"):
+        """
+        Return the largest entries of a breakdown.
+
+        :param n:
+            Number of entries.
+        :param by:
+            Either ``"sections"``, ``"paths"``, ``"tags"`` or
+            ``"definitions"``.
+
+        :rtype: list
+        :returns: ``(name, size)`` tuples, largest first.
+        """
+        return heapq.nlargest(n, getattr(self, by).items(), key=lambda item: item[1])
+
+    def as_dict(self):
+        """Return the report as a dict of plain values.
+
+        :rtype: dict
+        """
+        return {
+            "total": self.total,
+            "sections": dict(self.sections),
+            "paths": dict(self.paths),
+            "tags": dict(self.tags),
+            "definitions": dict(self.definitions),
+            "repeated": [subtree._asdict() for subtree in self.repeated],
+            "repeated_bytes": self.repeated_bytes,
+            "dedup_bytes": self.dedup_bytes,
+            "description_bytes": self.description_bytes,
+        }
+
+    def report(self, n=10):
+        """Format the largest entries of each breakdown as text."""
+        lines = ["Total: {} bytes".format(self.total)]
+        for by in ("sections", "paths", "tags", "definitions"):
+            lines.append("Largest {}:".format(by))
+            for name, size in self.top(n, by):
+                lines.append("  {:>10} {:>6.1%}  {}".format(size, size / self.total, name))
+        lines.append("Repeated values:")
+        lines.append("  {:>10} {:>6} {:>10}  {}".format("wasted", "count", "size", "pointer"))
+        for subtree in self.repeated[:n]:
+            lines.append(
+                "  {:>10} {:>6} {:>10}  {}".format(
+                    subtree.size * (subtree.count - 1),
+                    subtree.count,
+                    subtree.size,
+                    subtree.pointer,
+                )
+            )
+        lines.append("Savings:")
+        lines.append("  {:>10}  deduplication".format(self.dedup_bytes))
+        lines.append("  {:>10}  description stripping".format(self.description_bytes))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.report()
+
+
+def analyze_spec(spec, min_size=None):
+    """
+    Analyze the size of an OpenAPI document.
+
+    :param spec:
+        OpenAPI document, e.g. the output of `CorniceSwagger.generate`.
+    :param min_size:
+        Size in bytes under which repeated values are not reported.
+
+    :rtype: SizeReport
+    """
+    return SizeReport(spec, min_size)
@@ -0,0 +1,68 @@
+"""Swagger UI assets served from a local directory instead of a CDN."""
+
+import os
+
+from pyramid.exceptions import ConfigurationError
+
+from cornice_swagger.cache import PrecompressedBody
+
+
+try:
+    import swagger_ui_bundle
+except ImportError:
+    swagger_ui_bundle = None
+
+
+UI_ASSET_NAMES = ("swagger-ui.css", "swagger-ui-bundle.js", "swagger-ui-standalone-preset.js")
+"""Swagger UI distribution files needed by the explorer page."""
+
+UI_ASSET_CONTENT_TYPES = {".css": "text/css", ".js": "application/javascript"}
+
+
+class UIAsset(PrecompressedBody):
+    """Static Swagger UI file loaded once, served under a content-hashed name."""
+
+    def __init__(self, name, body):
+        """
+        :param name:
+            File name in the Swagger UI distribution, e.g. ``swagger-ui.css``.
+        :param body:
+            File contents.
+        """
+
+        root, ext = os.path.splitext(name)
+        content_type = UI_ASSET_CONTENT_TYPES.get(ext, "application/octet-stream")
+        super(UIAsset, self).__init__(body, content_type)
+        self.name = name
+        self.filename = "{}.{}{}".format(root, self.etag[:16], ext)
+
+
+class UIAssets(object):
+    """Set of Swagger UI assets indexed by their content-hashed file names."""
+
+    def __init__(self, path):
+        """
+        :param path:
+            Directory holding the Swagger UI distribution files.
+        """
+
+        self.by_name = {}
+        self.by_filename = {}
+        for name in UI_ASSET_NAMES:
+            with open(os.path.join(str(path), name), "rb") as asset_file:
+                asset = UIAsset(name, asset_file.read())
+            self.by_name[name] = asset
+            self.by_filename[asset.filename] = asset
+
+
+def default_ui_assets_path():
+    """Return the Swagger UI distribution directory of the `swagger-ui-bundle` package.
+
+    :raises ConfigurationError: when the package is not installed.
+    """
+    if swagger_ui_bundle is None:
+        raise ConfigurationError(
+            "Serving local Swagger UI assets requires the swagger-ui-bundle "
+            "package (pip install cornice_swagger[ui]) or an ui_assets_path."
+        )
+    return swagger_ui_bundle.swagger_ui_path
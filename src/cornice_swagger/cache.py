@@ -0,0 +1,606 @@
+"""Caching of the OpenAPI document served by the cornice_swagger views."""
+
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cornice.service
+
+import cornice_swagger
+from cornice_swagger.shards import split_spec
+
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+SPEC_KWARGS_SETTING = "cornice_swagger.spec_kwargs"
+SPEC_SHARDS_SETTING = "cornice_swagger.spec_shards"
+SPEC_MAX_STALE_SETTING = "cornice_swagger.spec_max_stale"
+
+logger = logging.getLogger(__name__)
+
+
+class EncodedVariants(object):
+    """Body available in several content codings, negotiated per request."""
+
+    identity = "identity"
+
+    encodings = {}
+    """Mapping of the available content codings to their variant."""
+
+    etag = None
+    """Content hash of the uncompressed body."""
+
+    def select_encoding(self, accept_encoding):
+        """Pick the variant to serve for an `Accept-Encoding` header.
+
+        :param accept_encoding:
+            `request.accept_encoding` of the incoming webob request.
+
+        :rtype: str
+        :returns: One of the available content codings or ``"identity"``.
+        """
+        if not accept_encoding:
+            return self.identity
+        offers = list(self.encodings) + [self.identity]
+        acceptable = accept_encoding.acceptable_offers(offers)
+        if not acceptable:
+            return self.identity
+        return acceptable[0][0]
+
+    def get_etag(self, encoding):
+        """Return the strong ETag of the variant for a content coding.
+
+        :rtype: str
+        """
+        if encoding == self.identity:
+            return self.etag
+        return "{}-{}".format(self.etag, encoding)
+
+
+class PrecompressedBody(EncodedVariants):
+    """Response body compressed once, ready to be served as is.
+
+    A gzip variant is always built, and a brotli one when the `brotli` package
+    is installed. The uncompressed body is only kept once a client asked for it.
+    """
+
+    brotli_quality = 6
+    """Brotli compression level, from 0 to 11. Levels above 9 compress
+    multi-megabyte documents in seconds instead of tenths of a second."""
+
+    def __init__(self, body, content_type):
+        """
+        :param body:
+            Uncompressed body.
+        :param content_type:
+            Content type the body is served with.
+        """
+
+        self.content_type = content_type
+        self.etag = hashlib.sha256(body).hexdigest()
+
+        self.encodings = {}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(
+                body, quality=self.brotli_quality, mode=brotli.MODE_TEXT
+            )
+        self.encodings["gzip"] = gzip.compress(body, mtime=0)
+        self._body = None
+
+    @property
+    def body(self):
+        """Uncompressed body.
+
+        :rtype: bytes
+        """
+        if self._body is None:
+            self._body = gzip.decompress(self.encodings["gzip"])
+        return self._body
+
+    def get_body(self, encoding):
+        """Return the body for a content coding.
+
+        :rtype: bytes
+        """
+        if encoding == self.identity:
+            return self.body
+        return self.encodings[encoding]
+
+
+class SpecDocument(PrecompressedBody):
+    """OpenAPI document encoded and compressed once."""
+
+    def __init__(self, spec):
+        """
+        :param spec:
+            OpenAPI document as returned by `CorniceSwagger.generate()`.
+        """
+
+        super(SpecDocument, self).__init__(encode_spec(spec), "application/json")
+
+
+class SharedSpecDocument(EncodedVariants):
+    """OpenAPI document encoded and compressed once into an anonymous shared
+    memory mapping.
+
+    Processes forked once it is built, e.g. the workers of a pre-forking
+    server, serve its variants from the same physical pages. The variants
+    are read-only memoryviews, never copied into Python objects.
+    """
+
+    content_type = "application/json"
+
+    def __init__(self, spec):
+        """
+        :param spec:
+            OpenAPI document as returned by `CorniceSwagger.generate()`.
+        """
+
+        document = SpecDocument(spec)
+        self.etag = document.etag
+        variants = dict(document.encodings)
+        variants[self.identity] = document.body
+        del document
+
+        self.buffer = mmap.mmap(-1, sum(len(body) for body in variants.values()))
+        view = memoryview(self.buffer).toreadonly()
+        self.encodings = {}
+        offset = 0
+        for encoding, body in variants.items():
+            self.buffer[offset : offset + len(body)] = body
+            self.encodings[encoding] = view[offset : offset + len(body)]
+            offset += len(body)
+        self._body = self.encodings.pop(self.identity)
+
+    def get_body(self, encoding):
+        """Return the body for a content coding.
+
+        :rtype: memoryview
+        """
+        if encoding == self.identity:
+            return self._body
+        return self.encodings[encoding]
+
+
+class SpecFile(EncodedVariants):
+    """OpenAPI document pre-generated on disk with :func:`write_spec_file`.
+
+    The ETag is read from the fingerprint file written next to the document,
+    and the gzip variant is used when present.
+    """
+
+    content_type = "application/json"
+
+    def __init__(self, path):
+        """
+        :param path:
+            Path of the JSON document. It is only read on first use, so the
+            ``cornice-swagger`` command can write it from the application
+            serving it.
+        """
+
+        self.path = path
+        self._variants = None
+
+    @property
+    def encodings(self):
+        return self._load()[0]
+
+    @property
+    def etag(self):
+        return self._load()[1]
+
+    def _load(self):
+        """Find the gzip variant and read the ETag of the document."""
+        if self._variants is not None:
+            return self._variants
+
+        encodings = {}
+        if os.path.exists(self.path + ".gz"):
+            encodings["gzip"] = self.path + ".gz"
+
+        fingerprint_path = self.path + ".sha256"
+        if os.path.exists(fingerprint_path):
+            with open(fingerprint_path) as fingerprint_file:
+                etag = fingerprint_file.read().strip()
+        else:
+            with open(self.path, "rb") as spec_file:
+                etag = hashlib.sha256(spec_file.read()).hexdigest()
+
+        self._variants = (encodings, etag)
+        return self._variants
+
+    def get_path(self, encoding):
+        """Return the path of the file to serve for a content coding.
+
+        :rtype: str
+        """
+        if encoding == self.identity:
+            return self.path
+        return self.encodings[encoding]
+
+
+def encode_spec(spec):
+    """Serialize an OpenAPI document the way cornice_swagger serves it,
+    keeping the order of the generated document, e.g. of schema properties.
+
+    :rtype: bytes
+    """
+    return json.dumps(spec, separators=(",", ":")).encode("utf-8")
+
+
+def encode_canonical_spec(spec):
+    """Serialize an OpenAPI document as canonical JSON with sorted keys, so
+    its fingerprint doesn't depend on the order services were registered in.
+    Keys are converted to strings as JSON does before being sorted, e.g.
+    integer status codes.
+
+    :rtype: bytes
+    """
+    encoded = json.dumps(_stringify_keys(spec), sort_keys=True, separators=(",", ":"))
+    return encoded.encode("utf-8")
+
+
+def _stringify_keys(value):
+    """Copy a JSON like value with its keys converted to strings as JSON does."""
+    if isinstance(value, dict):
+        return {
+            key if isinstance(key, str) else json.dumps(key): _stringify_keys(child)
+            for key, child in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_stringify_keys(child) for child in value]
+    return value
+
+
+def write_spec_file(spec, path):
+    """Write an OpenAPI document to disk to be served by :class:`SpecFile`,
+    as canonical JSON, see :func:`encode_canonical_spec`.
+
+    Alongside `path`, a gzip compressed copy (``.gz``) and the document
+    fingerprint (``.sha256``) are written.
+
+    :param spec:
+        OpenAPI document as returned by `CorniceSwagger.generate()`.
+    :param path:
+        Path of the JSON document.
+
+    :rtype: str
+    :returns: The document fingerprint.
+    """
+    body = encode_canonical_spec(spec)
+    fingerprint = hashlib.sha256(body).hexdigest()
+    with open(path, "wb") as spec_file:
+        spec_file.write(body)
+    with open(path + ".gz", "wb") as spec_file:
+        spec_file.write(gzip.compress(body, mtime=0))
+    with open(path + ".sha256", "w") as fingerprint_file:
+        fingerprint_file.write(fingerprint + "\n")
+    return fingerprint
+
+
+class Refresh(object):
+    """Generation of a document in progress, waited for by the requests
+    needing it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+    def wait(self):
+        """Wait for the generation to end, raising its error if it failed."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class SpecCache(object):
+    """Holds the OpenAPI document generated for a pyramid registry.
+
+    The document is generated on first use and reused until cornice services
+    are added, the last one is changed, the ``cornice_swagger.spec_kwargs``
+    setting changes or `invalidate` is called.
+
+    A single generation runs at a time, requests needing a new document wait
+    for the one in progress. With the ``cornice_swagger.spec_max_stale``
+    setting, the last document keeps being served while a new one is
+    generated in a background thread, for at most this many seconds. Errors
+    of the background generations are logged and kept in `last_error`, the
+    last document being served until a generation succeeds.
+    """
+
+    retry_interval = 10.0
+    """Seconds to wait after a failed background generation before starting
+    another one."""
+
+    def __init__(self, registry):
+        """
+        :param registry:
+            Pyramid registry the cache belongs to.
+        """
+
+        self.registry = registry
+        self.document = None
+        self.shards = None
+        self.shard_tags = None
+        self.shard_indexes = {}
+        self.generated_at = None
+        self.last_error = None
+        self._kwargs = None
+        self._services = None
+        self._generator = None
+        self._invalidations = 0
+        self._generated_invalidations = 0
+        self._stale_since = None
+        self._failed_at = None
+        self._refresh = None
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        """Check if the cached document no longer matches the application.
+
+        :rtype: bool
+        """
+        return (
+            self.document is None
+            or self._invalidations != self._generated_invalidations
+            or self.registry.settings.get(SPEC_KWARGS_SETTING) is not self._kwargs
+            or self._services_changed()
+        )
+
+    def _services_changed(self):
+        """Check if services were added or removed, or if the last service was
+        replaced, moved or given new views since the last generation. Only the
+        number of services and the last one are compared, so the check costs
+        the same whatever the number of services; other changes, as views
+        added to previous services, are taken into account after `invalidate`.
+        """
+        return self._get_services_state() != self._services
+
+    def _get_services_state(self):
+        """Summarize the cornice services compared by `_services_changed`."""
+        services = cornice.service.SERVICES
+        if not services:
+            return (0, None, None, 0)
+        last = services[-1]
+        return (len(services), last, last.path, len(last.definitions))
+
+    def get(self):
+        """Return the cached document, generating it first if needed. Only the
+        serialized document is kept, so each call decodes a new copy.
+
+        :rtype: dict
+        """
+        return json.loads(self.get_document().body)
+
+    def get_document(self):
+        """Return the cached document already serialized, generating it first if needed.
+
+        :rtype: SpecDocument
+        """
+        self.revalidate()
+        return self.document
+
+    def get_age(self):
+        """Return how many seconds ago the served document was generated when
+        it is stale, or None when it is up to date.
+
+        :rtype: int
+        """
+        generated_at = self.generated_at
+        if self._stale_since is None or generated_at is None:
+            return None
+        return int(time.monotonic() - generated_at)
+
+    def revalidate(self):
+        """Generate the document again if it is stale, in the background when
+        the stale document may still be served, see
+        ``cornice_swagger.spec_max_stale``."""
+        if not self.is_stale():
+            return
+
+        now = time.monotonic()
+        max_stale = self.registry.settings.get(SPEC_MAX_STALE_SETTING) or 0
+        with self._lock:
+            if self._stale_since is None:
+                self._stale_since = now
+            serve_stale = self.document is not None and now - self._stale_since < max_stale
+            refresh = self._refresh
+            if refresh is None:
+                if serve_stale and self._failed_at is not None:
+                    if now - self._failed_at < self.retry_interval:
+                        return
+                refresh = self._refresh = Refresh()
+                started = True
+            else:
+                started = False
+
+        if not started:
+            if not serve_stale:
+                refresh.wait()
+        elif serve_stale:
+            thread = threading.Thread(
+                target=self._run_refresh,
+                args=(refresh, True),
+                name="cornice_swagger.refresh",
+            )
+            thread.daemon = True
+            thread.start()
+        else:
+            self._run_refresh(refresh, False)
+            refresh.wait()
+
+    def _run_refresh(self, refresh, background):
+        """Run a generation waited for by requests, recording its error.
+        Errors of background generations are logged since no request raises
+        them."""
+        try:
+            self.refresh()
+        except Exception as error:
+            if background:
+                logger.exception("Generation of the OpenAPI document failed, serving the last one")
+            refresh.error = error
+            self.last_error = error
+            self._failed_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._refresh = None
+            refresh.done.set()
+
+    def get_shards(self):
+        """Return the shard documents configured with the
+        ``cornice_swagger.spec_shards`` setting, building them if needed.
+
+        :rtype: OrderedDict
+        :returns: :class:`SpecDocument` objects indexed by shard name.
+        """
+        self.get_document()
+        with self._lock:
+            document, shards = self.document, self.shards
+        if shards is None:
+            # the document is decoded again rather than kept as a dict, which
+            # would hold the whole spec in memory for unsharded applications
+            spec = json.loads(document.body)
+            shards = split_spec(spec, self.registry.settings[SPEC_SHARDS_SETTING])
+            shards = OrderedDict((name, SpecDocument(shard)) for name, shard in shards.items())
+            with self._lock:
+                # the document may have been generated again meanwhile
+                if self.document is document:
+                    self.shards = shards
+                    self.shard_tags = spec.get("tags", [])
+        return shards
+
+    def get_shard_index(self, script_name, shard_url):
+        """Return the document listing the tags and shards of the spec.
+
+        :param script_name:
+            Script name of the requests the index is served to, the index is
+            cached per script name since it holds shard urls.
+        :param shard_url:
+            Callable returning the url of a shard from its name.
+
+        :rtype: SpecDocument
+        """
+        shards = self.get_shards()
+        with self._lock:
+            tags, shard_indexes = self.shard_tags, self.shard_indexes
+        index = shard_indexes.get(script_name)
+        if index is None:
+            index = SpecDocument(
+                {
+                    "tags": tags or [],
+                    "shards": [{"name": name, "url": shard_url(name)} for name in shards],
+                }
+            )
+            shard_indexes[script_name] = index
+        return index
+
+    def refresh(self):
+        """Generate the document again and store it."""
+        kwargs = self.registry.settings.get(SPEC_KWARGS_SETTING)
+        services = self._get_services_state()
+        invalidations = self._invalidations
+        spec = self.get_generator().generate(**(kwargs or {}))
+        document = SpecDocument(spec)
+        with self._lock:
+            self.shards = None
+            self.shard_tags = None
+            self.shard_indexes = {}
+            self.document = document
+            self.generated_at = time.monotonic()
+            self.last_error = None
+            self._failed_at = None
+            self._stale_since = None
+            self._kwargs = kwargs
+            self._services = services
+            self._generated_invalidations = invalidations
+
+    def get_generator(self):
+        """Return the generator kept across refreshes, so only services
+        changed since the last refresh are converted again.
+
+        :rtype: CorniceSwagger
+        """
+        if self._generator is None:
+            self._generator = cornice_swagger.CorniceSwagger(pyramid_registry=self.registry)
+            self._generator.cache_fragments = True
+        self._generator.services = cornice.service.get_services()
+        return self._generator
+
+    def invalidate(self):
+        """Mark the cached document stale so it is generated again on next
+        use. It may still be served meanwhile, see
+        ``cornice_swagger.spec_max_stale``."""
+        with self._lock:
+            self._invalidations += 1
+
+
+def get_spec_cache(registry):
+    """Return the :class:`SpecCache` of a pyramid registry, creating it if needed.
+
+    :param registry:
+        Pyramid registry.
+
+    :rtype: SpecCache
+    """
+    cache = getattr(registry, "cornice_swagger_spec_cache", None)
+    if cache is None:
+        cache = SpecCache(registry)
+        registry.cornice_swagger_spec_cache = cache
+    return cache
+
+
+def get_shared_spec(registry):
+    """Return the :class:`SharedSpecDocument` of a pyramid registry,
+    generating it if needed.
+
+    Applications served by a pre-forking server should build it before
+    workers are forked, see :func:`preload_shared_spec`.
+
+    :param registry:
+        Pyramid registry.
+
+    :rtype: SharedSpecDocument
+    """
+    document = getattr(registry, "cornice_swagger_shared_spec", None)
+    if document is None:
+        generator = cornice_swagger.CorniceSwagger(
+            cornice.service.get_services(), pyramid_registry=registry
+        )
+        spec = generator.generate(**(registry.settings.get(SPEC_KWARGS_SETTING) or {}))
+        document = registry.cornice_swagger_shared_spec = SharedSpecDocument(spec)
+    return document
+
+
+def preload_shared_spec(event):
+    """`ApplicationCreated` subscriber building the shared document at
+    startup. With a server loading the application before forking workers,
+    e.g. gunicorn with ``preload_app``, it runs once in the master process.
+
+    :param event:
+        Pyramid `ApplicationCreated` event.
+    """
+    get_shared_spec(event.app.registry)
+
+
+def warm_spec_cache(event):
+    """`ApplicationCreated` subscriber generating the cached document at startup.
+
+    :param event:
+        Pyramid `ApplicationCreated` event.
+    """
+    registry = event.app.registry
+    cache = get_spec_cache(registry)
+    cache.get_document()
+    if registry.settings.get(SPEC_SHARDS_SETTING):
+        cache.get_shards()
@@ -1,5 +1,7 @@
 """Converts from colander request chema to Swagger parameters."""
 
+import copy
+
 from cornice_swagger.converters.exceptions import NoSuchConverter
 
 
@@ -59,6 +61,8 @@ class BodyParameterConverter(ParameterConverter):
         if schema_node.description:
             converted["description"] = schema_node.description
 
+        # titles are set on a copy, schemas may be shared with other views
+        schema_node = copy.copy(schema_node)
         schema_node.title = schema_node.__class__.__name__
         schema = definition_handler(schema_node)
         converted["schema"] = schema
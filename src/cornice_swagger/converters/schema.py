@@ -3,9 +3,18 @@ This module handles the conversion between colander object schemas and swagger
 object schemas by converting types and node validators.
 """
 
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+
 import colander
 
 from cornice_swagger.converters.exceptions import NoSuchConverter
+from cornice_swagger.stats import count_nodes, get_stats, profiled, timed
+from cornice_swagger.util import fingerprint, pack_json, unpack_json
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
 
 def convert_length_validator_factory(max_key, min_key):
@@ -216,7 +225,24 @@ class ArrayTypeConverter(TypeConverter):
 
 
 class TypeConversionDispatcher(object):
-    def __init__(self, custom_converters={}, default_converter=None):
+    key_attributes = ("title", "description", "missing", "validator")
+    """Schema node attributes the conversion cache keys are built from, along
+    with the node class, its type, its children and its example. Converters
+    reading other attributes should add them here."""
+
+    def __init__(self, custom_converters={}, default_converter=None, cache_size=512):
+        """
+        :param custom_converters:
+            Mapping of colander types to converter classes.
+        :param default_converter:
+            Converter class used for types without converter.
+        :param cache_size:
+            How many converted schema nodes to keep, least recently used ones
+            are dropped first. Nodes are cached by structure, see
+            `key_attributes`, validators being compared by identity, so the
+            same schema embedded in several others is only converted once.
+            Use 0 to disable.
+        """
         self.converters = {
             colander.Boolean: BooleanTypeConverter,
             colander.Date: DateTypeConverter,
@@ -232,7 +258,64 @@ class TypeConversionDispatcher(object):
         self.converters.update(custom_converters)
         self.default_converter = default_converter
 
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._structures = OrderedDict()
+        self._numbers = itertools.count()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
     def __call__(self, schema_node):
+        # keys are computed once per node for a whole conversion tree
+        keys = getattr(self._local, "keys", None)
+        if keys is not None:
+            return self._get_converted(schema_node, keys)
+
+        self._local.keys = {}
+        try:
+            return self._convert_root(schema_node)
+        finally:
+            self._local.keys = None
+
+    @profiled("schemas")
+    @timed("type_conversion")
+    def _convert_root(self, schema_node):
+        """Convert the root node of a schema tree."""
+        stats = get_stats()
+        if stats is not None:
+            stats.count("nodes_converted", count_nodes(schema_node))
+        return self._get_converted(schema_node, self._local.keys)
+
+    def _get_converted(self, schema_node, keys):
+        if not self.cache_size or not schema_node.children:
+            # leaves are converted faster than cached copies are made
+            return self.convert(schema_node)
+
+        key = self.get_key(schema_node, keys)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache.move_to_end(key)
+
+        # callers alter converted schemas, the cache holds them packed
+        if cached is not None:
+            return unpack_json(cached)
+
+        converted = self.convert(schema_node)
+        cached = pack_json(converted)
+        with self._lock:
+            self._cache[key] = cached
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return converted
+
+    def convert(self, schema_node):
+        """Convert a colander schema node to a swagger schema, without cache."""
         schema_type = schema_node.typ
         schema_type = type(schema_type)
 
@@ -247,3 +330,70 @@ class TypeConversionDispatcher(object):
         converted = converter(schema_node)
 
         return converted
+
+    def get_key(self, schema_node, keys):
+        """
+        Build the structural cache key of a schema node. Structures of nodes
+        with children are numbered so keys stay small whatever their depth,
+        the least recently used ones being dropped along with their cached
+        conversion.
+
+        :param schema_node:
+            Colander schema node.
+        :param keys:
+            Keys already built, indexed by node id.
+        """
+        key = keys.get(id(schema_node))
+        if key is None:
+            typ = schema_node.typ
+            values = (
+                tuple(getattr(typ, "__dict__", {}).values())
+                + tuple(getattr(schema_node, name) for name in self.key_attributes)
+                + (schema_node.__dict__.get("example", colander.null),)
+            )
+            try:
+                hash(values)
+            except TypeError:
+                values = tuple(map(fingerprint, values))
+            structure = (
+                type(schema_node),
+                type(typ),
+                values,
+                # True, 1 and 1.0 are equal but not converted the same
+                tuple(map(type, values)),
+                tuple((child.name, self.get_key(child, keys)) for child in schema_node.children),
+            )
+            if not schema_node.children:
+                # leaves are not cached, their structure is enough
+                keys[id(schema_node)] = structure
+                return structure
+
+            with self._lock:
+                key = self._structures.get(structure)
+                if key is None:
+                    # numbers are never reused: nodes numbered before an
+                    # eviction keep their numbers until the end of their tree
+                    key = self._structures[structure] = next(self._numbers)
+                    if len(self._structures) > self.cache_size * 8:
+                        _, dropped = self._structures.popitem(last=False)
+                        self._cache.pop(dropped, None)
+                else:
+                    self._structures.move_to_end(structure)
+            keys[id(schema_node)] = key
+        return key
+
+    def cache_info(self):
+        """Report the conversion cache statistics.
+
+        :rtype: CacheInfo
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.cache_size, len(self._cache))
+
+    def cache_clear(self):
+        """Drop the cached conversions and reset the statistics."""
+        with self._lock:
+            self._cache.clear()
+            self._structures.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,438 @@
+"""Content addressed deduplication of the schemas of an OpenAPI document."""
+
+import hashlib
+import json
+import re
+from collections import Counter, namedtuple
+
+from cornice_swagger.shards import HTTP_METHODS
+
+
+SUFFIX_PATTERN = re.compile(r"_\d+$")
+"""Suffix added to the names of different values registered under a same name."""
+
+SKIPPED_KEYS = ("default", "example", "enum")
+"""Schema keys holding values instead of schemas."""
+
+
+class DedupReport(namedtuple("DedupReport", ["original_size", "size", "shared"])):
+    """Sizes of a document before and after deduplication, in bytes of
+    compact JSON, and number of shared components added by section."""
+
+    @property
+    def bytes_saved(self):
+        return self.original_size - self.size
+
+
+def digest(value):
+    """
+    Hash a JSON value canonically.
+
+    :rtype: str
+    """
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def unique_name(registry, name, value):
+    """
+    Find the name a value should be registered under: name itself unless
+    another value is registered with it, else the first name suffixed with a
+    number which is free or holds the same value.
+
+    :param registry:
+        Dict of the registered values.
+    :param name:
+        Preferred name.
+    :param value:
+        Value to register.
+
+    :rtype: str
+    """
+    base = SUFFIX_PATTERN.sub("", name)
+    candidate = name
+    number = 1
+    while candidate in registry and registry[candidate] != value:
+        number += 1
+        candidate = "{}_{}".format(base, number)
+    return candidate
+
+
+def is_object_schema(value):
+    """Check if a value is an object schema with properties."""
+    return (
+        isinstance(value, dict) and value.get("type") == "object" and bool(value.get("properties"))
+    )
+
+
+def rewrite_refs(value, renames):
+    """
+    Copy a value with its JSON pointers renamed.
+
+    :param value:
+        Value to copy.
+    :param renames:
+        New pointers indexed by old pointer.
+    """
+    if isinstance(value, dict):
+        ref = value.get("$ref")
+        if isinstance(ref, str) and ref in renames:
+            value = dict(value, **{"$ref": renames[ref]})
+        return {k: rewrite_refs(v, renames) for k, v in value.items()}
+    if isinstance(value, list):
+        return [rewrite_refs(v, renames) for v in value]
+    return value
+
+
+class Deduplicator(object):
+    """Base class of the deduplicators, which move the values found several
+    times in a document to one of its sections and replace their occurrences
+    with JSON pointers."""
+
+    section = None
+    """Section of the document holding the shared values."""
+
+    def __init__(self, components):
+        """
+        :param components:
+            Section of the document, shared values are added to it.
+        """
+
+        self.components = components
+        self.json_pointer = "#/{}/".format(self.section)
+        self.counts = Counter()
+        self.names = {}
+        self.aliases = {}
+        self.shared = 0
+        self._indexed = set()
+
+    def merge_aliases(self, document):
+        """
+        Drop the components holding the same value as a previous one, and
+        point their references to the previous one.
+
+        :param document:
+            Whole OpenAPI document, its section being the one given on init.
+
+        :returns: The document with aliases replaced.
+        """
+        if not self.aliases:
+            return document
+        for name in self.aliases:
+            del self.components[name]
+        renames = {
+            self.json_pointer + name: self.json_pointer + target
+            for name, target in self.aliases.items()
+        }
+        self.aliases = {}
+        document = rewrite_refs(document, renames)
+        self.components = document[self.section]
+        return document
+
+    def digest(self, value):
+        """
+        Hash a value canonically.
+
+        :rtype: str
+        """
+        return digest(value)
+
+    def is_shareable(self, value):
+        """Check if a value may be moved to the section. By default, any
+        object but a JSON pointer is."""
+        return isinstance(value, dict) and "$ref" not in value
+
+    def _index_components(self):
+        """Index the components added since the last call by digest."""
+        for name, value in list(self.components.items()):
+            if name in self._indexed:
+                continue
+            self._indexed.add(name)
+            if self.is_shareable(value):
+                value_digest = self.digest(value)
+                if value_digest in self.names:
+                    self.aliases[name] = self.names[value_digest]
+                else:
+                    self.names[value_digest] = name
+
+    def _share(self, value, base_name, value_digest):
+        """
+        Return a pointer to the component holding a value, adding it to the
+        section if it is found several times.
+
+        :param value:
+            Value to share.
+        :param base_name:
+            Name the value is added under, numbered if already taken.
+        :param value_digest:
+            Digest of the value as counted.
+
+        :returns: The pointer, or None if the value should stay inline.
+        """
+        name = self.names.get(value_digest)
+        if name is None:
+            if self.counts[value_digest] < 2:
+                return None
+            name = unique_name(self.components, base_name, value)
+            self.components[name] = value
+            self.names[value_digest] = name
+            self._indexed.add(name)
+            self.shared += 1
+        return {"$ref": self.json_pointer + name}
+
+
+class SchemaDeduplicator(Deduplicator):
+    """Moves the object schemas found several times in a document to its
+    definitions and replaces all their occurrences with JSON pointers.
+
+    Schemas are identified by a canonical hash of their content, titles of the
+    deduplicated schemas being ignored so the same structure used under
+    several names is only defined once.
+    """
+
+    section = "definitions"
+
+    def __init__(self, definitions):
+        """
+        :param definitions:
+            Definitions of the document, deduplicated schemas are added to it.
+        """
+
+        super(SchemaDeduplicator, self).__init__(definitions)
+        self._digests = {}
+
+    @property
+    def definitions(self):
+        return self.components
+
+    @definitions.setter
+    def definitions(self, definitions):
+        self.components = definitions
+
+    def dedup(self, document):
+        """
+        Deduplicate the object schemas of a document, or of a part of it when
+        the document is written piece by piece: schemas already defined or
+        already found in previous pieces are then replaced.
+
+        :param document:
+            OpenAPI document or part of it. It is not altered, except for
+            its definitions.
+
+        :returns: The document with shared schemas replaced by pointers.
+        """
+        self._digests = {}
+        self._index_components()
+        self._count(document)
+        return self._replace(document)
+
+    def digest(self, schema):
+        """
+        Hash an object schema canonically, ignoring its title.
+
+        :rtype: str
+        """
+        schema_digest = self._digests.get(id(schema))
+        if schema_digest is None:
+            canonical = {k: self._canonical(k, v) for k, v in schema.items() if k != "title"}
+            schema_digest = digest(canonical)
+            self._digests[id(schema)] = schema_digest
+        return schema_digest
+
+    def is_shareable(self, value):
+        return is_object_schema(value)
+
+    def _canonical(self, key, value):
+        if key in SKIPPED_KEYS:
+            return value
+        if is_object_schema(value):
+            return {"#": self.digest(value)}
+        if isinstance(value, dict):
+            return {k: self._canonical(k, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._canonical(None, v) for v in value]
+        return value
+
+    def _iter_children(self, value):
+        if isinstance(value, dict):
+            return (v for k, v in value.items() if k not in SKIPPED_KEYS)
+        if isinstance(value, list):
+            return iter(value)
+        return iter(())
+
+    def _count(self, value):
+        if value is self.definitions:
+            # definitions themselves are not occurrences
+            for schema in value.values():
+                for child in self._iter_children(schema):
+                    self._count(child)
+            return
+
+        for child in self._iter_children(value):
+            self._count(child)
+        if is_object_schema(value):
+            self.counts[self.digest(value)] += 1
+
+    def _replace(self, value, definition=False):
+        if value is self.definitions:
+            for name in list(value):
+                value[name] = self._replace(value[name], definition=True)
+            return value
+
+        if isinstance(value, list):
+            return [self._replace(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+
+        replaced = {k: v if k in SKIPPED_KEYS else self._replace(v) for k, v in value.items()}
+        if definition or not is_object_schema(value):
+            return replaced
+
+        name = replaced.get("title") or "Object"
+        pointer = self._share(replaced, name, self.digest(value))
+        return replaced if pointer is None else pointer
+
+
+class OperationComponentDeduplicator(Deduplicator):
+    """Base class of the deduplicators moving the components found several
+    times in the operations of a document, e.g. parameters, to the section of
+    the same name."""
+
+    path_level = False
+    """Also deduplicate the components found at path level."""
+
+    def dedup(self, document):
+        """
+        Deduplicate the components of the operations of a document.
+
+        :param document:
+            OpenAPI document. It is not altered, except for its section.
+
+        :returns: The document with shared components replaced by pointers.
+        """
+        paths = document.get("paths")
+        if not paths:
+            return document
+        self._index_components()
+        for path_obj in paths.values():
+            self._count(path_obj)
+        paths = {path: self._replace(path_obj) for path, path_obj in paths.items()}
+        return dict(document, paths=paths)
+
+    def dedup_path(self, path_obj):
+        """
+        Deduplicate the components of a path object, when a document is
+        written piece by piece: components already in the section or already
+        found in previous path objects are replaced.
+
+        :param path_obj:
+            Path object. It is not altered.
+
+        :returns: The path object with shared components replaced by pointers.
+        """
+        self._index_components()
+        self._count(path_obj)
+        return self._replace(path_obj)
+
+    def get_name(self, key, value):
+        """Return the name a component should be shared under. By default,
+        the singular of the section followed by the key, e.g. ``Response404``.
+
+        :param key:
+            Index or key of the component in its operation.
+        """
+        return self.section[:-1].title() + str(key).title()
+
+    def _iter_containers(self, path_obj):
+        for key, value in path_obj.items():
+            if key in HTTP_METHODS:
+                container = value.get(self.section)
+            elif key == self.section and self.path_level:
+                container = value
+            else:
+                continue
+            if container:
+                yield key, container
+
+    def _iter_items(self, container):
+        items = container.items() if isinstance(container, dict) else enumerate(container)
+        return ((k, v) for k, v in items if self.is_shareable(v))
+
+    def _count(self, path_obj):
+        for _, container in self._iter_containers(path_obj):
+            for _, value in self._iter_items(container):
+                self.counts[self.digest(value)] += 1
+
+    def _replace(self, path_obj):
+        path_obj = dict(path_obj)
+        for key, container in list(self._iter_containers(path_obj)):
+            replaced = type(container)(container)
+            for item_key, value in self._iter_items(container):
+                name = self.get_name(item_key, value)
+                pointer = self._share(value, name, self.digest(value))
+                if pointer is not None:
+                    replaced[item_key] = pointer
+            if key == self.section:
+                path_obj[key] = replaced
+            else:
+                path_obj[key] = dict(path_obj[key], **{self.section: replaced})
+        return path_obj
+
+
+class ParameterDeduplicator(OperationComponentDeduplicator):
+    """Moves the parameters found several times in the document to its
+    parameters section and replaces all their occurrences with JSON pointers.
+    Parameters of different contents sharing a name get numbered names."""
+
+    section = "parameters"
+    path_level = True
+
+    def get_name(self, key, value):
+        return value.get("name") or "Parameter"
+
+
+class ResponseDeduplicator(OperationComponentDeduplicator):
+    """Moves the responses found several times in the document to its
+    responses section and replaces all their occurrences with JSON pointers.
+    Responses are named after their schema title or status code."""
+
+    section = "responses"
+
+    def get_name(self, key, value):
+        schema = value.get("schema", {})
+        ref = schema.get("$ref")
+        if isinstance(ref, str):
+            return ref.rsplit("/", 1)[-1]
+        return schema.get("title") or super(ResponseDeduplicator, self).get_name(key, value)
+
+
+DEDUPLICATORS = (SchemaDeduplicator, ParameterDeduplicator, ResponseDeduplicator)
+"""Deduplicator classes, in the order they run."""
+
+
+def dedup_document(document, deduplicators):
+    """
+    Run deduplicators over a whole document.
+
+    :param document:
+        OpenAPI document. Its sections are updated in place.
+    :param deduplicators:
+        Deduplicators to run, e.g. instances of `DEDUPLICATORS`.
+
+    :returns: Tuple with the deduplicated document and its
+        :class:`DedupReport`.
+    """
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    original_size = len(encode(document))
+
+    shared = {}
+    for deduplicator in deduplicators:
+        section = deduplicator.section
+        deduplicator.components = document.setdefault(section, {})
+        document = deduplicator.dedup(document)
+        document = deduplicator.merge_aliases(document)
+        if not document[section]:
+            del document[section]
+        shared[section] = deduplicator.shared
+
+    return document, DedupReport(original_size, len(encode(document)), shared)
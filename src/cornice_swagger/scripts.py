@@ -0,0 +1,124 @@
+"""Command line interface of cornice_swagger, installed as ``cornice-swagger``."""
+
+import argparse
+import json
+import sys
+
+from pyramid.config import Configurator
+from pyramid.paster import bootstrap
+
+from cornice_swagger.analysis import analyze_spec
+from cornice_swagger.cache import get_spec_cache, write_spec_file
+
+
+def load_registry(config_uri=None, includeme=None):
+    """
+    Load a pyramid application and return its registry.
+
+    :param config_uri:
+        PasteDeploy ini file of the application, e.g. ``development.ini#main``.
+    :param includeme:
+        Dotted name of a pyramid `includeme` configuring the application.
+
+    :returns: Tuple with the registry and a callable cleaning up the application.
+    """
+    if config_uri is not None:
+        env = bootstrap(config_uri)
+        return env["registry"], env["closer"]
+
+    config = Configurator(settings={})
+    config.include(includeme)
+    config.commit()
+    return config.registry, lambda: None
+
+
+def load_spec(args):
+    """Load the OpenAPI document of an application, or a generated document
+    when a file is given."""
+    if getattr(args, "file", None) is not None:
+        with open(args.file) as spec_file:
+            return json.load(spec_file)
+
+    registry, closer = load_registry(args.config_uri, args.includeme)
+    try:
+        return get_spec_cache(registry).get()
+    finally:
+        closer()
+
+
+def generate(args):
+    """Write the OpenAPI document of an application to disk."""
+    spec = load_spec(args)
+    fingerprint = write_spec_file(spec, args.output)
+    print("Wrote {} ({})".format(args.output, fingerprint))
+    return 0
+
+
+def analyze(args):
+    """Print the size report of the OpenAPI document of an application."""
+    report = analyze_spec(load_spec(args), args.min_size)
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2, sort_keys=True))
+    else:
+        print(report.report(args.top))
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="cornice-swagger", description="Cornice Swagger documentation tools."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    generate_parser = subparsers.add_parser(
+        "generate",
+        help="Pre-generate the OpenAPI document of an application.",
+        description=(
+            "Generate the OpenAPI document of an application with the kwargs "
+            "given to `cornice_enable_openapi_view`, and write it with its "
+            "gzip variant and fingerprint to be served with `spec_file`."
+        ),
+    )
+    source = generate_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ini", dest="config_uri", help="application ini file")
+    source.add_argument("--includeme", help="dotted name of the application includeme")
+    generate_parser.add_argument(
+        "-o", "--output", default="swagger.json", help="output file (default: swagger.json)"
+    )
+    generate_parser.set_defaults(func=generate)
+
+    analyze_parser = subparsers.add_parser(
+        "analyze",
+        help="Report what takes space in the OpenAPI document of an application.",
+        description=(
+            "Report the size of the OpenAPI document of an application by "
+            "section, path, tag and definition, its repeated values and the "
+            "bytes deduplication and description stripping would save."
+        ),
+    )
+    source = analyze_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ini", dest="config_uri", help="application ini file")
+    source.add_argument("--includeme", help="dotted name of the application includeme")
+    source.add_argument("--file", help="generated OpenAPI document")
+    analyze_parser.add_argument(
+        "-n", "--top", type=int, default=10, help="entries of each breakdown (default: 10)"
+    )
+    analyze_parser.add_argument(
+        "--min-size",
+        type=int,
+        help="size in bytes under which repeated values are ignored (default: 128)",
+    )
+    analyze_parser.add_argument("--json", action="store_true", help="output the report as JSON")
+    analyze_parser.set_defaults(func=analyze)
+
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Splitting of an OpenAPI document into smaller self-contained documents."""
+
+from collections import OrderedDict
+
+
+DEFAULT_SHARD = "default"
+"""Name of the shard holding operations matching no tag or path prefix."""
+
+SECTIONS = ("definitions", "parameters", "responses")
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch")
+
+
+def get_prefix_shard_name(prefix):
+    """Return the shard name used for a path prefix, e.g. ``users-admin`` for
+    ``/users/admin``.
+
+    :rtype: str
+    """
+    return prefix.strip("/").replace("/", "-") or DEFAULT_SHARD
+
+
+def match_prefix(path, prefix):
+    """Tell whether a path is under a path prefix, comparing whole segments,
+    e.g. ``/users/{id}`` is under ``/users`` but ``/usersettings`` isn't.
+
+    :rtype: bool
+    """
+    prefix = prefix.rstrip("/")
+    return path.rstrip("/") == prefix or path.startswith(prefix + "/")
+
+
+def split_spec(spec, shards):
+    """Split an OpenAPI document in self-contained documents.
+
+    :param spec:
+        OpenAPI document as returned by `CorniceSwagger.generate()`.
+    :param shards:
+        Either ``"tags"`` to build one document per operation tag, or a list
+        of path prefixes to build one document per prefix, see
+        `match_prefix`. Paths matching several prefixes go to the longest one.
+
+    :rtype: OrderedDict
+    :returns: Shard documents indexed by shard name.
+    """
+    shard_paths = OrderedDict()
+
+    for path, path_obj in spec.get("paths", {}).items():
+        if shards == "tags":
+            for method, op in path_obj.items():
+                if method not in HTTP_METHODS:
+                    continue
+                for tag in op.get("tags") or [DEFAULT_SHARD]:
+                    shard_path = shard_paths.setdefault(tag, OrderedDict())
+                    shard_path_obj = shard_path.setdefault(path, _path_header(path_obj))
+                    shard_path_obj[method] = op
+        else:
+            matching = [prefix for prefix in shards if match_prefix(path, prefix)]
+            if matching:
+                name = get_prefix_shard_name(max(matching, key=len))
+            else:
+                name = DEFAULT_SHARD
+            shard_paths.setdefault(name, OrderedDict())[path] = path_obj
+
+    return OrderedDict((name, extract_shard(spec, paths)) for name, paths in shard_paths.items())
+
+
+def extract_shard(spec, paths):
+    """Build a document holding only some paths of an OpenAPI document and
+    the definitions, parameters and responses they reference.
+
+    :param spec:
+        Full OpenAPI document.
+    :param paths:
+        Paths object of the shard.
+
+    :rtype: dict
+    """
+    shard = {k: v for k, v in spec.items() if k not in ("paths", "tags") + SECTIONS}
+    shard["paths"] = paths
+
+    used_tags = set()
+    for path_obj in paths.values():
+        for method, op in path_obj.items():
+            if method in HTTP_METHODS:
+                used_tags.update(op.get("tags", []))
+    tags = [tag for tag in spec.get("tags", []) if tag["name"] in used_tags]
+    if tags:
+        shard["tags"] = tags
+
+    for section, names in _collect_refs(spec, paths).items():
+        components = {
+            name: value for name, value in spec.get(section, {}).items() if name in names
+        }
+        if components:
+            shard[section] = components
+
+    return shard
+
+
+def _path_header(path_obj):
+    """Copy a path item object without its operations."""
+    return {k: v for k, v in path_obj.items() if k not in HTTP_METHODS}
+
+
+def _collect_refs(spec, obj):
+    """Find the names of all the components referenced by obj, directly or
+    through other components.
+
+    :rtype: dict
+    :returns: Referenced names indexed by section.
+    """
+    found = {section: set() for section in SECTIONS}
+    pending = [obj]
+
+    while pending:
+        for pointer in _iter_refs(pending.pop()):
+            parts = pointer.split("/")
+            if len(parts) != 3 or parts[0] != "#" or parts[1] not in found:
+                continue
+            section, name = parts[1], parts[2]
+            if name in found[section]:
+                continue
+            found[section].add(name)
+            component = spec.get(section, {}).get(name)
+            if component is not None:
+                pending.append(component)
+
+    return found
+
+
+def _iter_refs(obj):
+    """Yield all JSON pointers found in `$ref` entries of obj."""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            ref = value.get("$ref")
+            if isinstance(ref, str):
+                yield ref
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
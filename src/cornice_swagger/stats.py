@@ -0,0 +1,334 @@
+"""Timing instrumentation of the generation of OpenAPI documents."""
+
+import contextvars
+import functools
+import heapq
+import json
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager, nullcontext
+
+
+_current_stats = contextvars.ContextVar("cornice_swagger_stats", default=None)
+_current_profiler = contextvars.ContextVar("cornice_swagger_profiler", default=None)
+
+ProfileEntry = namedtuple("ProfileEntry", ["key", "calls", "time", "size"])
+
+
+def get_stats():
+    """Return the :class:`GenerationStats` collected by the current
+    generation, or None if it doesn't collect any.
+
+    :rtype: GenerationStats
+    """
+    return _current_stats.get()
+
+
+def phase(name):
+    """Return a context manager timing a phase of the current generation,
+    doing nothing if it doesn't collect statistics."""
+    stats = _current_stats.get()
+    if stats is None:
+        return nullcontext()
+    return stats.phase(name)
+
+
+def timed(name, service=False):
+    """Decorate a method to time its calls as a phase of the current
+    generation.
+
+    :param name:
+        Name of the phase.
+    :param service:
+        The first argument of the method is a cornice service, whose
+        conversion time should be recorded.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = _current_stats.get()
+            if stats is None:
+                return method(self, *args, **kwargs)
+            with stats.phase(name, args[0].name if service else None):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profiled(kind):
+    """Decorate a method converting a schema to record its cost per schema
+    class in the profile of the current generation.
+
+    :param kind:
+        Kind of the profile entries, see :class:`CostProfiler`.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, schema, *args, **kwargs):
+            profiler = _current_profiler.get()
+            if profiler is None:
+                return method(self, schema, *args, **kwargs)
+            start = time.perf_counter()
+            result = method(self, schema, *args, **kwargs)
+            profiler.record(kind, get_class_name(schema), time.perf_counter() - start, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def profile_call(kind, key, func, *args):
+    """Call a function, recording its cost under a key in the profile of the
+    current generation."""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return func(*args)
+    start = time.perf_counter()
+    result = func(*args)
+    profiler.record(kind, key, time.perf_counter() - start, result)
+    return result
+
+
+def get_profiler():
+    """Return the :class:`CostProfiler` of the current generation, or None
+    if it isn't profiled.
+
+    :rtype: CostProfiler
+    """
+    return _current_profiler.get()
+
+
+def get_class_name(schema):
+    """Return the dotted name of the class of a schema, or of a schema
+    class."""
+    cls = schema if isinstance(schema, type) else type(schema)
+    return "{}.{}".format(cls.__module__, cls.__qualname__)
+
+
+def bind(fn):
+    """Wrap a function called from another thread to collect statistics and
+    profile in the current generation."""
+    stats = _current_stats.get()
+    profiler = _current_profiler.get()
+    if stats is None and profiler is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stats_token = _current_stats.set(stats)
+        profiler_token = _current_profiler.set(profiler)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_profiler.reset(profiler_token)
+            _current_stats.reset(stats_token)
+
+    return wrapper
+
+
+def count_nodes(schema_node):
+    """Count the nodes of a colander schema."""
+    return 1 + sum(count_nodes(child) for child in schema_node.children)
+
+
+class GenerationStats(object):
+    """Statistics of a generation: time spent in each of its phases, numbers
+    of converted and emitted objects and slowest services.
+
+    Times of phases exclude the time of the phases they call, e.g. the type
+    conversion of the body schema of a response is not counted in
+    ``responses``. When services are converted by worker threads, phases
+    times are summed over threads and may exceed the total time. Worker
+    processes don't report phases times.
+    """
+
+    def __init__(self, slowest=10):
+        """
+        :param slowest:
+            How many of the slowest services to report.
+        """
+
+        self.total = 0.0
+        self.phases = {}
+        self.counts = Counter()
+        self.slowest = slowest
+        self._services = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def collect(self):
+        """Collect the statistics of the generations run in the block."""
+        token = _current_stats.set(self)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.total += time.perf_counter() - start
+            _current_stats.reset(token)
+
+    @contextmanager
+    def phase(self, name, service=None):
+        """
+        Time a phase. Phases called by a phase of the same name are timed
+        as part of the caller.
+
+        :param name:
+            Name of the phase.
+        :param service:
+            Name of the cornice service converted by the phase, if any.
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        if stack and stack[-1][0] == name:
+            yield
+            return
+
+        frame = [name, 0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[1]
+                if service is not None:
+                    self.counts["services_converted"] += 1
+                    self._services.append((elapsed, service))
+
+    def count(self, name, value=1):
+        """Add a value to a count."""
+        with self._lock:
+            self.counts[name] += value
+
+    @property
+    def slowest_services(self):
+        """Names and conversion times of the slowest services, slowest first.
+
+        :rtype: list
+        """
+        with self._lock:
+            services = heapq.nlargest(self.slowest, self._services)
+        return [(name, elapsed) for elapsed, name in services]
+
+    def as_dict(self):
+        """Return the statistics as a dict of plain values.
+
+        :rtype: dict
+        """
+        return {
+            "total": self.total,
+            "phases": dict(self.phases),
+            "counts": dict(self.counts),
+            "slowest_services": self.slowest_services,
+        }
+
+    def __str__(self):
+        lines = ["Total: {:.1f} ms".format(self.total * 1000), "Phases:"]
+        for name, elapsed in sorted(self.phases.items(), key=lambda item: -item[1]):
+            lines.append("  {:<24} {:>10.1f} ms".format(name, elapsed * 1000))
+        lines.append("Counts:")
+        for name, value in sorted(self.counts.items()):
+            lines.append("  {:<24} {:>10}".format(name, value))
+        lines.append("Slowest services:")
+        for name, elapsed in self.slowest_services:
+            lines.append("  {:<24} {:>10.1f} ms".format(name, elapsed * 1000))
+        return "\n".join(lines)
+
+
+class CostProfiler(object):
+    """Attributes the cost of a generation to the schema classes and
+    operations it converts: number of conversions, time spent and bytes of
+    compact JSON emitted.
+
+    Entries are recorded by kind:
+
+    * ``schemas``: schemas converted by the type converter, e.g. bodies,
+    * ``requests``: request schemas converted to parameters, by the class
+      given to the view,
+    * ``responses``: response schemas converted to responses,
+    * ``operations``: operations, by ``(path, method)``.
+
+    Times are inclusive, e.g. the conversion time of a body schema is also
+    counted in the time of its request schema and operation.
+    """
+
+    kinds = ("schemas", "requests", "responses", "operations")
+
+    def __init__(self):
+        self.entries = {kind: {} for kind in self.kinds}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def collect(self):
+        """Profile the generations run in the block."""
+        token = _current_profiler.set(self)
+        try:
+            yield self
+        finally:
+            _current_profiler.reset(token)
+
+    def record(self, kind, key, elapsed, result):
+        """
+        Record a conversion.
+
+        :param kind:
+            Kind of the entry, one of `kinds`.
+        :param key:
+            Converted schema class name or ``(path, method)``.
+        :param elapsed:
+            Conversion time in seconds.
+        :param result:
+            Converted value, its size is measured as compact JSON.
+        """
+        size = len(json.dumps(result, separators=(",", ":"), default=repr))
+        with self._lock:
+            calls, total, total_size = self.entries[kind].get(key, (0, 0.0, 0))
+            self.entries[kind][key] = (calls + 1, total + elapsed, total_size + size)
+
+    def top(self, n=10, kind="schemas", by="time"):
+        """
+        Return the most expensive entries of a kind.
+
+        :param n:
+            Number of entries.
+        :param kind:
+            Kind of the entries, one of `kinds`.
+        :param by:
+            Either ``"time"``, ``"size"`` or ``"calls"``.
+
+        :rtype: list
+        :returns: :class:`ProfileEntry` tuples, most expensive first.
+        """
+        with self._lock:
+            entries = [ProfileEntry(key, *value) for key, value in self.entries[kind].items()]
+        return heapq.nlargest(n, entries, key=lambda entry: getattr(entry, by))
+
+    def report(self, n=10, by="time"):
+        """Format the `top` entries of each kind as text."""
+        lines = []
+        for kind in self.kinds:
+            lines.append("Top {} {} by {}:".format(n, kind, by))
+            lines.append(
+                "  {:>8} {:>10} {:>10}  {}".format("calls", "time (ms)", "size (B)", "key")
+            )
+            for entry in self.top(n, kind, by):
+                key = entry.key if isinstance(entry.key, str) else " ".join(entry.key)
+                lines.append(
+                    "  {:>8} {:>10.1f} {:>10}  {}".format(
+                        entry.calls, entry.time * 1000, entry.size, key
+                    )
+                )
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.report()
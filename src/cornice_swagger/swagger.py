@@ -1,8 +1,15 @@
 """Cornice Swagger 2.0 documentor"""
 
+import asyncio
+import copy
 import inspect
+import json
+import logging
+import multiprocessing
+import threading
 import warnings
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import colander
 from cornice import Service
@@ -11,7 +18,19 @@ from pyramid.threadlocal import get_current_registry
 
 from cornice_swagger.converters import ParameterConversionDispatcher as ParameterConverter
 from cornice_swagger.converters import TypeConversionDispatcher as TypeConverter
-from cornice_swagger.util import body_schema_transformer, merge_dicts, trim
+from cornice_swagger.dedup import DEDUPLICATORS, dedup_document, rewrite_refs, unique_name
+from cornice_swagger.stats import bind, get_class_name, phase, profile_call, profiled, timed
+from cornice_swagger.util import (
+    body_schema_transformer,
+    fingerprint,
+    merge_dicts,
+    pack_json,
+    trim,
+    unpack_json,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 class CorniceSwaggerException(Exception):
@@ -23,15 +42,24 @@ class DefinitionHandler(object):
 
     json_pointer = "#/definitions/"
 
-    def __init__(self, ref=0, type_converter=TypeConverter()):
+    def __init__(self, ref=0, type_converter=None, dedup=False):
         """
         :param ref:
             The depth that should be used by self.ref when calling self.from_schema.
+        :param type_converter:
+            Colander schemas converter. Default creates one for the handler.
+        :param dedup:
+            Register different schemas with a same title under numbered names
+            instead of overwriting them.
         """
 
+        if type_converter is None:
+            type_converter = TypeConverter()
+
         self.definition_registry = {}
         self.ref = ref
         self.type_converter = type_converter
+        self.dedup = dedup
 
     def from_schema(self, schema_node, base_name=None):
         """
@@ -47,6 +75,7 @@ class DefinitionHandler(object):
         """
         return self._ref_recursive(self.type_converter(schema_node), self.ref, base_name)
 
+    @timed("definitions")
     def _ref_recursive(self, schema, depth, base_name=None):
         """
         Dismantle nested swagger schemas into several definitions using JSON pointers.
@@ -76,10 +105,12 @@ class DefinitionHandler(object):
 
         name = base_name or schema["title"]
 
-        pointer = self.json_pointer + name
         for child_name, child in schema.get("properties", {}).items():
             schema["properties"][child_name] = self._ref_recursive(child, depth - 1)
 
+        if self.dedup:
+            name = unique_name(self.definition_registry, name, schema)
+        pointer = self.json_pointer + name
         self.definition_registry[name] = schema
 
         return {"$ref": pointer}
@@ -92,25 +123,43 @@ class ParameterHandler(object):
 
     def __init__(
         self,
-        definition_handler=DefinitionHandler(),
+        definition_handler=None,
         ref=False,
-        type_converter=TypeConverter(),
-        parameter_converter=ParameterConverter(TypeConverter()),
+        type_converter=None,
+        parameter_converter=None,
+        dedup=False,
     ):
         """
         :param definition_handler:
-            Callable that handles swagger definition schemas.
+            Callable that handles swagger definition schemas. Default creates
+            one for the handler.
         :param ref:
             Specifies the ref value when calling from_xxx methods.
+        :param type_converter:
+            Colander schemas converter. Default creates one for the handler.
+        :param parameter_converter:
+            Colander parameters converter. Default creates one for the handler.
+        :param dedup:
+            Register different parameters with a same name under numbered
+            names instead of overwriting them.
         """
 
+        if type_converter is None:
+            type_converter = TypeConverter()
+        if parameter_converter is None:
+            parameter_converter = ParameterConverter(type_converter)
+        if definition_handler is None:
+            definition_handler = DefinitionHandler(type_converter=type_converter)
+
         self.parameter_registry = {}
 
         self.type_converter = type_converter
         self.parameter_converter = parameter_converter
         self.definitions = definition_handler
         self.ref = ref
+        self.dedup = dedup
 
+    @timed("parameters")
     def from_schema(self, schema_node):
         """
         Creates a list of Swagger params from a colander request schema.
@@ -147,6 +196,7 @@ class ParameterHandler(object):
 
         return params
 
+    @timed("parameters")
     def from_path(self, path):
         """
         Create a list of Swagger path params from a cornice service path.
@@ -184,6 +234,8 @@ class ParameterHandler(object):
 
         name = base_name or param.get("title", "") or param.get("name", "")
 
+        if self.dedup:
+            name = unique_name(self.parameter_registry, name, param)
         pointer = self.json_pointer + name
         self.parameter_registry[name] = param
 
@@ -196,21 +248,38 @@ class ResponseHandler(object):
     json_pointer = "#/responses/"
 
     def __init__(
-        self, definition_handler=DefinitionHandler(), type_converter=TypeConverter(), ref=False
+        self,
+        definition_handler=None,
+        type_converter=None,
+        ref=False,
+        dedup=False,
     ):
         """
         :param definition_handler:
-            Callable that handles swagger definition schemas.
+            Callable that handles swagger definition schemas. Default creates
+            one for the handler.
+        :param type_converter:
+            Colander schemas converter. Default creates one for the handler.
         :param ref:
             Specifies the ref value when calling from_xxx methods.
+        :param dedup:
+            Register different responses with a same name under numbered
+            names instead of overwriting them.
         """
 
+        if type_converter is None:
+            type_converter = TypeConverter()
+        if definition_handler is None:
+            definition_handler = DefinitionHandler(type_converter=type_converter)
+
         self.response_registry = {}
 
         self.type_converter = type_converter
         self.definitions = definition_handler
         self.ref = ref
+        self.dedup = dedup
 
+    @timed("responses")
     def from_schema_mapping(self, schema_mapping):
         """
         Creates a Swagger response object from a dict of response schemas.
@@ -224,32 +293,7 @@ class ResponseHandler(object):
         responses = {}
 
         for status, response_schema in schema_mapping.items():
-            response = {}
-            if response_schema.description:
-                response["description"] = response_schema.description
-            else:
-                raise CorniceSwaggerException("Responses must have a description.")
-
-            for field_schema in response_schema.children:
-                location = field_schema.name
-
-                if location == "body":
-                    title = field_schema.__class__.__name__
-                    if title == "body":
-                        title = response_schema.__class__.__name__ + "Body"
-                    field_schema.title = title
-                    response["schema"] = self.definitions.from_schema(field_schema)
-
-                elif location in ("header", "headers"):
-                    header_schema = self.type_converter(field_schema)
-                    headers = header_schema.get("properties")
-                    if headers:
-                        # Response headers doesn't accept titles
-                        for header in headers.values():
-                            header.pop("title")
-
-                        response["headers"] = headers
-
+            response = self.from_response_schema(response_schema)
             pointer = response_schema.__class__.__name__
             if self.ref:
                 response = self._ref(response, pointer)
@@ -257,6 +301,46 @@ class ResponseHandler(object):
 
         return responses
 
+    @profiled("responses")
+    def from_response_schema(self, response_schema):
+        """
+        Creates a Swagger response object from a response schema.
+
+        :param response_schema:
+            Colander schema with a description, and optionally ``body`` and
+            ``headers`` children.
+        :rtype: dict
+        :returns: Response object.
+        """
+        response = {}
+        if response_schema.description:
+            response["description"] = response_schema.description
+        else:
+            raise CorniceSwaggerException("Responses must have a description.")
+
+        for field_schema in response_schema.children:
+            location = field_schema.name
+
+            if location == "body":
+                title = field_schema.__class__.__name__
+                if title == "body":
+                    title = response_schema.__class__.__name__ + "Body"
+                field_schema = copy.copy(field_schema)
+                field_schema.title = title
+                response["schema"] = self.definitions.from_schema(field_schema)
+
+            elif location in ("header", "headers"):
+                header_schema = self.type_converter(field_schema)
+                headers = header_schema.get("properties")
+                if headers:
+                    # Response headers doesn't accept titles
+                    for header in headers.values():
+                        header.pop("title")
+
+                    response["headers"] = headers
+
+        return response
+
     def _ref(self, resp, base_name=None):
         """
         Store a response schema and return a reference to it.
@@ -272,6 +356,8 @@ class ResponseHandler(object):
 
         name = base_name or resp.get("title", "") or resp.get("name", "")
 
+        if self.dedup:
+            name = unique_name(self.response_registry, name, resp)
         pointer = self.json_pointer + name
         self.response_registry[name] = resp
 
@@ -299,7 +385,16 @@ class CorniceSwagger(object):
 
     schema_transformers = [body_schema_transformer]
     """List of request schema transformers that should be applied to a request
-    schema to make it comply with a cornice default request schema."""
+    schema to make it comply with a cornice default request schema. Schemas are
+    cloned before being transformed unless all transformers have a
+    `mutates_schema` attribute set to False. Transformed schemas are cached by
+    schema, validators and transformers, so views sharing them share the
+    transformed schema: transformers reading other view arguments must list
+    their names in an `args_keys` attribute to have them in the cache key."""
+
+    transformed_schemas_cache_size = 512
+    """How many transformed schemas to keep, least recently used ones are
+    dropped first."""
 
     type_converter = TypeConverter
     """Default :class:`cornice_swagger.converters.schema.TypeConversionDispatcher`
@@ -359,6 +454,17 @@ class CorniceSwagger(object):
     """Base OpenAPI document that should be merged with the extracted info
     from the generate call."""
 
+    cache_fragments = False
+    """Keep the path object built for each service, along with the definitions,
+    parameters and responses it registered, and only convert again the
+    services whose path, definitions or schemas changed on the next calls to
+    `generate`. Schemas and views are compared by identity, so they must not
+    be mutated in place."""
+
+    dedup_report = None
+    """:class:`cornice_swagger.dedup.DedupReport` of the last `generate` call
+    deduplicating the document, telling how many bytes were saved."""
+
     def __init__(
         self,
         services=None,
@@ -366,6 +472,9 @@ class CorniceSwagger(object):
         param_ref=False,
         resp_ref=False,
         pyramid_registry=None,
+        def_dedup=False,
+        param_dedup=False,
+        resp_dedup=False,
     ):
         """
         :param services:
@@ -386,6 +495,19 @@ class CorniceSwagger(object):
         :param pyramid_registry:
             Pyramid registry, should be passed if you use pyramid routes
             instead of service level paths.
+        :param def_dedup:
+            Defines if object schemas found several times in the document
+            should be put once on the definitions section and referenced by
+            JSON pointers. Schemas are compared by content, ignoring their
+            titles, and different definitions with a same title get numbered
+            names. Default is inline.
+        :param param_dedup:
+            Defines if parameters found several times in the document should
+            be put once on the parameters section and referenced by JSON
+            pointers. Parameters are compared by content, and different
+            parameters with a same name get numbered names. Default is inline.
+        :param resp_dedup:
+            Same as `param_dedup` for responses.
         """
         super(CorniceSwagger, self).__init__()
 
@@ -394,27 +516,52 @@ class CorniceSwagger(object):
         )
         parameter_converter = self.parameter_converter(type_converter)
         self.pyramid_registry = pyramid_registry
+        self.def_dedup = def_dedup
+        self.param_dedup = param_dedup
+        self.resp_dedup = resp_dedup
+        self._fragments = {}
+        self._transformed_schemas = OrderedDict()
+        self._transformed_schemas_lock = threading.Lock()
         if services is not None:
             self.services = services
 
         # Instantiate handlers
-        self.definitions = self.definitions(ref=def_ref_depth, type_converter=type_converter)
+        self.definitions = self.definitions(
+            ref=def_ref_depth, type_converter=type_converter, dedup=def_dedup
+        )
         self.parameters = self.parameters(
             self.definitions,
             ref=param_ref,
             type_converter=type_converter,
             parameter_converter=parameter_converter,
+            dedup=param_dedup,
         )
         self.responses = self.responses(
-            self.definitions, ref=resp_ref, type_converter=type_converter
+            self.definitions, ref=resp_ref, type_converter=type_converter, dedup=resp_dedup
         )
 
     def generate(
-        self, title=None, version=None, base_path=None, info=None, swagger=None, **kwargs
+        self,
+        title=None,
+        version=None,
+        base_path=None,
+        info=None,
+        swagger=None,
+        workers=None,
+        pool="thread",
+        stats=None,
+        profiler=None,
+        **kwargs,
     ):
         """Generate a Swagger 2.0 documentation. Keyword arguments may be used
         to provide additional information to build methods as such ignores.
 
+        Each call registers definitions, parameters and responses on its own
+        handlers and doesn't alter the arguments nor the class defaults, so a
+        generator may be called from several threads at once. Once a call
+        returns, the handlers registries of the generator hold the ones it
+        registered, as after `iter_operations`, see `iter_registries`.
+
         :param title:
             The name presented on the swagger document.
         :param version:
@@ -425,23 +572,288 @@ class CorniceSwagger(object):
             Swagger info field.
         :param swagger:
             Extra fields that should be provided on the swagger documentation.
+        :param workers:
+            Number of workers converting services in parallel. Default (None)
+            converts them one after another. The document is the same either
+            way.
+        :param pool:
+            Either "thread" or "process". Colander conversion mostly holds
+            the GIL, so only process workers scale with cores; they are forked
+            and require a platform supporting it.
+        :param stats:
+            :class:`cornice_swagger.stats.GenerationStats` collecting the time
+            spent in each phase of the generation and the numbers of converted
+            and emitted objects. They are also logged at debug level. Default
+            (None) collects nothing.
+        :param profiler:
+            :class:`cornice_swagger.stats.CostProfiler` attributing the time
+            spent and bytes emitted to each converted schema class and
+            operation. Default (None) profiles nothing.
+
+        :rtype: dict
+        :returns: Full OpenAPI/Swagger compliant specification for the application.
+        """
+        if profiler is not None:
+            with profiler.collect():
+                return self.generate(
+                    title, version, base_path, info, swagger, workers, pool, stats, **kwargs
+                )
+
+        if stats is not None:
+            with stats.collect():
+                swagger = self.generate(
+                    title, version, base_path, info, swagger, workers, pool, **kwargs
+                )
+            self._count_emitted(swagger, stats)
+            logger.debug("Generation statistics:\n%s", stats)
+            return swagger
+
+        # each call converts services with its own handlers registries, so
+        # concurrent calls don't see each other's components
+        generator = self._spawn()
+        swagger = generator._generate(title, version, base_path, info, swagger, workers, pool)
+        self._publish(generator)
+        return swagger
+
+    def _generate(self, title, version, base_path, info, swagger, workers, pool):
+        """Generate the document with the registries of the generator, see
+        `generate`."""
+        swagger = self._build_base(title, version, base_path, info, swagger)
+        paths, tags = self._build_paths(workers, pool)
+        return self._complete(swagger, paths, tags)
+
+    async def agenerate(
+        self,
+        title=None,
+        version=None,
+        base_path=None,
+        info=None,
+        swagger=None,
+        batch=1,
+        stats=None,
+        profiler=None,
+        **kwargs,
+    ):
+        """Generate a Swagger 2.0 documentation from a coroutine, converting
+        services by batches and yielding to the event loop between them.
+        Takes the same arguments as `generate`, except `workers` and `pool`
+        since services are converted on the event loop, and returns the same
+        document.
+
+        The generator is left unchanged when the coroutine is cancelled. The
+        total time of the statistics includes the time other tasks run between
+        batches.
+
+        :param batch:
+            Number of services converted between two yields.
 
         :rtype: dict
         :returns: Full OpenAPI/Swagger compliant specification for the application.
         """
+        if "workers" in kwargs or "pool" in kwargs:
+            raise CorniceSwaggerException("agenerate converts services without workers")
+
+        if profiler is not None:
+            with profiler.collect():
+                return await self.agenerate(
+                    title, version, base_path, info, swagger, batch, stats, **kwargs
+                )
+
+        if stats is not None:
+            with stats.collect():
+                swagger = await self.agenerate(
+                    title, version, base_path, info, swagger, batch, **kwargs
+                )
+            self._count_emitted(swagger, stats)
+            logger.debug("Generation statistics:\n%s", stats)
+            return swagger
+
+        generator = self._spawn()
+        swagger = generator._build_base(title, version, base_path, info, swagger)
+        paths = {}
+        tags = []
+
+        built = generator._iter_paths()
+        try:
+            for index, (path, path_obj, service_tags) in enumerate(built, 1):
+                tags = generator._get_tags(tags, service_tags)
+                paths[path] = path_obj
+                if index % batch == 0:
+                    await asyncio.sleep(0)
+        finally:
+            built.close()
+
+        swagger = generator._complete(swagger, paths, tags)
+        self._publish(generator)
+        return swagger
+
+    def _complete(self, swagger, paths, tags):
+        """Merge the paths, tags and handlers registries into the document
+        base, deduplicating it if enabled."""
+        self._merge_tags(swagger, tags)
+
+        # Create/Update swagger sections with extracted values where not provided
+        if paths:
+            with phase("merge"):
+                swagger.setdefault("paths", {})
+                merge_dicts(swagger["paths"], paths)
+
+        self._merge_registries(swagger)
+
+        deduplicators = self._get_deduplicators()
+        if deduplicators:
+            swagger = self._dedup(swagger, deduplicators)
+
+        return swagger
+
+    def iterencode(
+        self,
+        title=None,
+        version=None,
+        base_path=None,
+        info=None,
+        swagger=None,
+        workers=None,
+        pool="thread",
+        **kwargs,
+    ):
+        """Generate a Swagger 2.0 documentation as JSON text chunks. Takes the
+        same arguments as `generate`.
+
+        Paths are converted and encoded one service at a time, so the first
+        chunks are available before the last service is converted and the
+        paths are never held in memory all together. Sections are not ordered
+        as in `generate` but hold the same values, except when several services
+        share a path: it is then encoded once per service.
+
+        With `def_dedup`, `param_dedup` or `resp_dedup`, a value found in
+        several paths is only replaced by a JSON pointer from its second
+        occurrence, components holding the same value are not merged and no
+        `dedup_report` is made.
+
+        :rtype: iterator
+        :returns: JSON text chunks of the full OpenAPI/Swagger specification.
+        """
+        generator = self._spawn()
+        yield from generator._iterencode(title, version, base_path, info, swagger, workers, pool)
+        self._publish(generator)
+
+    def _iterencode(self, title, version, base_path, info, swagger, workers, pool):
+        """Encode the document with the registries of the generator, see
+        `iterencode`."""
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        deduplicators = self._get_deduplicators()
+
+        swagger = self._build_base(title, version, base_path, info, swagger)
+        provided_paths = swagger.pop("paths", {})
+        sections = {}
+        for section in ("tags", "definitions", "parameters", "responses"):
+            if section in swagger:
+                sections[section] = swagger.pop(section)
+
+        yield "{"
+        for key, value in swagger.items():
+            yield encode(key) + ":" + encode(value) + ","
+
+        yield '"paths":{'
+        tags = []
+        encoded_paths = set()
+        for path, path_obj, service_tags in self._iter_paths(workers, pool):
+            tags = self._get_tags(tags, service_tags)
+            if path in provided_paths:
+                provided_path_obj = {}
+                merge_dicts(provided_path_obj, provided_paths[path])
+                merge_dicts(provided_path_obj, path_obj)
+                path_obj = provided_path_obj
+            for deduplicator in deduplicators:
+                if deduplicator.section == "definitions":
+                    path_obj = deduplicator.dedup(path_obj)
+                else:
+                    path_obj = deduplicator.dedup_path(path_obj)
+            separator = "," if encoded_paths else ""
+            encoded_paths.add(path)
+            yield separator + encode(path) + ":" + encode(path_obj)
+
+        for path, path_obj in provided_paths.items():
+            if path not in encoded_paths:
+                separator = "," if encoded_paths else ""
+                encoded_paths.add(path)
+                yield separator + encode(path) + ":" + encode(path_obj)
+        yield "}"
+
+        self._merge_tags(sections, tags)
+        self._merge_registries(sections)
+        if self.def_dedup:
+            # shared schemas of the registries go to the document definitions
+            deduplicator = deduplicators[0]
+            deduplicator.definitions = sections.setdefault("definitions", {})
+            sections = deduplicator.dedup(sections)
+            if not sections["definitions"]:
+                del sections["definitions"]
+        for key, value in sections.items():
+            yield "," + encode(key) + ":" + encode(value)
+        yield "}"
+
+    def iter_operations(self, workers=None, pool="thread"):
+        """Convert services one at a time, yielding their operations as soon as
+        they are built.
+
+        Path level parameters are yielded with ``"parameters"`` as method.
+        Definitions, parameters and responses referenced by the operations are
+        stored in the handlers registries while converting, see `iter_registries`.
+
+        :param workers:
+            Number of parallel workers, see `generate`.
+        :param pool:
+            Kind of workers, see `generate`.
+
+        :rtype: iterator
+        :returns: ``(path, method, operation)`` tuples.
+        """
+        for path, path_obj, _ in self._iter_paths(workers, pool):
+            for method, operation in path_obj.items():
+                yield path, method, operation
+
+    def iter_registries(self):
+        """Yield the definitions, parameters and responses registered by the
+        operations converted so far, usually once `iter_operations` is exhausted.
+
+        :rtype: iterator
+        :returns: ``(section, name, value)`` tuples, section being one of
+            ``"definitions"``, ``"parameters"`` or ``"responses"``.
+        """
+        for section, registry in self._get_registries():
+            for name, value in list(registry.items()):
+                yield section, name, value
+
+    def write(self, fp, **kwargs):
+        """Generate a Swagger 2.0 documentation and write it to a file while
+        services are converted. Takes the same arguments as `generate`.
+
+        :param fp:
+            File object opened in text mode.
+        """
+        for chunk in self.iterencode(**kwargs):
+            fp.write(chunk)
+
+    def _build_base(self, title, version, base_path, info, swagger):
+        """Build the document extracted values are merged into from the
+        arguments of `generate` and the class defaults."""
         title = title or self.api_title
         version = version or self.api_version
         info = info or self.swagger.get("info", {})
         swagger = swagger or self.swagger
         base_path = base_path or self.base_path
 
-        swagger = swagger.copy()
-        info.update(title=title, version=version)
+        # the document is altered while merged, the class default and the
+        # arguments are shared by concurrent calls
+        swagger = copy.deepcopy(swagger)
+        info = dict(copy.deepcopy(info), title=title, version=version)
         swagger.update(swagger="2.0", info=info, basePath=base_path)
+        return swagger
 
-        paths, tags = self._build_paths()
-
-        # Update the provided tags with the extracted ones preserving order
+    def _merge_tags(self, swagger, tags):
+        """Update the provided tags with the extracted ones preserving order"""
         if tags:
             swagger.setdefault("tags", [])
             tag_names = {t["name"] for t in swagger["tags"]}
@@ -449,28 +861,56 @@ class CorniceSwagger(object):
                 if tag["name"] not in tag_names:
                     swagger["tags"].append(tag)
 
-        # Create/Update swagger sections with extracted values where not provided
-        if paths:
-            swagger.setdefault("paths", {})
-            merge_dicts(swagger["paths"], paths)
-
-        definitions = self.definitions.definition_registry
-        if definitions:
-            swagger.setdefault("definitions", {})
-            merge_dicts(swagger["definitions"], definitions)
-
-        parameters = self.parameters.parameter_registry
-        if parameters:
-            swagger.setdefault("parameters", {})
-            merge_dicts(swagger["parameters"], parameters)
-
-        responses = self.responses.response_registry
-        if responses:
-            swagger.setdefault("responses", {})
-            merge_dicts(swagger["responses"], responses)
-
+    @timed("merge")
+    def _merge_registries(self, swagger):
+        """Create/Update the definitions, parameters and responses sections
+        with the handlers registries where not provided"""
+        for section, registry in self._get_registries():
+            if registry:
+                swagger.setdefault(section, {})
+                merge_dicts(swagger[section], registry)
+
+    def _count_emitted(self, swagger, stats):
+        """Count the services, operations and components of a document."""
+        stats.count("services", len(self.services))
+        operations = 0
+        for path_obj in swagger.get("paths", {}).values():
+            operations += sum(1 for method in path_obj if method != "parameters")
+        stats.count("operations", operations)
+        for section, _ in self._get_registries():
+            stats.count(section + "_emitted", len(swagger.get(section, {})))
+
+    def _get_deduplicators(self):
+        """Instantiate the deduplicators of the enabled dedup options, filling
+        the handlers registries."""
+        deduplicators = []
+        enabled = (self.def_dedup, self.param_dedup, self.resp_dedup)
+        for dedup, cls, (_, registry) in zip(enabled, DEDUPLICATORS, self._get_registries()):
+            if dedup:
+                deduplicators.append(cls(registry))
+        return deduplicators
+
+    @timed("dedup")
+    def _dedup(self, swagger, deduplicators):
+        """Move the values found several times in the document to the
+        definitions, parameters and responses sections, and report the bytes
+        saved in `dedup_report`"""
+        swagger, self.dedup_report = dedup_document(swagger, deduplicators)
+        logger.info(
+            "Deduplication saved %d bytes out of %d",
+            self.dedup_report.bytes_saved,
+            self.dedup_report.original_size,
+        )
         return swagger
 
+    def _get_registries(self):
+        """List the handlers registries with the document section they fill."""
+        return [
+            ("definitions", self.definitions.definition_registry),
+            ("parameters", self.parameters.parameter_registry),
+            ("responses", self.responses.response_registry),
+        ]
+
     def __call__(self, *args, **kwargs):
         """Deprecated alias of `generate`."""
         self.__dict__.update(**kwargs)
@@ -492,7 +932,7 @@ class CorniceSwagger(object):
                 tags.append(root_tag)
         return tags
 
-    def _build_paths(self):
+    def _build_paths(self, workers=None, pool="thread"):
         """
         Build the Swagger "paths" and "tags" attributes from cornice service
         definitions.
@@ -500,75 +940,275 @@ class CorniceSwagger(object):
         paths = {}
         tags = []
 
-        for service in self.services:
-            path, path_obj = self._extract_path_from_service(service)
-
-            service_tags = getattr(service, "tags", [])
-            self._check_tags(service_tags)
+        for path, path_obj, service_tags in self._iter_paths(workers, pool):
             tags = self._get_tags(tags, service_tags)
+            paths[path] = path_obj
+
+        return paths, tags
+
+    def _iter_paths(self, workers=None, pool="thread"):
+        """
+        Build the path object of each service, reusing the cached fragments
+        of unchanged services when `cache_fragments` is enabled and converting
+        the others in parallel when workers are requested.
+
+        :rtype: iterator
+        :returns: ``(path, path_obj, tags)`` tuples as returned by `_build_path`.
+        """
+        if not (self.cache_fragments or workers):
+            for service in self.services:
+                yield self._build_path(service)
+            return
+
+        if self.cache_fragments:
+            for _, registry in self._get_registries():
+                registry.clear()
+            settings_key = self._get_settings_fingerprint()
+            keys = [(settings_key, self._get_service_fingerprint(s)) for s in self.services]
+            missing = [i for i, key in enumerate(keys) if key not in self._fragments]
+        else:
+            keys = [None] * len(self.services)
+            missing = list(range(len(self.services)))
+
+        built = self._build_fragments(missing, workers, pool)
+        missing = set(missing)
+        fragments = {}
+        for index, key in enumerate(keys):
+            # documents may be altered by users, fragments are cached packed
+            # and only handed out as copies
+            if index in missing:
+                fragment = next(built)
+                if self.cache_fragments:
+                    # a list, since the copy_json fallback of pack_json, used
+                    # when marshal can't serialize a value, shares tuples
+                    fragments[key] = pack_json(list(fragment))
+            else:
+                fragments[key] = self._fragments[key]
+                fragment = unpack_json(fragments[key])
+
+            path, path_obj, tags, contributions = fragment
+            path_obj, contributions = self._merge_numbered(path_obj, contributions)
+            for (_, registry), contribution in zip(self._get_registries(), contributions):
+                registry.update(contribution)
+            yield path, path_obj, tags
+
+        if self.cache_fragments:
+            # drop the fragments of services which are gone or changed
+            self._fragments = fragments
+
+    def _merge_numbered(self, path_obj, contributions):
+        """
+        Merge the contributions of a fragment to the registries of the
+        handlers numbering names, renaming the names already holding different
+        values as when converting services one after another.
+
+        :returns: The fragment path object and contributions with references
+            to the renamed components updated, merged contributions being
+            emptied.
+        """
+        handlers = (self.definitions, self.parameters, self.responses)
+        contributions = list(contributions)
+        for index, handler in enumerate(handlers):
+            if not handler.dedup:
+                continue
+            registry = self._get_registries()[index][1]
+            renames = {}
+            for name, value in contributions[index].items():
+                # definitions are registered after the ones they reference
+                value = rewrite_refs(value, renames)
+                target = unique_name(registry, name, value)
+                if target != name:
+                    renames[handler.json_pointer + name] = handler.json_pointer + target
+                registry[target] = value
+
+            contributions[index] = {}
+            if renames:
+                path_obj = rewrite_refs(path_obj, renames)
+                contributions = rewrite_refs(contributions, renames)
+        return path_obj, contributions
+
+    def _build_fragments(self, indexes, workers=None, pool="thread"):
+        """
+        Build the fragments of some services, in parallel if workers are
+        requested.
+
+        :param indexes:
+            Indexes of the services to convert.
+
+        :rtype: iterator
+        :returns: Fragments as returned by `_build_fragment`, in indexes order.
+        """
+        if not workers or not indexes:
+            return (self._build_fragment(self.services[i]) for i in indexes)
+
+        generator = self
+        if self.pyramid_registry is None:
+            # workers don't share the caller's pyramid threadlocals
+            generator = copy.copy(self)
+            generator.pyramid_registry = get_current_registry()
+
+        if pool == "thread":
+            executor = ThreadPoolExecutor(workers)
+            return _map(executor, bind(generator._build_fragment_at), indexes)
+        elif pool == "process":
+            executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+                initargs=(generator,),
+            )
+            return _map(executor, _build_worker_fragment, indexes)
+        raise CorniceSwaggerException("pool should be either 'thread' or 'process'")
+
+    def _build_fragment_at(self, index):
+        """Build the fragment of the service at index in `services`."""
+        return self._build_fragment(self.services[index])
+
+    def _build_fragment(self, service):
+        """
+        Build the path of a service with empty handlers registries to record
+        the definitions, parameters and responses it contributes.
 
-            for method, view, args in service.definitions:
-                if method.lower() in map(str.lower, self.ignore_methods):
-                    continue
-
-                op = self._extract_operation_from_view(view, args)
-
-                if any(ctype in op.get("consumes", []) for ctype in self.ignore_ctypes):
-                    continue
-
-                # XXX: Swagger doesn't support different schemas for for a same method
-                # with different ctypes as cornice. If this happens, you may ignore one
-                # content-type from the documentation otherwise we raise an Exception
-                # Related to https://github.com/OAI/OpenAPI-Specification/issues/146
-                previous_definition = path_obj.get(method.lower())
-                if previous_definition:
-                    raise CorniceSwaggerException(
-                        (
-                            "Swagger doesn't support multiple "
-                            "views for a same method. You may "
-                            "ignore one."
-                        )
+        :rtype: tuple
+        :returns: The `_build_path` result and the contributed registries.
+        """
+        generator = self._spawn()
+        path, path_obj, tags = generator._build_path(service)
+        contributions = [registry for _, registry in generator._get_registries()]
+        return path, path_obj, tags, contributions
+
+    def _spawn(self):
+        """Copy the generator with its own handlers and empty registries."""
+        generator = copy.copy(self)
+        generator.definitions = copy.copy(self.definitions)
+        generator.definitions.definition_registry = {}
+        generator.parameters = copy.copy(self.parameters)
+        generator.parameters.parameter_registry = {}
+        generator.parameters.definitions = generator.definitions
+        generator.responses = copy.copy(self.responses)
+        generator.responses.response_registry = {}
+        generator.responses.definitions = generator.definitions
+        return generator
+
+    def _publish(self, generator):
+        """Keep the fragments, deduplication report and handlers registries of
+        a generator copy made by `_spawn` once its call is over."""
+        self._fragments = generator._fragments
+        self.dedup_report = generator.dedup_report
+        self.definitions.definition_registry = generator.definitions.definition_registry
+        self.parameters.parameter_registry = generator.parameters.parameter_registry
+        self.responses.response_registry = generator.responses.response_registry
+
+    def _get_settings_fingerprint(self):
+        """Fingerprint the generator settings changing how services are converted."""
+        return fingerprint(
+            (
+                self.ignore_methods,
+                self.ignore_ctypes,
+                self.default_tags,
+                self.default_op_ids,
+                self.default_security,
+                self.summary_docstrings,
+                self.schema_transformers,
+                self.definitions.ref,
+                self.parameters.ref,
+                self.responses.ref,
+            )
+        )
+
+    def _get_service_fingerprint(self, service):
+        """Fingerprint a cornice service from its path, route and view definitions,
+        schema classes and instances being compared by identity."""
+        return fingerprint(
+            (
+                service.path,
+                getattr(service, "pyramid_route", None),
+                getattr(service, "tags", None),
+                service.definitions,
+            )
+        )
+
+    @timed("operations", service=True)
+    def _build_path(self, service):
+        """
+        Build the Swagger path object of a cornice service.
+
+        :param service:
+            Cornice service to extract information from.
+
+        :rtype: tuple
+        :returns: The path, its path object and the names of the tags found.
+        """
+        path, path_obj = self._extract_path_from_service(service)
+
+        service_tags = getattr(service, "tags", [])
+        self._check_tags(service_tags)
+        tags = list(service_tags)
+
+        for method, view, args in service.definitions:
+            if method.lower() in map(str.lower, self.ignore_methods):
+                continue
+
+            op = profile_call(
+                "operations", (path, method), self._extract_operation_from_view, view, args
+            )
+
+            if any(ctype in op.get("consumes", []) for ctype in self.ignore_ctypes):
+                continue
+
+            # XXX: Swagger doesn't support different schemas for for a same method
+            # with different ctypes as cornice. If this happens, you may ignore one
+            # content-type from the documentation otherwise we raise an Exception
+            # Related to https://github.com/OAI/OpenAPI-Specification/issues/146
+            previous_definition = path_obj.get(method.lower())
+            if previous_definition:
+                raise CorniceSwaggerException(
+                    (
+                        "Swagger doesn't support multiple "
+                        "views for a same method. You may "
+                        "ignore one."
                     )
+                )
 
-                # If tag not defined and a default tag is provided
-                if "tags" not in op and self.default_tags:
-                    if callable(self.default_tags):
-                        op["tags"] = self.default_tags(service, method)
-                    else:
-                        op["tags"] = self.default_tags
-
-                op_tags = op.get("tags", [])
-                self._check_tags(op_tags)
-
-                # Add service tags
-                if service_tags:
-                    new_tags = service_tags + op_tags
-                    op["tags"] = list(OrderedDict.fromkeys(new_tags))
-
-                # Add method tags to root tags
-                tags = self._get_tags(tags, op_tags)
-
-                # If operation id is not defined and a default generator is provided
-                if "operationId" not in op and self.default_op_ids:
-                    if not callable(self.default_op_ids):
-                        raise CorniceSwaggerException("default_op_id should be a callable.")
-                    op["operationId"] = self.default_op_ids(service, method)
-
-                # If security options not defined and default is provided
-                if "security" not in op and self.default_security:
-                    if callable(self.default_security):
-                        op["security"] = self.default_security(service, method)
-                    else:
-                        op["security"] = self.default_security
-
-                if not isinstance(op.get("security", []), list):
-                    raise CorniceSwaggerException("security should be a list or callable")
-
-                path_obj[method.lower()] = op
-            paths[path] = path_obj
+            # If tag not defined and a default tag is provided
+            if "tags" not in op and self.default_tags:
+                if callable(self.default_tags):
+                    op["tags"] = self.default_tags(service, method)
+                else:
+                    op["tags"] = self.default_tags
 
-        return paths, tags
+            op_tags = op.get("tags", [])
+            self._check_tags(op_tags)
+
+            # Add service tags
+            if service_tags:
+                new_tags = service_tags + op_tags
+                op["tags"] = list(OrderedDict.fromkeys(new_tags))
+
+            # Add method tags to root tags
+            tags.extend(op_tags)
+
+            # If operation id is not defined and a default generator is provided
+            if "operationId" not in op and self.default_op_ids:
+                if not callable(self.default_op_ids):
+                    raise CorniceSwaggerException("default_op_id should be a callable.")
+                op["operationId"] = self.default_op_ids(service, method)
 
+            # If security options not defined and default is provided
+            if "security" not in op and self.default_security:
+                if callable(self.default_security):
+                    op["security"] = self.default_security(service, method)
+                else:
+                    op["security"] = self.default_security
+
+            if not isinstance(op.get("security", []), list):
+                raise CorniceSwaggerException("security should be a list or callable")
+
+            path_obj[method.lower()] = op
+
+        return path, path_obj, list(OrderedDict.fromkeys(tags))
+
+    @timed("routes")
     def _extract_path_from_service(self, service):
         """
         Extract path object and its parameters from service definitions.
@@ -659,7 +1299,10 @@ class CorniceSwagger(object):
         is_colander = self._is_colander_schema(args)
         if is_colander:
             schema = self._extract_transform_colander_schema(args)
-            parameters = self.parameters.from_schema(schema)
+            # transformers may wrap the schema, profile it by its given class
+            parameters = profile_call(
+                "requests", get_class_name(args["schema"]), self.parameters.from_schema, schema
+            )
         else:
             # Bail out for now
             parameters = None
@@ -702,6 +1345,7 @@ class CorniceSwagger(object):
             inspect.isclass(schema) and issubclass(schema, colander.MappingSchema)
         )
 
+    @timed("schema_transform")
     def _extract_transform_colander_schema(self, args):
         """
         Extract schema from view args and transform it using
@@ -711,13 +1355,60 @@ class CorniceSwagger(object):
             Arguments from the view decorator.
 
         :rtype: colander.MappingSchema()
-        :returns: View schema cloned and transformed
+        :returns: View schema transformed, must not be altered
         """
 
         schema = args.get("schema", colander.MappingSchema())
+        used_args = [
+            args.get(name)
+            for transformer in self.schema_transformers
+            for name in getattr(transformer, "args_keys", ())
+        ]
+        key = fingerprint(
+            (schema, args.get("validators", ()), self.schema_transformers, used_args)
+        )
+        with self._transformed_schemas_lock:
+            transformed = self._transformed_schemas.get(key)
+            if transformed is not None:
+                self._transformed_schemas.move_to_end(key)
+                return transformed
+
         if not isinstance(schema, colander.Schema):
-            schema = schema()
-        schema = schema.clone()
+            transformed = schema()
+        elif any(getattr(t, "mutates_schema", True) for t in self.schema_transformers):
+            transformed = schema.clone()
+        else:
+            transformed = schema
         for transformer in self.schema_transformers:
-            schema = transformer(schema, args)
-        return schema
+            transformed = transformer(transformed, args)
+
+        with self._transformed_schemas_lock:
+            self._transformed_schemas[key] = transformed
+            if len(self._transformed_schemas) > self.transformed_schemas_cache_size:
+                self._transformed_schemas.popitem(last=False)
+        return transformed
+
+
+_worker_generator = None
+"""Generator used by the current worker process, see `CorniceSwagger.generate`."""
+
+
+def _init_worker(generator):
+    """Initialize a forked worker process with the generator of its pool."""
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _build_worker_fragment(index):
+    """Build a service fragment in a worker process."""
+    return _worker_generator._build_fragment_at(index)
+
+
+def _map(executor, fn, items):
+    """Yield the results of fn over items from an executor in items order, the
+    pending calls being cancelled if the results are not all consumed."""
+    try:
+        for result in executor.map(fn, items):
+            yield result
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -1,3 +1,6 @@
+import copy
+import marshal
+
 import colander
 from cornice.validators import colander_body_validator
 
@@ -22,12 +25,16 @@ def trim(docstring):
 def body_schema_transformer(schema, args):
     validators = args.get("validators", [])
     if colander_body_validator in validators:
-        body_schema = schema
+        # the body node is renamed, keep the given schema untouched
+        body_schema = copy.copy(schema)
         schema = colander.MappingSchema()
         schema["body"] = body_schema
     return schema
 
 
+body_schema_transformer.mutates_schema = False
+
+
 def merge_dicts(base, changes):
     """Merge b into a recursively, without overwriting values.
 
@@ -39,3 +46,76 @@ def merge_dicts(base, changes):
             merge_dicts(base.setdefault(k, {}), v)
         else:
             base.setdefault(k, v)
+
+
+class IdentityKey(object):
+    """Hashable wrapper comparing objects by identity, keeping them alive so
+    their id can't be reused by another object."""
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, IdentityKey) and other.obj is self.obj
+
+
+def fingerprint(value):
+    """Build a hashable key from a value made of dicts, lists and tuples.
+
+    Scalars are compared by value and any other object, as classes, schemas
+    or callables, by identity.
+
+    :param value: the value to fingerprint.
+    """
+    if value is None or isinstance(value, (str, bytes)):
+        return value
+    if isinstance(value, (int, float)):
+        # True, 1 and 1.0 are equal but not encoded the same
+        return (type(value), value)
+    if isinstance(value, dict):
+        return (dict, tuple((fingerprint(k), fingerprint(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(fingerprint(v) for v in value))
+    return IdentityKey(value)
+
+
+def copy_json(value):
+    """Copy the dicts and lists of a JSON like value, other values are shared.
+    This is much faster than `copy.deepcopy` on converted schemas.
+
+    :param value: the value to copy.
+    """
+    if isinstance(value, dict):
+        return {k: copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_json(v) for v in value]
+    return value
+
+
+def pack_json(value):
+    """Serialize a JSON like value to get copies of it with `unpack_json`.
+    Values are serialized with marshal, which is much faster than copying
+    them, or copied with `copy_json` when they hold values marshal can't
+    serialize.
+
+    :param value: the value to pack.
+    """
+    try:
+        return marshal.dumps(value)
+    except ValueError:
+        return copy_json(value)
+
+
+def unpack_json(packed):
+    """Return a new copy of a value packed by `pack_json`.
+
+    :param packed: the packed value.
+    """
+    if isinstance(packed, bytes):
+        return marshal.loads(packed)
+    return copy_json(packed)
@@ -1,15 +1,19 @@
+import hashlib
 import importlib
+import itertools
 from string import Template
 
 import cornice
 import pkg_resources
-from pyramid.response import Response
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.response import FileResponse, Response
 
 import cornice_swagger
+from cornice_swagger.cache import get_shared_spec, get_spec_cache
 
 
-# hardcode for now since that will work for vast majority of users
-# maybe later add minified resources for behind firewall support?
+# default to the CDN since that will work for vast majority of users, the
+# explorer can serve local files instead for behind firewall support
 ui_css_url = "https://cdnjs.cloudflare.com/ajax/libs/" "swagger-ui/3.23.11/swagger-ui.css"
 ui_js_bundle_url = (
     "https://cdnjs.cloudflare.com/ajax/libs/" "swagger-ui/3.23.11/swagger-ui-bundle.js"
@@ -17,6 +21,56 @@ ui_js_bundle_url = (
 ui_js_standalone_url = (
     "https://cdnjs.cloudflare.com/ajax/libs/" "swagger-ui/3.23.11/swagger-ui-standalone-preset.js"
 )
+ui_fonts_url = (
+    "https://fonts.googleapis.com/css"
+    "?family=Open+Sans:400,700|Source+Code+Pro:300,600|Titillium+Web:400,600,700"
+)
+
+
+# locally served assets have content-hashed urls and never change
+immutable_cache_control = "public, max-age=31536000, immutable"
+
+# streamed specs are written by blocks of at least this size
+stream_buffer_size = 64 * 1024
+
+# templates are read once at import time
+index_template = Template(
+    pkg_resources.resource_string("cornice_swagger", "templates/index.html").decode("utf8")
+)
+index_script_template = Template(
+    pkg_resources.resource_string(
+        "cornice_swagger", "templates/index_script_template.html"
+    ).decode("utf8")
+)
+index_shards_script_template = Template(
+    pkg_resources.resource_string(
+        "cornice_swagger", "templates/index_shards_script_template.html"
+    ).decode("utf8")
+)
+
+# rendered pages are cached per spec url, this bounds how many are kept
+ui_pages_cache_size = 32
+
+
+def get_swagger_ui_script_generator(registry):
+    """
+    :param registry:
+    :return:
+
+    Resolves the `cornice_swagger.swagger_ui_script_generator` setting once and
+    keeps the callable in the registry
+    """
+    script_callable = getattr(registry, "cornice_swagger_ui_script_generator", None)
+    if script_callable is None:
+        script_generator = registry.settings.get(
+            "cornice_swagger.swagger_ui_script_generator",
+            "cornice_swagger.views:swagger_ui_script_template",
+        )
+        package, callable = script_generator.split(":")
+        imported_package = importlib.import_module(package)
+        script_callable = getattr(imported_package, callable)
+        registry.cornice_swagger_ui_script_generator = script_callable
+    return script_callable
 
 
 def swagger_ui_template_view(request):
@@ -26,27 +80,112 @@ def swagger_ui_template_view(request):
     `cornice_swagger.swagger_ui_script_generator` in pyramid config, it defaults
     to 'cornice_swagger.views:swagger_ui_script_template'
 
+    The page is rendered once per spec url and then served from a cache in the
+    registry, with a strong ETag.
+
     :param request:
     :return:
     """
-    script_generator = request.registry.settings.get(
-        "cornice_swagger.swagger_ui_script_generator",
-        "cornice_swagger.views:swagger_ui_script_template",
-    )
-    package, callable = script_generator.split(":")
-    imported_package = importlib.import_module(package)
-    script_callable = getattr(imported_package, callable)
-    template = pkg_resources.resource_string("cornice_swagger", "templates/index.html").decode(
-        "utf8"
+    registry = request.registry
+    pages = getattr(registry, "cornice_swagger_ui_pages", None)
+    if pages is None:
+        pages = registry.cornice_swagger_ui_pages = {}
+
+    try:
+        spec_url = request.route_url("cornice_swagger.open_api_path")
+    except KeyError:
+        spec_url = None
+
+    page = pages.get(spec_url)
+    if page is None:
+        script_callable = get_swagger_ui_script_generator(registry)
+        html = index_template.safe_substitute(
+            swagger_ui_script=script_callable(request),
+            **swagger_ui_asset_urls(request),
+        )
+        body = html.encode("utf8")
+        page = (body, hashlib.sha256(body).hexdigest())
+        if len(pages) >= ui_pages_cache_size:
+            pages.clear()
+        pages[spec_url] = page
+
+    body, etag = page
+    response = Response(body=body, charset="UTF-8", conditional_response=True)
+    response.etag = etag
+    return response
+
+
+def swagger_ui_asset_urls(request):
+    """
+    :param request:
+    :return:
+
+    Returns the urls of the Swagger UI css and javascript files, pointing to
+    the local assets route when the explorer serves them and to the CDN
+    otherwise, along with the link to the Google Fonts stylesheet, left out
+    with local assets
+    """
+    assets = getattr(request.registry, "cornice_swagger_ui_assets", None)
+    if assets is None:
+        return dict(
+            ui_fonts_link='<link href="{}" rel="stylesheet">'.format(ui_fonts_url),
+            ui_css_url=ui_css_url,
+            ui_js_bundle_url=ui_js_bundle_url,
+            ui_js_standalone_url=ui_js_standalone_url,
+        )
+
+    def asset_url(name):
+        filename = assets.by_name[name].filename
+        return request.route_path("cornice_swagger.ui_asset", filename=filename)
+
+    # local assets are used behind firewalls, the page falls back to the
+    # system fonts instead of loading them from Google Fonts
+    return dict(
+        ui_fonts_link="",
+        ui_css_url=asset_url("swagger-ui.css"),
+        ui_js_bundle_url=asset_url("swagger-ui-bundle.js"),
+        ui_js_standalone_url=asset_url("swagger-ui-standalone-preset.js"),
     )
 
-    html = Template(template).safe_substitute(
-        ui_css_url=ui_css_url,
-        ui_js_bundle_url=ui_js_bundle_url,
-        ui_js_standalone_url=ui_js_standalone_url,
-        swagger_ui_script=script_callable(request),
+
+def swagger_ui_asset_view(request):
+    """
+    :param request:
+    :return:
+
+    Serves a locally packaged Swagger UI file, its url contains a content hash
+    so it can be cached forever by clients
+    """
+    assets = request.registry.cornice_swagger_ui_assets
+    asset = assets.by_filename.get(request.matchdict["filename"])
+    if asset is None:
+        raise HTTPNotFound()
+    response = precompressed_response(request, asset)
+    response.cache_control = immutable_cache_control
+    return response
+
+
+def precompressed_response(request, body):
+    """
+    :param request:
+    :param body: `cornice_swagger.cache.PrecompressedBody` to serve
+    :return:
+
+    Builds a conditional response serving the variant of a precompressed body
+    matching the request's `Accept-Encoding` header
+    """
+    encoding = body.select_encoding(request.accept_encoding)
+    response = Response(
+        body=body.get_body(encoding),
+        content_type=body.content_type,
+        charset=None,
+        conditional_response=True,
     )
-    return Response(html)
+    response.etag = body.get_etag(encoding)
+    response.vary = ("Accept-Encoding",)
+    if encoding != body.identity:
+        response.content_encoding = encoding
+    return response
 
 
 def open_api_json_view(request):
@@ -54,14 +193,187 @@ def open_api_json_view(request):
     :param request:
     :return:
 
-    Generates JSON representation of Swagger spec
+    Serves JSON representation of Swagger spec, the generated spec is
+    encoded and compressed once and cached in the registry until services or
+    spec kwargs change. The compressed variant is picked from the request's
+    `Accept-Encoding` header. Responses carry a strong ETag so clients can
+    revalidate with `If-None-Match`, and `cornice_swagger.spec_cache_control`
+    can be set to send a `Cache-Control` header.
+    """
+    document = get_spec_cache(request.registry).get_document()
+    return spec_response(request, document)
+
+
+def spec_response(request, document):
+    """
+    :param request:
+    :param document: `cornice_swagger.cache.SpecDocument` to serve
+    :return:
+
+    Builds the response serving a cached spec document, with the
+    `cornice_swagger.spec_cache_control` header, and an `Age` header when the
+    document is stale and served while a new one is generated
+    """
+    response = precompressed_response(request, document)
+    cache_control = request.registry.settings.get("cornice_swagger.spec_cache_control")
+    if cache_control:
+        response.cache_control = cache_control
+    age = get_spec_cache(request.registry).get_age()
+    if age is not None:
+        response.age = age
+    return response
+
+
+def open_api_stream_view(request):
+    """
+    :param request:
+    :return:
+
+    Generates JSON representation of Swagger spec for each request and streams
+    it while services are converted, nothing is cached. The
+    `cornice_swagger.spec_cache_control` header is sent as by the other views
     """
     doc = cornice_swagger.CorniceSwagger(
         cornice.service.get_services(), pyramid_registry=request.registry
     )
     kwargs = request.registry.settings["cornice_swagger.spec_kwargs"]
-    my_spec = doc.generate(**kwargs)
-    return my_spec
+    chunks = doc.iterencode(**kwargs)
+    # start generating here so errors building the document base are raised
+    # before the response is started
+    first_chunk = next(chunks)
+    response = Response(
+        app_iter=iter_buffered(itertools.chain([first_chunk], chunks)),
+        content_type="application/json",
+        charset=None,
+    )
+    cache_control = request.registry.settings.get("cornice_swagger.spec_cache_control")
+    if cache_control:
+        response.cache_control = cache_control
+    return response
+
+
+def iter_buffered(chunks, size=None):
+    """
+    :param chunks: iterator of text chunks
+    :param size: minimum size of the yielded byte strings
+    :return:
+
+    Encodes text chunks and groups them in byte strings of at least `size`
+    bytes, so servers don't write a tiny packet per chunk
+    """
+    size = size or stream_buffer_size
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        data = chunk.encode("utf8")
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def open_api_shared_view(request):
+    """
+    :param request:
+    :return:
+
+    Serves JSON representation of Swagger spec from the memory mapping shared
+    by the processes forked after it was generated, by blocks so workers
+    don't copy it
+    """
+    document = get_shared_spec(request.registry)
+    encoding = document.select_encoding(request.accept_encoding)
+    body = document.get_body(encoding)
+    response = Response(
+        app_iter=iter_blocks(body),
+        content_type=document.content_type,
+        content_length=len(body),
+        charset=None,
+        conditional_response=True,
+    )
+    response.etag = document.get_etag(encoding)
+    response.vary = ("Accept-Encoding",)
+    if encoding != document.identity:
+        response.content_encoding = encoding
+    cache_control = request.registry.settings.get("cornice_swagger.spec_cache_control")
+    if cache_control:
+        response.cache_control = cache_control
+    return response
+
+
+def iter_blocks(buffer, size=None):
+    """
+    :param buffer: bytes-like object
+    :param size: size of the yielded byte strings
+    :return:
+
+    Copies a buffer by blocks of `size` bytes, so only one block at a time is
+    held in memory
+    """
+    size = size or stream_buffer_size
+    for offset in range(0, len(buffer), size):
+        yield bytes(buffer[offset : offset + size])
+
+
+def open_api_shards_index_view(request):
+    """
+    :param request:
+    :return:
+
+    Serves the JSON index of the tags and shards of the Swagger spec, shards
+    entries can be given as is to Swagger UI `urls` option
+    """
+    cache = get_spec_cache(request.registry)
+
+    def shard_url(name):
+        return request.route_path("cornice_swagger.open_api_shard", shard=name)
+
+    index = cache.get_shard_index(request.script_name, shard_url)
+    return spec_response(request, index)
+
+
+def open_api_shard_view(request):
+    """
+    :param request:
+    :return:
+
+    Serves one self-contained shard of the Swagger spec, holding only the
+    operations of a tag or path prefix and the definitions they reference
+    """
+    shards = get_spec_cache(request.registry).get_shards()
+    shard = shards.get(request.matchdict["shard"])
+    if shard is None:
+        raise HTTPNotFound()
+    return spec_response(request, shard)
+
+
+def open_api_file_view(request):
+    """
+    :param request:
+    :return:
+
+    Serves a Swagger spec pre-generated on disk by the ``cornice-swagger``
+    command, through the server's `wsgi.file_wrapper` when available. Nothing
+    is generated at runtime
+    """
+    spec_file = request.registry.cornice_swagger_spec_file
+    encoding = spec_file.select_encoding(request.accept_encoding)
+    response = FileResponse(
+        spec_file.get_path(encoding),
+        request=request,
+        content_type=spec_file.content_type,
+        content_encoding=None if encoding == spec_file.identity else encoding,
+    )
+    response.etag = spec_file.get_etag(encoding)
+    response.vary = ("Accept-Encoding",)
+    cache_control = request.registry.settings.get("cornice_swagger.spec_cache_control")
+    if cache_control:
+        response.cache_control = cache_control
+    return response
 
 
 def swagger_ui_script_template(request, **kwargs):
@@ -70,12 +382,15 @@ def swagger_ui_script_template(request, **kwargs):
     :return:
 
     Generates the <script> code that bootstraps Swagger UI, it will be injected
-    into index template
+    into index template. When the spec is sharded, Swagger UI gets a dropdown
+    listing the shards and only loads the selected one
     """
+    if request.registry.settings.get("cornice_swagger.spec_shards"):
+        swagger_shards_url = request.route_url("cornice_swagger.open_api_shards")
+        return index_shards_script_template.safe_substitute(
+            swagger_shards_url=swagger_shards_url,
+        )
     swagger_spec_url = request.route_url("cornice_swagger.open_api_path")
-    template = pkg_resources.resource_string(
-        "cornice_swagger", "templates/index_script_template.html"
-    ).decode("utf8")
-    return Template(template).safe_substitute(
+    return index_script_template.safe_substitute(
         swagger_spec_url=swagger_spec_url,
     )
@@ -1,3 +1,5 @@
+import datetime
+import random
 import unittest
 
 import colander
@@ -335,3 +337,123 @@ class SequenceConversionTest(unittest.TestCase):
                 },
             },
         )
+
+
+class UserSchema(colander.MappingSchema):
+    name = colander.SchemaNode(colander.String(), validator=colander.Length(max=42))
+    tags = colander.SequenceSchema(colander.SchemaNode(colander.String()))
+
+
+def mapping(*children, **kwargs):
+    return colander.SchemaNode(colander.Mapping(), *children, **kwargs)
+
+
+class ConversionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.converter = TypeConversionDispatcher()
+
+    def test_same_structure_is_converted_once(self):
+        first = self.converter(UserSchema())
+        second = self.converter(UserSchema())
+        self.assertEqual(first, second)
+        info = self.converter.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+        self.assertEqual(info.currsize, 2)
+
+    def test_embedded_schemas_are_converted_once(self):
+        class PostSchema(colander.MappingSchema):
+            author = UserSchema()
+            reviewer = UserSchema(title="Reviewer")
+            editor = UserSchema(title="Reviewer")
+
+        converted = self.converter(PostSchema())
+        self.assertEqual(converted["properties"]["author"]["title"], "Author")
+        self.assertEqual(converted["properties"]["reviewer"], converted["properties"]["editor"])
+        self.assertEqual(converted, TypeConversionDispatcher(cache_size=0)(PostSchema()))
+        self.assertEqual(self.converter.hits, 2)
+
+    def test_attributes_are_part_of_the_key(self):
+        node = mapping(colander.SchemaNode(colander.Integer(), name="a"), missing=1)
+        other = mapping(colander.SchemaNode(colander.Integer(), name="a"), missing=True)
+        self.assertEqual(self.converter(node)["default"], 1)
+        self.assertIs(self.converter(other)["default"], True)
+        self.assertEqual(self.converter.hits, 0)
+
+    def test_unhashable_attributes(self):
+        node = colander.SequenceSchema(colander.SchemaNode(colander.String()), missing=["a"])
+        self.assertEqual(self.converter(node)["default"], ["a"])
+        node = colander.SequenceSchema(colander.SchemaNode(colander.String()), missing=["b"])
+        self.assertEqual(self.converter(node)["default"], ["b"])
+        self.assertEqual(self.converter.hits, 0)
+
+    def test_results_are_copies(self):
+        converted = self.converter(UserSchema())
+        converted["properties"]["name"]["title"] = "Altered"
+        converted["required"].append("altered")
+        self.assertEqual(self.converter(UserSchema()), convert(UserSchema()))
+
+    def test_values_marshal_can_not_serialize(self):
+        default = datetime.date(2020, 1, 1)
+        node = mapping(
+            colander.SchemaNode(colander.Date(), name="day", missing=default),
+            colander.SchemaNode(colander.String(), name="note"),
+        )
+        converted = self.converter(node)
+        converted["properties"]["day"]["title"] = "Altered"
+        converted["required"].append("altered")
+        converted = self.converter(node)
+        self.assertEqual(converted["required"], ["note"])
+        self.assertEqual(converted["properties"]["day"], convert(node)["properties"]["day"])
+        self.assertIs(converted["properties"]["day"]["default"], default)
+        self.assertEqual(self.converter.hits, 1)
+
+    def test_least_recently_used_are_evicted(self):
+        converter = TypeConversionDispatcher(cache_size=2)
+        child = colander.SchemaNode(colander.String(), name="a")
+        nodes = [mapping(child, title=str(i)) for i in range(3)]
+        converter(nodes[0])
+        converter(nodes[1])
+        converter(nodes[0])
+        converter(nodes[2])
+        self.assertEqual(converter.cache_info().currsize, 2)
+        converter(nodes[0])
+        converter(nodes[1])
+        self.assertEqual((converter.hits, converter.misses), (2, 4))
+
+    def test_structures_are_bounded(self):
+        converter = TypeConversionDispatcher(cache_size=1)
+        child = colander.SchemaNode(colander.String(), name="a")
+        for i in range(20):
+            converter(mapping(child, title=str(i)))
+        self.assertLessEqual(len(converter._structures), 8)
+
+    def test_structures_evicted_while_converting_a_tree(self):
+        converter = TypeConversionDispatcher(cache_size=1)
+        uncached = TypeConversionDispatcher(cache_size=0)
+        rand = random.Random(42)
+
+        def build(depth, name=""):
+            children = []
+            for index in range(rand.randint(1, 3)):
+                name = "f%d" % index
+                if depth and rand.random() < 0.7:
+                    children.append(build(depth - 1, name))
+                else:
+                    typ = rand.choice([colander.String, colander.Integer])
+                    children.append(colander.SchemaNode(typ(), name=name))
+            return mapping(*children, name=name, title=rand.choice("ab"))
+
+        for _ in range(200):
+            node = build(4)
+            self.assertEqual(converter(node), uncached(node))
+        self.assertLessEqual(len(converter._structures), 8)
+
+    def test_disabled(self):
+        converter = TypeConversionDispatcher(cache_size=0)
+        self.assertEqual(converter(UserSchema()), convert(UserSchema()))
+        self.assertEqual(converter.cache_info(), (0, 0, 0, 0))
+
+    def test_cache_clear(self):
+        self.converter(UserSchema())
+        self.converter.cache_clear()
+        self.assertEqual(self.converter.cache_info(), (0, 0, 512, 0))
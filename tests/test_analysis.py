@@ -0,0 +1,144 @@
+import json
+import unittest
+
+from cornice.service import Service
+from cornice.validators import colander_validator
+
+from cornice_swagger.analysis import RepeatedSubtree, analyze_spec, get_pointer
+from cornice_swagger.swagger import CorniceSwagger
+
+from .support import GetRequestSchema, PutRequestSchema, response_schemas
+
+
+def encode(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def strip_descriptions(value):
+    if isinstance(value, dict):
+        return {
+            key: strip_descriptions(child)
+            for key, child in value.items()
+            if not (key == "description" and isinstance(child, str))
+        }
+    if isinstance(value, list):
+        return [strip_descriptions(child) for child in value]
+    return value
+
+
+class SizeReportTest(unittest.TestCase):
+    def setUp(self):
+        self.services = []
+        for name in ("IceCream", "Sorbet"):
+            service = Service(name, "/{}/{{flavour}}".format(name.lower()))
+            service.add_view(
+                "GET",
+                lambda request: None,
+                validators=(colander_validator,),
+                schema=GetRequestSchema(),
+                response_schemas=response_schemas,
+                tags=[name],
+            )
+            service.add_view(
+                "PUT",
+                lambda request: None,
+                validators=(colander_validator,),
+                schema=PutRequestSchema(),
+                response_schemas=response_schemas,
+            )
+            self.services.append(service)
+        self.spec = CorniceSwagger(self.services, def_ref_depth=1).generate("IceCreamAPI", "4.2")
+
+    def test_sizes(self):
+        report = analyze_spec(self.spec)
+        self.assertEqual(report.total, len(encode(self.spec)))
+        self.assertEqual(
+            report.sections, {key: len(encode(value)) for key, value in self.spec.items()}
+        )
+        self.assertEqual(
+            report.paths,
+            {path: len(encode(path_obj)) for path, path_obj in self.spec["paths"].items()},
+        )
+        self.assertEqual(
+            report.definitions,
+            {name: len(encode(schema)) for name, schema in self.spec["definitions"].items()},
+        )
+        get = len(encode(self.spec["paths"]["/icecream/{flavour}"]["get"]))
+        put = len(encode(self.spec["paths"]["/icecream/{flavour}"]["put"]))
+        self.assertEqual(report.tags["IceCream"], get)
+        self.assertEqual(report.tags["default"], 2 * put)
+        self.assertEqual(report.top(1, "tags"), [("default", 2 * put)])
+
+    def test_edge_values(self):
+        for value in ({}, {"a": [], 1: "b"}, {"a": [1, {}, None, "c"]}):
+            self.assertEqual(analyze_spec(value).total, len(encode(value)))
+
+    def test_savings(self):
+        report = analyze_spec(self.spec)
+        self.assertEqual(
+            report.description_bytes,
+            report.total - len(encode(strip_descriptions(self.spec))),
+        )
+        self.assertGreater(report.dedup_bytes, 0)
+        self.assertNotIn("parameters", self.spec)
+
+        swagger = CorniceSwagger(
+            self.services, def_ref_depth=1, def_dedup=True, param_dedup=True, resp_dedup=True
+        )
+        spec = swagger.generate("IceCreamAPI", "4.2")
+        self.assertEqual(analyze_spec(spec).dedup_bytes, 0)
+
+    def test_repeated(self):
+        report = analyze_spec(self.spec)
+        paths = self.spec["paths"]
+        # put operations are the same, get operations differ by their tags
+        self.assertEqual(
+            report.repeated[0],
+            RepeatedSubtree(
+                "#/paths/~1icecream~1{flavour}/put",
+                2,
+                len(encode(paths["/icecream/{flavour}"]["put"])),
+            ),
+        )
+        # responses of the put operations are counted in them
+        self.assertIn(
+            RepeatedSubtree(
+                "#/paths/~1icecream~1{flavour}/get/responses",
+                2,
+                len(encode(paths["/icecream/{flavour}"]["get"]["responses"])),
+            ),
+            report.repeated,
+        )
+        wasted = [subtree.size * (subtree.count - 1) for subtree in report.repeated]
+        self.assertEqual(wasted, sorted(wasted, reverse=True))
+        self.assertEqual(report.repeated_bytes, sum(wasted))
+
+        self.assertEqual(analyze_spec(self.spec, min_size=10**6).repeated, [])
+
+    def test_pointer(self):
+        self.assertEqual(get_pointer("#/paths", "/a~b/{id}"), "#/paths/~1a~0b~1{id}")
+        self.assertEqual(get_pointer("#/tags", 0), "#/tags/0")
+
+    def test_report(self):
+        report = analyze_spec(self.spec)
+        self.assertEqual(
+            sorted(report.as_dict()),
+            [
+                "dedup_bytes",
+                "definitions",
+                "description_bytes",
+                "paths",
+                "repeated",
+                "repeated_bytes",
+                "sections",
+                "tags",
+                "total",
+            ],
+        )
+        json.dumps(report.as_dict())
+        text = str(report)
+        self.assertTrue(text.startswith("Total: {} bytes".format(report.total)))
+        for title in ("Largest paths:", "Largest tags:", "Repeated values:", "Savings:"):
+            self.assertIn(title, text)
+        self.assertIn("/icecream/{flavour}", text)
+        self.assertEqual(report.report(1).count("/sorbet/{flavour}"), 0)
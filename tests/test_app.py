@@ -1,4 +1,10 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 import webtest
 from cornice import Service
@@ -6,10 +12,15 @@ from cornice.service import clear_services
 from cornice.validators import colander_validator
 from flex.core import validate
 from pyramid import testing
+from pyramid.exceptions import ConfigurationError
+from webob import Request
 
-from cornice_swagger import CorniceSwagger
+from cornice_swagger import CorniceSwagger, CorniceSwaggerPredicate
+from cornice_swagger.cache import write_spec_file
+from cornice_swagger.views import iter_blocks, iter_buffered, swagger_ui_script_template
 
 from .support import GetRequestSchema, PutRequestSchema, response_schemas
+from .test_assets import make_ui_assets_dir
 
 
 class AppTest(unittest.TestCase):
@@ -61,6 +72,55 @@ class AppTest(unittest.TestCase):
         validate(spec)
 
 
+class AppViewOptionsTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        self.service = Service("IceCream", "/icecream/{flavour}")
+        self.service.add_view(
+            "GET",
+            lambda request: {},
+            response_schemas=response_schemas,
+            tags=["ice"],
+            operation_id="get_icecream",
+            api_security=[{"basic": []}],
+        )
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.add_cornice_service(self.service)
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+
+    def test_options_are_view_metadata(self):
+        views = [
+            intr["introspectable"]
+            for intr in self.config.registry.introspector.get_category("views")
+        ]
+        view = [view for view in views if view["request_methods"] == "GET"][0]
+        self.assertEqual(view["tags"], ["ice"])
+        self.assertEqual(view["operation_id"], "get_icecream")
+        self.assertEqual(sorted(view["response_schemas"]), ["200", "404"])
+        # only the request method is evaluated on requests
+        self.assertEqual(len(view["predicates"]), 1)
+        self.app.get("/icecream/strawberry")
+
+    def test_deprecated_predicate(self):
+        with self.assertWarns(DeprecationWarning):
+            predicate = CorniceSwaggerPredicate(["ice"], self.config)
+        self.assertEqual(predicate.phash(), "['ice']")
+        self.assertEqual(predicate(None, None), ["ice"])
+
+    def test_generate(self):
+        spec = CorniceSwagger([self.service]).generate("IceCreamAPI", "4.2")
+        op = spec["paths"]["/icecream/{flavour}"]["get"]
+        self.assertEqual(op["tags"], ["ice"])
+        self.assertEqual(op["operationId"], "get_icecream")
+        self.assertEqual(op["security"], [{"basic": []}])
+        self.assertEqual(sorted(op["responses"]), ["200", "404"])
+
+
 class AppSpecViewTest(unittest.TestCase):
     def tearDown(self):
         clear_services()
@@ -91,6 +151,292 @@ class AppSpecViewTest(unittest.TestCase):
         spec = self.app.get("/api-explorer/swagger.json").json
         validate(spec)
 
+    def test_spec_is_cached(self):
+        first = self.app.get("/api-explorer/swagger.json").json
+        with mock.patch.object(CorniceSwagger, "generate") as generate:
+            second = self.app.get("/api-explorer/swagger.json").json
+        self.assertFalse(generate.called)
+        self.assertEqual(first, second)
+
+    def test_spec_etag(self):
+        response = self.app.get("/api-explorer/swagger.json")
+        self.assertEqual(response.content_type, "application/json")
+        self.assertTrue(response.etag)
+        self.assertNotIn("Cache-Control", response.headers)
+
+        headers = {"If-None-Match": '"{}"'.format(response.etag)}
+        response = self.app.get("/api-explorer/swagger.json", headers=headers, status=304)
+        self.assertEqual(response.body, b"")
+
+    def test_spec_etag_mismatch(self):
+        headers = {"If-None-Match": '"outdated"'}
+        response = self.app.get("/api-explorer/swagger.json", headers=headers, status=200)
+        validate(response.json)
+
+    def test_spec_gzip(self):
+        # webtest decodes responses by itself, so query the wsgi app directly
+        headers = {"Accept-Encoding": "gzip"}
+        request = Request.blank("/api-explorer/swagger.json", headers=headers)
+        response = request.get_response(self.app.app)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertTrue(response.etag.endswith("-gzip"))
+        validate(json.loads(gzip.decompress(response.body).decode("utf-8")))
+
+        headers["If-None-Match"] = '"{}"'.format(response.etag)
+        request = Request.blank("/api-explorer/swagger.json", headers=headers)
+        self.assertEqual(request.get_response(self.app.app).status_code, 304)
+
+    def test_spec_identity(self):
+        response = self.app.get("/api-explorer/swagger.json")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+
+    def test_spec_head(self):
+        response = self.app.head("/api-explorer/swagger.json")
+        self.assertEqual(response.body, b"")
+        self.assertTrue(response.etag)
+
+    def test_spec_cache_control(self):
+        self.config.cornice_enable_openapi_view(cache_control="public, max-age=300")
+        app = webtest.TestApp(self.config.make_wsgi_app())
+        response = app.get("/api-explorer/swagger.json")
+        self.assertEqual(response.headers["Cache-Control"], "public, max-age=300")
+
+
+class AppSpecShardsViewTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}", tags=["ice"])
+
+        @service.get(
+            validators=(colander_validator,),
+            schema=GetRequestSchema(),
+            response_schemas=response_schemas,
+        )
+        def view_get(request):
+            """Serve icecream"""
+            return request.validated
+
+        sorbet = Service("Sorbet", "/sorbet", tags=["sorbet"])
+        sorbet.add_view("GET", lambda request: None)
+
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view(
+            title="IceCreamAPI", version="4.2", shards="tags", warm=True
+        )
+        self.config.cornice_enable_openapi_explorer()
+        self.config.add_cornice_service(service)
+        self.config.add_cornice_service(sorbet)
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+
+    def test_index(self):
+        index = self.app.get("/api-explorer/shards").json
+        self.assertEqual(index["tags"], [{"name": "ice"}, {"name": "sorbet"}])
+        self.assertEqual(
+            index["shards"],
+            [
+                {"name": "ice", "url": "/api-explorer/shards/ice.json"},
+                {"name": "sorbet", "url": "/api-explorer/shards/sorbet.json"},
+            ],
+        )
+
+    def test_shards(self):
+        ice = self.app.get("/api-explorer/shards/ice.json")
+        validate(ice.json)
+        self.assertEqual(list(ice.json["paths"]), ["/icecream/{flavour}"])
+
+        sorbet = self.app.get("/api-explorer/shards/sorbet.json")
+        validate(sorbet.json)
+        self.assertEqual(list(sorbet.json["paths"]), ["/sorbet"])
+        self.assertNotEqual(ice.etag, sorbet.etag)
+
+        headers = {"If-None-Match": '"{}"'.format(ice.etag)}
+        self.app.get("/api-explorer/shards/ice.json", headers=headers, status=304)
+
+    def test_unknown_shard(self):
+        self.app.get("/api-explorer/shards/cone.json", status=404)
+
+    def test_tags_with_slashes(self):
+        service = Service("Invoices", "/invoices", tags=["billing/invoices"])
+        service.add_view("GET", lambda request: None)
+        self.config.add_cornice_service(service)
+        app = webtest.TestApp(self.config.make_wsgi_app())
+
+        shards = app.get("/api-explorer/shards").json["shards"]
+        self.assertIn(
+            {"name": "billing/invoices", "url": "/api-explorer/shards/billing/invoices.json"},
+            shards,
+        )
+        invoices = app.get("/api-explorer/shards/billing/invoices.json")
+        self.assertEqual(list(invoices.json["paths"]), ["/invoices"])
+        app.get("/api-explorer/shards/billing%2Finvoices.json", status=200)
+
+    def test_full_spec_is_still_served(self):
+        spec = self.app.get("/api-explorer/swagger.json").json
+        self.assertEqual(sorted(spec["paths"]), ["/icecream/{flavour}", "/sorbet"])
+
+    def test_explorer_lists_shards(self):
+        result = self.app.get("/api-explorer")
+        self.assertIn("http://localhost/api-explorer/shards", result.text)
+        self.assertIn("index.shards", result.text)
+
+    def test_shards_from_spec_file(self):
+        with self.assertRaises(ConfigurationError):
+            self.config.cornice_enable_openapi_view(spec_file="swagger.json", shards="tags")
+
+
+class AppSpecStreamViewTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}")
+
+        @service.get(
+            validators=(colander_validator,),
+            schema=GetRequestSchema(),
+            response_schemas=response_schemas,
+        )
+        def view_get(request):
+            """Serve icecream"""
+            return request.validated
+
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view(title="IceCreamAPI", version="4.2", stream=True)
+        self.config.add_cornice_service(service)
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+
+    def test_streamed_spec(self):
+        response = self.app.get("/api-explorer/swagger.json")
+        self.assertEqual(response.content_type, "application/json")
+        self.assertNotIn("Cache-Control", response.headers)
+        validate(response.json)
+        self.assertEqual(response.json["info"]["title"], "IceCreamAPI")
+        self.assertIn("/icecream/{flavour}", response.json["paths"])
+
+    def test_streamed_in_blocks(self):
+        with mock.patch("cornice_swagger.views.stream_buffer_size", 10):
+            response = self.app.get("/api-explorer/swagger.json")
+        validate(response.json)
+
+    def test_buffered_chunks(self):
+        chunks = list(iter_buffered(["ab", "c", "dé", "f"], size=3))
+        self.assertEqual(chunks, [b"abc", "dé".encode("utf8"), b"f"])
+
+    def test_streamed_spec_cache_control(self):
+        self.config.cornice_enable_openapi_view(stream=True, cache_control="public, max-age=300")
+        app = webtest.TestApp(self.config.make_wsgi_app())
+        response = app.get("/api-explorer/swagger.json")
+        self.assertEqual(response.headers["Cache-Control"], "public, max-age=300")
+
+    def test_stream_incompatible_options(self):
+        with self.assertRaises(ConfigurationError):
+            self.config.cornice_enable_openapi_view(stream=True, shards="tags")
+
+
+class AppSpecFileViewTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+        shutil.rmtree(self.path)
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.spec_file = os.path.join(self.path, "swagger.json")
+        self.fingerprint = write_spec_file({"swagger": "2.0", "paths": {}}, self.spec_file)
+
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view(spec_file=self.spec_file, cache_control="no-cache")
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+
+    def test_serves_file(self):
+        with mock.patch.object(CorniceSwagger, "generate") as generate:
+            response = self.app.get("/api-explorer/swagger.json")
+        self.assertFalse(generate.called)
+        self.assertEqual(response.json, {"swagger": "2.0", "paths": {}})
+        self.assertEqual(response.content_type, "application/json")
+        self.assertEqual(response.etag, self.fingerprint)
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+
+        headers = {"If-None-Match": '"{}"'.format(self.fingerprint)}
+        self.app.get("/api-explorer/swagger.json", headers=headers, status=304)
+
+    def test_serves_gzip_file(self):
+        headers = {"Accept-Encoding": "gzip"}
+        request = Request.blank("/api-explorer/swagger.json", headers=headers)
+        response = request.get_response(self.app.app)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.etag, self.fingerprint + "-gzip")
+        self.assertEqual(
+            json.loads(gzip.decompress(response.body)), {"swagger": "2.0", "paths": {}}
+        )
+
+
+class AppSpecSharedViewTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}")
+        service.add_view("GET", lambda request: None)
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view(
+            title="IceCreamAPI", version="4.2", prefork=True, cache_control="no-cache"
+        )
+        self.config.add_cornice_service(service)
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+        self.document = self.config.registry.cornice_swagger_shared_spec
+
+    def test_serves_shared_document(self):
+        with mock.patch.object(CorniceSwagger, "generate") as generate:
+            response = self.app.get("/api-explorer/swagger.json")
+        self.assertFalse(generate.called)
+        self.assertEqual(response.json["info"]["title"], "IceCreamAPI")
+        self.assertIn("/icecream/{flavour}", response.json["paths"])
+        self.assertEqual(response.content_type, "application/json")
+        self.assertEqual(response.content_length, len(response.body))
+        self.assertEqual(response.etag, self.document.etag)
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+
+        headers = {"If-None-Match": '"{}"'.format(self.document.etag)}
+        self.app.get("/api-explorer/swagger.json", headers=headers, status=304)
+
+    def test_serves_gzip_variant(self):
+        headers = {"Accept-Encoding": "gzip"}
+        request = Request.blank("/api-explorer/swagger.json", headers=headers)
+        response = request.get_response(self.app.app)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.etag, self.document.etag + "-gzip")
+        spec = json.loads(gzip.decompress(response.body))
+        self.assertEqual(spec["info"]["title"], "IceCreamAPI")
+
+    def test_served_by_blocks(self):
+        body = bytes(range(256)) * 10
+        blocks = list(iter_blocks(memoryview(body), 1000))
+        self.assertEqual([len(block) for block in blocks], [1000, 1000, 560])
+        self.assertEqual(b"".join(blocks), body)
+        self.assertEqual(list(iter_blocks(b"")), [])
+
+    def test_incompatible_options(self):
+        with self.assertRaises(ConfigurationError):
+            self.config.cornice_enable_openapi_view(prefork=True, shards="tags")
+        with self.assertRaises(ConfigurationError):
+            self.config.cornice_enable_openapi_view(prefork=True, stream=True)
+
 
 class AppUIViewTest(unittest.TestCase):
     def tearDown(self):
@@ -125,6 +471,111 @@ class AppUIViewTest(unittest.TestCase):
         "swagger-ui-standalone-preset.js" in result.text
         "swagger-ui.css" in result.text
         "SwaggerUIBundle" in result.text
+        self.assertIn('<link href="https://fonts.googleapis.com/css?family=', result.text)
+
+    def test_explorer_is_rendered_once(self):
+        first = self.app.get("/api-explorer")
+        with mock.patch("cornice_swagger.views.index_template") as template:
+            second = self.app.get("/api-explorer")
+        self.assertFalse(template.safe_substitute.called)
+        self.assertEqual(first.body, second.body)
+
+    def test_explorer_is_rendered_per_spec_url(self):
+        self.app.get("/api-explorer")
+        result = self.app.get("/api-explorer", extra_environ={"HTTP_HOST": "example.com"})
+        self.assertIn("http://example.com/api-explorer/swagger.json", result.text)
+        pages = self.config.registry.cornice_swagger_ui_pages
+        self.assertEqual(len(pages), 2)
+
+    def test_explorer_pages_cache_is_bounded(self):
+        with mock.patch("cornice_swagger.views.ui_pages_cache_size", 1):
+            self.app.get("/api-explorer")
+            self.app.get("/api-explorer", extra_environ={"HTTP_HOST": "example.com"})
+        self.assertEqual(len(self.config.registry.cornice_swagger_ui_pages), 1)
+
+    def test_explorer_etag(self):
+        result = self.app.get("/api-explorer")
+        self.assertTrue(result.etag)
+        headers = {"If-None-Match": '"{}"'.format(result.etag)}
+        self.app.get("/api-explorer", headers=headers, status=304)
+
+    def test_script_generator_is_resolved_at_config_time(self):
+        generator = self.config.registry.cornice_swagger_ui_script_generator
+        self.assertIs(generator, swagger_ui_script_template)
+
+
+class AppUILocalAssetsViewTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+        shutil.rmtree(self.assets_path)
+
+    def setUp(self):
+        self.assets_path = make_ui_assets_dir()
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view()
+        self.config.cornice_enable_openapi_explorer(
+            ui_assets="local", ui_assets_path=self.assets_path
+        )
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+        self.assets = self.config.registry.cornice_swagger_ui_assets
+
+    def test_explorer_uses_local_assets(self):
+        result = self.app.get("/api-explorer")
+        self.assertNotIn("cdnjs", result.text)
+        self.assertNotIn("fonts.googleapis.com", result.text)
+        self.assertNotIn("${", result.text)
+        for asset in self.assets.by_name.values():
+            self.assertIn("/api-explorer/assets/" + asset.filename, result.text)
+
+    def test_serves_asset(self):
+        asset = self.assets.by_name["swagger-ui-bundle.js"]
+        result = self.app.get("/api-explorer/assets/" + asset.filename)
+        self.assertEqual(result.body, b"/* swagger-ui-bundle.js */")
+        self.assertEqual(result.content_type, "application/javascript")
+        self.assertEqual(result.headers["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(result.etag, asset.etag)
+
+    def test_serves_compressed_asset(self):
+        asset = self.assets.by_name["swagger-ui.css"]
+        request = Request.blank(
+            "/api-explorer/assets/" + asset.filename, headers={"Accept-Encoding": "gzip"}
+        )
+        response = request.get_response(self.app.app)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.body), b"/* swagger-ui.css */")
+
+    def test_unknown_asset(self):
+        self.app.get("/api-explorer/assets/swagger-ui.css", status=404)
+
+    def test_invalid_ui_assets(self):
+        with self.assertRaises(ConfigurationError):
+            self.config.cornice_enable_openapi_explorer(ui_assets="somewhere")
+
+
+class AppUIViewCustomScriptTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        settings = {"cornice_swagger.swagger_ui_script_generator": "tests.test_app:custom_script"}
+        self.config = testing.setUp(settings=settings)
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_explorer()
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+
+    def test_custom_script_without_spec_view(self):
+        result = self.app.get("/api-explorer")
+        self.assertIn("<script>custom</script>", result.text)
+        self.assertIn(None, self.config.registry.cornice_swagger_ui_pages)
+
+
+def custom_script(request):
+    return "<script>custom</script>"
 
 
 class AppGoodRoutesTest(unittest.TestCase):
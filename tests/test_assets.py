@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pyramid.exceptions import ConfigurationError
+
+from cornice_swagger.assets import UI_ASSET_NAMES, UIAsset, UIAssets, default_ui_assets_path
+
+
+def make_ui_assets_dir():
+    path = tempfile.mkdtemp()
+    for name in UI_ASSET_NAMES:
+        with open(os.path.join(path, name), "w") as asset_file:
+            asset_file.write("/* {} */".format(name))
+    return path
+
+
+class UIAssetTest(unittest.TestCase):
+    def test_hashed_filename(self):
+        asset = UIAsset("swagger-ui.css", b"body {}")
+        self.assertEqual(asset.filename, "swagger-ui.{}.css".format(asset.etag[:16]))
+        self.assertEqual(asset.content_type, "text/css")
+
+    def test_unknown_content_type(self):
+        asset = UIAsset("swagger-ui", b"")
+        self.assertEqual(asset.content_type, "application/octet-stream")
+
+
+class UIAssetsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = make_ui_assets_dir()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_load(self):
+        assets = UIAssets(self.path)
+        self.assertEqual(sorted(assets.by_name), sorted(UI_ASSET_NAMES))
+        for name, asset in assets.by_name.items():
+            self.assertIs(assets.by_filename[asset.filename], asset)
+            self.assertEqual(asset.body, "/* {} */".format(name).encode("utf-8"))
+
+    def test_default_path_from_swagger_ui_bundle(self):
+        bundle = mock.Mock(swagger_ui_path=self.path)
+        with mock.patch("cornice_swagger.assets.swagger_ui_bundle", bundle):
+            self.assertEqual(default_ui_assets_path(), self.path)
+
+    def test_default_path_without_swagger_ui_bundle(self):
+        with mock.patch("cornice_swagger.assets.swagger_ui_bundle", None):
+            with self.assertRaises(ConfigurationError):
+                default_ui_assets_path()
@@ -0,0 +1,97 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from cornice.service import clear_services
+from flex.core import validate
+
+from benchmarks.app import build_services
+from benchmarks.run import compare, main, run_scenario
+from cornice_swagger import CorniceSwagger
+
+
+class SyntheticAppTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+
+    def test_valid_spec(self):
+        services = build_services(services=2, methods=5, depth=3, width=5, enum_size=2)
+        spec = CorniceSwagger(services).generate("Benchmark", "1.0")
+        validate(spec)
+        self.assertEqual(len(spec["paths"]), 2)
+        self.assertEqual(len(spec["paths"]["/resources0/{id}"]), 6)
+
+    def test_run_scenario(self):
+        arguments = dict(services=2, methods=1, depth=1, width=2, enum_size=0, def_ref_depth=-1)
+        results = run_scenario(arguments, repeat=1)
+        self.assertEqual(
+            sorted(results),
+            ["generate", "regenerate", "spec_view", "spec_view_cached", "ui_view"],
+        )
+        for measures in results.values():
+            self.assertGreater(measures["time"], 0)
+            self.assertGreater(measures["peak_memory"], 0)
+            self.assertIn("allocated_blocks", measures)
+
+
+class CompareTest(unittest.TestCase):
+    def test_regressions(self):
+        baseline = {"small": {"generate": {"time": 1.0, "peak_memory": 100}}}
+        results = {
+            "small": {
+                "generate": {"time": 1.4, "peak_memory": 200},
+                "ui_view": {"time": 1.0, "peak_memory": 100},
+            },
+            "large": {"generate": {"time": 1.0, "peak_memory": 100}},
+        }
+        thresholds = {"time": 1.5, "peak_memory": 1.25}
+        self.assertEqual(
+            compare(results, baseline, thresholds), [("small", "generate", "peak_memory", 2.0)]
+        )
+        thresholds = {"time": 1.25, "peak_memory": 2}
+        self.assertEqual(
+            compare(results, baseline, thresholds), [("small", "generate", "time", 1.4)]
+        )
+
+    def test_missing_metrics_are_not_compared(self):
+        baseline = {"small": {"ui_view": {"time": 0.001, "allocated_blocks": 0}}}
+        results = {"small": {"ui_view": {"time": 0.001, "allocated_blocks": 10}}}
+        thresholds = {"time": 1.5, "peak_memory": 1.25, "allocated_blocks": 1.25}
+        self.assertEqual(compare(results, baseline, thresholds), [])
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.dir, "baseline.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_main(self, *args):
+        argv = ["--services", "1", "--methods", "1", "--repeat", "1"]
+        argv += ["--baseline", self.baseline] + list(args)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            code = main(argv)
+        return code, output.getvalue()
+
+    def test_save_and_compare(self):
+        code, output = self.run_main("--save")
+        self.assertEqual(code, 0)
+        self.assertIn("Saved baseline", output)
+        self.assertTrue(os.path.exists(self.baseline))
+
+        code, output = self.run_main("--threshold", "1000", "--memory-threshold", "1000")
+        self.assertEqual(code, 0)
+
+        code, output = self.run_main("--threshold", "0")
+        self.assertEqual(code, 1)
+        self.assertIn("Regression: custom generate time", output)
+
+        code, output = self.run_main("--threshold", "1000", "--memory-threshold", "0")
+        self.assertEqual(code, 1)
+        self.assertIn("Regression: custom generate peak_memory", output)
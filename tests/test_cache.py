@@ -0,0 +1,432 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import cornice.service
+import webtest
+from cornice import Service
+from cornice.service import clear_services
+from pyramid import testing
+from webob import Request
+
+from cornice_swagger.cache import (
+    SharedSpecDocument,
+    SpecCache,
+    SpecDocument,
+    encode_canonical_spec,
+    encode_spec,
+    get_shared_spec,
+    get_spec_cache,
+)
+from cornice_swagger.swagger import CorniceSwagger, CorniceSwaggerException
+
+
+class SpecCacheTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}")
+
+        @service.get()
+        def view_get(request):
+            """Serve icecream"""
+            return request.validated
+
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view(title="IceCreamAPI", version="4.2")
+        self.config.add_cornice_service(service)
+        self.cache = get_spec_cache(self.config.registry)
+
+    def test_get_spec_cache_is_stored_in_registry(self):
+        self.assertIsInstance(self.cache, SpecCache)
+        self.assertIs(get_spec_cache(self.config.registry), self.cache)
+
+    def test_spec_is_generated_once(self):
+        with mock.patch.object(CorniceSwagger, "generate", return_value={}) as gen:
+            first = self.cache.get_document()
+            second = self.cache.get_document()
+        self.assertIs(first, second)
+        self.assertEqual(gen.call_count, 1)
+
+    def test_spec_content(self):
+        spec = self.cache.get()
+        self.assertEqual(spec["info"]["title"], "IceCreamAPI")
+        self.assertIn("/icecream/{flavour}", spec["paths"])
+
+    def test_document(self):
+        document = self.cache.get_document()
+        self.assertIs(document, self.cache.get_document())
+        self.assertEqual(json.loads(document.body.decode("utf-8")), self.cache.get())
+        self.assertEqual(document.etag, hashlib.sha256(document.body).hexdigest())
+
+    def test_spec_is_not_kept(self):
+        spec = self.cache.get()
+        self.assertEqual(self.cache.get(), spec)
+        self.assertIsNot(self.cache.get(), spec)
+        self.assertFalse(hasattr(self.cache, "spec"))
+
+    def test_new_service_invalidates(self):
+        spec = self.cache.get()
+        self.assertFalse(self.cache.is_stale())
+
+        service = Service("Sorbet", "/sorbet")
+        service.add_view("GET", lambda request: None)
+        self.assertTrue(self.cache.is_stale())
+
+        new_spec = self.cache.get()
+        self.assertIsNot(spec, new_spec)
+        self.assertIn("/sorbet", new_spec["paths"])
+
+    def test_new_view_invalidates(self):
+        self.cache.get()
+        service = cornice.service.SERVICES[0]
+        service.add_view("POST", lambda request: None)
+        self.assertTrue(self.cache.is_stale())
+        self.assertIn("post", self.cache.get()["paths"]["/icecream/{flavour}"])
+
+    def test_new_view_of_previous_service_needs_invalidate(self):
+        Service("Sorbet", "/sorbet").add_view("GET", lambda request: None)
+        self.cache.get()
+        service = cornice.service.SERVICES[0]
+        service.add_view("POST", lambda request: None)
+        self.assertFalse(self.cache.is_stale())
+        self.cache.invalidate()
+        self.assertIn("post", self.cache.get()["paths"]["/icecream/{flavour}"])
+
+    def test_no_services(self):
+        clear_services()
+        self.cache.get()
+        self.assertFalse(self.cache.is_stale())
+
+    def test_replaced_service_invalidates(self):
+        self.cache.get()
+        clear_services()
+        service = Service("Sorbet", "/sorbet")
+        service.add_view("GET", lambda request: None)
+        self.assertTrue(self.cache.is_stale())
+        self.assertEqual(list(self.cache.get()["paths"]), ["/sorbet"])
+
+    def test_new_spec_kwargs_invalidates(self):
+        self.cache.get()
+        self.config.cornice_enable_openapi_view(title="SorbetAPI", version="1.0")
+        self.assertTrue(self.cache.is_stale())
+        self.assertEqual(self.cache.get()["info"]["title"], "SorbetAPI")
+
+    def test_invalidate(self):
+        spec = self.cache.get()
+        document = self.cache.get_document()
+        self.cache.invalidate()
+        self.assertTrue(self.cache.is_stale())
+        self.assertIsNot(self.cache.get_document(), document)
+        self.assertIsNot(self.cache.get(), spec)
+
+
+class StaleWhileRevalidateTest(unittest.TestCase):
+    def tearDown(self):
+        self.release.set()
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}")
+        service.add_view("GET", lambda request: None)
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+        self.config.cornice_enable_openapi_view(title="IceCreamAPI", max_stale=60)
+        self.config.add_cornice_service(service)
+        self.app = webtest.TestApp(self.config.make_wsgi_app())
+        self.cache = get_spec_cache(self.config.registry)
+        self.document = self.cache.get_document()
+
+        self.calls = 0
+        self.error = None
+        self.release = threading.Event()
+        generate = CorniceSwagger.generate
+
+        def slow_generate(generator, **kwargs):
+            self.calls += 1
+            self.release.wait(5)
+            if self.error is not None:
+                raise self.error
+            return generate(generator, **kwargs)
+
+        patcher = mock.patch.object(CorniceSwagger, "generate", slow_generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_service(self):
+        service = Service("Sorbet", "/sorbet")
+        service.add_view("GET", lambda request: None)
+
+    def wait_refresh(self):
+        refresh = self.cache._refresh
+        self.release.set()
+        if refresh is not None:
+            refresh.done.wait(5)
+
+    def test_stale_document_is_served_while_generating(self):
+        self.add_service()
+        self.assertIs(self.cache.get_document(), self.document)
+        response = self.app.get("/api-explorer/swagger.json")
+        self.assertEqual(response.headers["Age"], "0")
+        self.assertNotIn("/sorbet", response.json["paths"])
+        self.assertEqual(self.calls, 1)
+
+        self.wait_refresh()
+        self.assertIsNot(self.cache.get_document(), self.document)
+        self.assertIn("/sorbet", self.cache.get()["paths"])
+        self.assertIsNone(self.cache.get_age())
+        self.assertNotIn("Age", self.app.get("/api-explorer/swagger.json").headers)
+
+    def test_single_flight(self):
+        self.config.registry.settings["cornice_swagger.spec_max_stale"] = 0
+        self.cache.invalidate()
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(self.cache.get_document) for _ in range(8)]
+            while self.cache._refresh is None:
+                time.sleep(0.001)
+            self.release.set()
+            documents = [future.result() for future in futures]
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(set(map(id, documents))), 1)
+        self.assertIsNot(documents[0], self.document)
+
+    def test_max_stale(self):
+        self.add_service()
+        self.cache.get_document()
+        # stale for longer than allowed, requests wait for the new document
+        self.cache._stale_since -= 61
+        self.release.set()
+        self.assertIn("/sorbet", self.cache.get()["paths"])
+        self.assertEqual(self.calls, 1)
+
+    def test_background_error_keeps_document(self):
+        self.error = CorniceSwaggerException("boom")
+        self.cache.invalidate()
+        with self.assertLogs("cornice_swagger.cache", "ERROR"):
+            self.assertIs(self.cache.get_document(), self.document)
+            self.wait_refresh()
+        self.assertIs(self.cache.last_error, self.error)
+        self.assertTrue(self.cache.is_stale())
+
+        # no new generation before the retry interval
+        self.assertIs(self.cache.get_document(), self.document)
+        self.assertEqual(self.calls, 1)
+
+        self.error = None
+        self.release.clear()
+        self.cache.retry_interval = 0
+        self.assertIs(self.cache.get_document(), self.document)
+        self.wait_refresh()
+        self.assertEqual(self.calls, 2)
+        self.assertIsNone(self.cache.last_error)
+        self.assertIsNot(self.cache.get_document(), self.document)
+
+    def test_error_is_raised_to_waiting_requests(self):
+        self.config.registry.settings["cornice_swagger.spec_max_stale"] = 0
+        self.error = CorniceSwaggerException("boom")
+        self.cache.invalidate()
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(self.cache.get_document) for _ in range(4)]
+            while self.cache._refresh is None:
+                time.sleep(0.001)
+            self.release.set()
+            for future in futures:
+                self.assertRaises(CorniceSwaggerException, future.result)
+        self.assertIs(self.cache.last_error, self.error)
+        self.assertIs(self.cache.document, self.document)
+
+    def test_shards_follow_the_document(self):
+        self.config.registry.settings["cornice_swagger.spec_shards"] = "tags"
+        shards = self.cache.get_shards()
+        index = self.cache.get_shard_index("", lambda name: name)
+        self.assertIs(self.cache.get_shards(), shards)
+        self.add_service()
+        self.wait_refresh()
+        self.cache.get_document()
+        self.wait_refresh()
+        self.assertIsNot(self.cache.get_shards(), shards)
+        self.assertIsNot(self.cache.get_shard_index("", lambda name: name), index)
+
+
+class WarmSpecCacheTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        self.service = Service("IceCream", "/icecream/{flavour}")
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+
+    def test_generated_at_startup(self):
+        self.service.add_view("GET", lambda request: None)
+        self.config.cornice_enable_openapi_view(warm=True)
+        self.config.add_cornice_service(self.service)
+        self.config.make_wsgi_app()
+        cache = get_spec_cache(self.config.registry)
+        self.assertFalse(cache.is_stale())
+        self.assertIn("/icecream/{flavour}", cache.get()["paths"])
+
+    def test_not_generated_at_startup_by_default(self):
+        self.config.cornice_enable_openapi_view()
+        self.config.make_wsgi_app()
+        self.assertTrue(get_spec_cache(self.config.registry).is_stale())
+
+    def test_errors_fail_at_startup(self):
+        self.service.add_view("GET", lambda request: None, tags="not a list")
+        self.config.cornice_enable_openapi_view(warm=True)
+        self.config.add_cornice_service(self.service)
+        with self.assertRaises(CorniceSwaggerException):
+            self.config.make_wsgi_app()
+
+
+class SpecDocumentTest(unittest.TestCase):
+    def setUp(self):
+        self.spec = {"swagger": "2.0", "paths": {}}
+        self.document = SpecDocument(self.spec)
+
+    def select(self, accept_encoding=None):
+        headers = {}
+        if accept_encoding is not None:
+            headers["Accept-Encoding"] = accept_encoding
+        request = Request.blank("/", headers=headers)
+        return self.document.select_encoding(request.accept_encoding)
+
+    def test_gzip_variant(self):
+        body = gzip.decompress(self.document.get_body("gzip"))
+        self.assertEqual(json.loads(body.decode("utf-8")), self.spec)
+        self.assertEqual(self.document.get_etag("gzip"), self.document.etag + "-gzip")
+
+    def test_generated_order_is_kept(self):
+        spec = {
+            "swagger": "2.0",
+            "definitions": {"Body": {"properties": {"zeta": {}, "alpha": {}}}},
+        }
+        self.assertEqual(
+            encode_spec(spec),
+            b'{"swagger":"2.0","definitions":{"Body":{"properties":{"zeta":{},"alpha":{}}}}}',
+        )
+
+    def test_canonical_encoding(self):
+        spec = {"swagger": "2.0", "paths": {"/b": {"put": {}, "get": {}}, "/a": {}}}
+        reordered = {"paths": {"/a": {}, "/b": {"get": {}, "put": {}}}, "swagger": "2.0"}
+        self.assertEqual(
+            encode_canonical_spec(spec),
+            b'{"paths":{"/a":{},"/b":{"get":{},"put":{}}},"swagger":"2.0"}',
+        )
+        self.assertEqual(encode_canonical_spec(spec), encode_canonical_spec(reordered))
+
+    def test_canonical_encoding_of_mixed_keys(self):
+        spec = {"responses": {"default": {}, 404: {}, 200: {}}, "tags": ({1: True},)}
+        self.assertEqual(
+            encode_canonical_spec(spec),
+            b'{"responses":{"200":{},"404":{},"default":{}},"tags":[{"1":true}]}',
+        )
+
+    def test_identity_body_is_built_on_demand(self):
+        self.assertIsNone(self.document._body)
+        body = self.document.get_body("identity")
+        self.assertEqual(json.loads(body.decode("utf-8")), self.spec)
+        self.assertIs(self.document.body, body)
+        self.assertEqual(self.document.get_etag("identity"), self.document.etag)
+
+    def test_select_encoding(self):
+        self.assertEqual(self.select(), "identity")
+        self.assertEqual(self.select("gzip, deflate"), "gzip")
+        self.assertEqual(self.select("deflate"), "identity")
+        self.assertEqual(self.select("gzip;q=0, identity;q=0"), "identity")
+        self.assertEqual(self.select("identity;q=0.5, gzip"), "gzip")
+
+    def test_brotli_variant(self):
+        brotli = mock.Mock()
+        brotli.compress.return_value = b"brotli"
+        with mock.patch("cornice_swagger.cache.brotli", brotli):
+            document = SpecDocument(self.spec)
+        self.assertEqual(document.get_body("br"), b"brotli")
+        brotli.compress.assert_called_once_with(
+            document.body, quality=SpecDocument.brotli_quality, mode=brotli.MODE_TEXT
+        )
+        request = Request.blank("/", headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual(document.select_encoding(request.accept_encoding), "br")
+
+
+class SharedSpecDocumentTest(unittest.TestCase):
+    def setUp(self):
+        self.spec = {"swagger": "2.0", "paths": {"/icecream": {}}}
+        self.document = SharedSpecDocument(self.spec)
+
+    def test_variants(self):
+        body = self.document.get_body("identity")
+        self.assertEqual(json.loads(bytes(body)), self.spec)
+        self.assertEqual(self.document.etag, SpecDocument(self.spec).etag)
+        gzipped = self.document.get_body("gzip")
+        self.assertEqual(json.loads(gzip.decompress(gzipped)), self.spec)
+        self.assertEqual(
+            sorted(self.document.encodings), sorted(SpecDocument(self.spec).encodings)
+        )
+
+    def test_variants_are_read_only_views_of_the_mapping(self):
+        body = self.document.get_body("identity")
+        self.assertIsInstance(body, memoryview)
+        self.assertTrue(body.readonly)
+        self.assertIs(body.obj, self.document.buffer)
+        with self.assertRaises(TypeError):
+            body[0] = 0
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_forked_processes_share_the_mapping(self):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os.close(read)
+            os.write(write, bytes(self.document.get_body("identity")))
+            os._exit(0)
+        os.close(write)
+        with os.fdopen(read, "rb") as pipe:
+            self.assertEqual(json.loads(pipe.read()), self.spec)
+        os.waitpid(pid, 0)
+
+
+class SharedSpecTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def setUp(self):
+        self.service = Service("IceCream", "/icecream/{flavour}")
+        self.service.add_view("GET", lambda request: None)
+        self.config = testing.setUp()
+        self.config.include("cornice")
+        self.config.include("cornice_swagger")
+
+    def test_generated_at_startup(self):
+        self.config.cornice_enable_openapi_view(title="IceCreamAPI", prefork=True)
+        self.config.add_cornice_service(self.service)
+        self.config.make_wsgi_app()
+        document = self.config.registry.cornice_swagger_shared_spec
+        self.assertIs(get_shared_spec(self.config.registry), document)
+        spec = json.loads(bytes(document.get_body("identity")))
+        self.assertEqual(spec["info"]["title"], "IceCreamAPI")
+        self.assertIn("/icecream/{flavour}", spec["paths"])
+        # the regular cache is left empty
+        self.assertIsNone(get_spec_cache(self.config.registry).document)
+
+    def test_generated_on_first_use(self):
+        self.config.cornice_enable_openapi_view(prefork=True)
+        self.config.add_cornice_service(self.service)
+        self.assertIsNone(getattr(self.config.registry, "cornice_swagger_shared_spec", None))
+        document = get_shared_spec(self.config.registry)
+        self.assertIs(get_shared_spec(self.config.registry), document)
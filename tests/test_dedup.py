@@ -0,0 +1,436 @@
+import json
+import unittest
+
+import colander
+from cornice.service import Service
+from cornice.validators import colander_body_validator, colander_validator
+from flex.core import validate
+
+from cornice_swagger.dedup import (
+    Deduplicator,
+    OperationComponentDeduplicator,
+    ResponseDeduplicator,
+    SchemaDeduplicator,
+    unique_name,
+)
+from cornice_swagger.swagger import CorniceSwagger
+
+from .support import BodySchema
+
+
+def user(title="User"):
+    return {
+        "type": "object",
+        "title": title,
+        "properties": {"name": {"type": "string", "title": "Name"}},
+        "required": ["name"],
+    }
+
+
+def iter_refs(value):
+    if isinstance(value, dict):
+        if "$ref" in value:
+            yield value["$ref"]
+        for child in value.values():
+            yield from iter_refs(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from iter_refs(child)
+
+
+class UniqueNameTest(unittest.TestCase):
+    def test_free_name(self):
+        self.assertEqual(unique_name({}, "User", user()), "User")
+
+    def test_same_value(self):
+        self.assertEqual(unique_name({"User": user()}, "User", user()), "User")
+
+    def test_numbered_names(self):
+        registry = {"User": user(), "User_2": user("Other")}
+        self.assertEqual(unique_name(registry, "User", user("Another")), "User_3")
+        self.assertEqual(unique_name(registry, "User", user("Other")), "User_2")
+        self.assertEqual(unique_name(registry, "User_2", user("Another")), "User_3")
+
+
+class DeduplicatorTest(unittest.TestCase):
+    def test_default_methods(self):
+        deduplicator = Deduplicator({})
+        self.assertTrue(deduplicator.is_shareable({"type": "string"}))
+        self.assertFalse(deduplicator.is_shareable({"$ref": "#/definitions/User"}))
+        self.assertFalse(deduplicator.is_shareable("string"))
+
+        class HeaderDeduplicator(OperationComponentDeduplicator):
+            section = "headers"
+
+        deduplicator = HeaderDeduplicator({})
+        self.assertEqual(deduplicator.get_name("x-rate-limit", {}), "HeaderX-Rate-Limit")
+        self.assertEqual(deduplicator.get_name(0, {}), "Header0")
+
+    def test_response_names(self):
+        deduplicator = ResponseDeduplicator({})
+        response = {"description": "ok", "schema": {"$ref": "#/definitions/User"}}
+        self.assertEqual(deduplicator.get_name("200", response), "User")
+        response = {"description": "ok", "schema": user()}
+        self.assertEqual(deduplicator.get_name("200", response), "User")
+        self.assertEqual(deduplicator.get_name("404", {"description": "ko"}), "Response404")
+        self.assertEqual(deduplicator.get_name("default", {}), "ResponseDefault")
+
+
+class SchemaDeduplicatorTest(unittest.TestCase):
+    def setUp(self):
+        self.spec = {
+            "paths": {
+                "/users": {
+                    "post": {
+                        "parameters": [{"name": "body", "in": "body", "schema": user("Author")}],
+                        "responses": {"200": {"description": "ok", "schema": user("Reviewer")}},
+                    }
+                },
+                "/items": {
+                    "get": {
+                        "responses": {
+                            "200": {
+                                "description": "ok",
+                                "schema": {
+                                    "type": "object",
+                                    "title": "Item",
+                                    "properties": {"owner": user("Owner")},
+                                    "example": {"owner": user("Example")},
+                                },
+                            }
+                        }
+                    }
+                },
+            },
+            "definitions": {},
+        }
+
+    def test_shared_schemas_are_defined_once(self):
+        deduplicator = SchemaDeduplicator(self.spec["definitions"])
+        spec = deduplicator.dedup(self.spec)
+        self.assertEqual(list(spec["definitions"]), ["Author"])
+        self.assertEqual(spec["definitions"]["Author"], user("Author"))
+        post = spec["paths"]["/users"]["post"]
+        self.assertEqual(post["parameters"][0]["schema"], {"$ref": "#/definitions/Author"})
+        self.assertEqual(post["responses"]["200"]["schema"], {"$ref": "#/definitions/Author"})
+        item = spec["paths"]["/items"]["get"]["responses"]["200"]["schema"]
+        self.assertEqual(item["title"], "Item")
+        self.assertEqual(item["properties"]["owner"], {"$ref": "#/definitions/Author"})
+        # values are left untouched
+        self.assertEqual(item["example"], {"owner": user("Example")})
+
+    def test_document_is_not_altered(self):
+        SchemaDeduplicator(self.spec["definitions"]).dedup(self.spec)
+        self.assertEqual(
+            self.spec["paths"]["/users"]["post"]["parameters"][0]["schema"], user("Author")
+        )
+
+    def test_existing_definitions_are_used(self):
+        self.spec["definitions"]["User"] = user()
+        spec = SchemaDeduplicator(self.spec["definitions"]).dedup(self.spec)
+        self.assertEqual(list(spec["definitions"]), ["User"])
+        self.assertEqual(set(iter_refs(spec)), {"#/definitions/User"})
+
+    def test_name_collisions(self):
+        self.spec["definitions"]["Author"] = {"type": "string", "title": "Author"}
+        spec = SchemaDeduplicator(self.spec["definitions"]).dedup(self.spec)
+        self.assertEqual(list(spec["definitions"]), ["Author", "Author_2"])
+        self.assertEqual(spec["definitions"]["Author_2"], user("Author"))
+
+    def test_merge_aliases(self):
+        definitions = self.spec["definitions"]
+        definitions["User"] = user()
+        definitions["Client"] = user("Client")
+        definitions["Order"] = {
+            "type": "object",
+            "properties": {"client": {"$ref": "#/definitions/Client"}},
+        }
+        deduplicator = SchemaDeduplicator(definitions)
+        spec = deduplicator.merge_aliases(deduplicator.dedup(self.spec))
+        self.assertEqual(list(spec["definitions"]), ["User", "Order"])
+        self.assertEqual(
+            spec["definitions"]["Order"]["properties"]["client"], {"$ref": "#/definitions/User"}
+        )
+        self.assertIs(deduplicator.definitions, spec["definitions"])
+        self.assertIs(deduplicator.merge_aliases(spec), spec)
+
+    def test_documents_written_piece_by_piece(self):
+        deduplicator = SchemaDeduplicator({})
+        first = deduplicator.dedup(self.spec["paths"]["/items"])
+        self.assertEqual(first, self.spec["paths"]["/items"])
+        second = deduplicator.dedup(self.spec["paths"]["/users"])
+        post = second["post"]
+        self.assertEqual(post["parameters"][0]["schema"], {"$ref": "#/definitions/Author"})
+        self.assertEqual(post["responses"]["200"]["schema"], {"$ref": "#/definitions/Author"})
+
+
+def envelope_schema(code_type):
+    class Envelope(colander.MappingSchema):
+        code = colander.SchemaNode(code_type())
+        message = colander.SchemaNode(colander.String())
+
+    return Envelope
+
+
+class DefinitionsDedupTest(unittest.TestCase):
+    def setUp(self):
+        Envelope = envelope_schema(colander.Integer)
+        OtherEnvelope = envelope_schema(colander.String)
+
+        class Error(colander.MappingSchema):
+            code = colander.SchemaNode(colander.Integer())
+            message = colander.SchemaNode(colander.String())
+
+        class NotFound(Error):
+            pass
+
+        def response(body, description):
+            attributes = {"body": body}
+            return type("ResponseSchema", (colander.MappingSchema,), attributes)(
+                description=description
+            )
+
+        service = Service("IceCream", "/icecream/{flavour}")
+        service.add_view(
+            "PUT",
+            lambda request: None,
+            validators=(colander_body_validator,),
+            schema=BodySchema(),
+            response_schemas={
+                "400": response(Error(), "Bad request"),
+                "404": response(NotFound(), "Not found"),
+                "500": response(OtherEnvelope(), "Server error"),
+            },
+        )
+        other = Service("Sorbet", "/sorbet")
+        other.add_view(
+            "POST",
+            lambda request: None,
+            validators=(colander_validator,),
+            response_schemas={
+                "200": response(Envelope(), "Ok"),
+                "404": response(Error(), "Not found"),
+            },
+        )
+        self.services = [service, other]
+
+    def generate(self, **kwargs):
+        swagger = CorniceSwagger(self.services, def_ref_depth=1, def_dedup=True)
+        for name, value in kwargs.items():
+            setattr(swagger, name, value)
+        return swagger
+
+    def get_refs(self, spec):
+        return {
+            path: {code: resp["schema"] for code, resp in op["responses"].items()}
+            for path, path_obj in spec["paths"].items()
+            for op in path_obj.values()
+            if "responses" in op
+        }
+
+    def assert_refs_resolve(self, spec):
+        for ref in iter_refs(spec):
+            section, name = ref.split("/")[1:]
+            self.assertIn(name, spec[section])
+
+    def test_without_dedup(self):
+        spec = CorniceSwagger(self.services, def_ref_depth=1).generate()
+        self.assertEqual(list(spec["definitions"]), ["Error", "NotFound", "Envelope"])
+        # the last envelope registered overwrote the first one
+        self.assertEqual(spec["definitions"]["Envelope"]["properties"]["code"]["type"], "integer")
+        refs = self.get_refs(spec)
+        self.assertEqual(refs["/icecream/{flavour}"]["500"], refs["/sorbet"]["200"])
+
+    def test_generate(self):
+        spec = self.generate().generate(title="IceCreamAPI", version="4.2")
+        validate(spec)
+        self.assert_refs_resolve(spec)
+        self.assertEqual(list(spec["definitions"]), ["Error", "Envelope"])
+        self.assertEqual(spec["definitions"]["Envelope"]["properties"]["code"]["type"], "string")
+        error = {"$ref": "#/definitions/Error"}
+        self.assertEqual(
+            self.get_refs(spec),
+            {
+                "/icecream/{flavour}": {
+                    "400": error,
+                    "404": error,
+                    "500": {"$ref": "#/definitions/Envelope"},
+                },
+                "/sorbet": {"200": error, "404": error},
+            },
+        )
+
+    def test_inline_schemas(self):
+        spec = CorniceSwagger(self.services, def_dedup=True).generate()
+        self.assert_refs_resolve(spec)
+        self.assertEqual(list(spec["definitions"]), ["Error"])
+        envelope = self.get_refs(spec)["/icecream/{flavour}"]["500"]
+        self.assertEqual(envelope["title"], "Envelope")
+
+    def test_without_definitions(self):
+        service = Service("Empty", "/empty")
+        service.add_view("GET", lambda request: None)
+        swagger = CorniceSwagger([service], def_dedup=True)
+        self.assertNotIn("definitions", swagger.generate())
+        self.assertNotIn("definitions", json.loads("".join(swagger.iterencode())))
+
+    def test_parallel_and_cached_generation_are_identical(self):
+        serial = json.dumps(self.generate().generate())
+        self.assertEqual(json.dumps(self.generate().generate(workers=2)), serial)
+        swagger = self.generate(cache_fragments=True)
+        self.assertEqual(json.dumps(swagger.generate()), serial)
+        self.assertEqual(json.dumps(swagger.generate()), serial)
+
+    def test_iterencode(self):
+        spec = json.loads("".join(self.generate().iterencode()))
+        validate(spec)
+        self.assert_refs_resolve(spec)
+        # definitions are written once all paths are, aliases are kept
+        self.assertEqual(
+            list(spec["definitions"]), ["Error", "NotFound", "Envelope", "Envelope_2"]
+        )
+        refs = self.get_refs(spec)
+        self.assertEqual(refs["/icecream/{flavour}"]["500"], {"$ref": "#/definitions/Envelope"})
+        self.assertEqual(refs["/sorbet"]["200"], {"$ref": "#/definitions/Envelope_2"})
+
+
+class PaginationSchema(colander.MappingSchema):
+    limit = colander.SchemaNode(colander.Integer(), missing=20)
+    offset = colander.SchemaNode(colander.Integer(), missing=0)
+
+
+class ComponentsDedupTest(unittest.TestCase):
+    def setUp(self):
+        class ListRequestSchema(colander.MappingSchema):
+            querystring = PaginationSchema()
+
+        class SearchQuerySchema(PaginationSchema):
+            limit = colander.SchemaNode(colander.Integer(), missing=50)
+
+        class SearchRequestSchema(colander.MappingSchema):
+            querystring = SearchQuerySchema()
+
+        class NotFoundResponseSchema(colander.MappingSchema):
+            body = envelope_schema(colander.Integer)()
+
+        class OtherNotFoundResponseSchema(colander.MappingSchema):
+            body = envelope_schema(colander.Integer)()
+
+        response_schemas = {
+            "200": colander.MappingSchema(description="Ok"),
+            "404": NotFoundResponseSchema(description="Not found"),
+        }
+        self.services = []
+        for name in ("flavours", "toppings"):
+            service = Service(name, "/{}/{{id}}".format(name))
+            service.add_view(
+                "GET",
+                lambda request: None,
+                validators=(colander_validator,),
+                schema=ListRequestSchema(),
+                response_schemas=response_schemas,
+            )
+            self.services.append(service)
+        service = Service("search", "/search/{id}")
+        service.add_view(
+            "GET",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=SearchRequestSchema(),
+            response_schemas={
+                "200": colander.MappingSchema(description="Ok"),
+                "404": OtherNotFoundResponseSchema(description="Not found"),
+            },
+        )
+        self.services.append(service)
+
+    def generate(self, **kwargs):
+        swagger = CorniceSwagger(self.services, param_dedup=True, resp_dedup=True, **kwargs)
+        return swagger, swagger.generate(title="IceCreamAPI", version="4.2")
+
+    def test_generate(self):
+        swagger, spec = self.generate()
+        validate(spec)
+        self.assertEqual(list(spec["parameters"]), ["id", "limit", "offset"])
+        self.assertEqual(list(spec["responses"]), ["Response200", "Envelope"])
+        for path in ("/flavours/{id}", "/toppings/{id}"):
+            path_obj = spec["paths"][path]
+            self.assertEqual(path_obj["parameters"], [{"$ref": "#/parameters/id"}])
+            self.assertEqual(
+                path_obj["get"]["parameters"],
+                [{"$ref": "#/parameters/limit"}, {"$ref": "#/parameters/offset"}],
+            )
+            self.assertEqual(
+                path_obj["get"]["responses"],
+                {
+                    "200": {"$ref": "#/responses/Response200"},
+                    "404": {"$ref": "#/responses/Envelope"},
+                },
+            )
+        search = spec["paths"]["/search/{id}"]["get"]
+        # the limit only used once stays inline
+        self.assertEqual(search["parameters"][0]["default"], 50)
+        self.assertEqual(search["parameters"][1], {"$ref": "#/parameters/offset"})
+        self.assertEqual(search["responses"]["404"], {"$ref": "#/responses/Envelope"})
+
+    def test_report(self):
+        swagger, spec = self.generate()
+        report = swagger.dedup_report
+        self.assertEqual(report.size, len(json.dumps(spec, separators=(",", ":"))))
+        self.assertGreater(report.bytes_saved, 0)
+        self.assertEqual(report.original_size, report.size + report.bytes_saved)
+        self.assertEqual(report.shared, {"parameters": 3, "responses": 2})
+        self.assertIsNone(CorniceSwagger(self.services).dedup_report)
+
+    def test_without_dedup(self):
+        spec = CorniceSwagger(self.services).generate()
+        self.assertNotIn("parameters", spec)
+        self.assertNotIn("responses", spec)
+
+    def test_numbered_refs(self):
+        # parameters with a same name used to overwrite each other
+        spec = CorniceSwagger(self.services, param_ref=True).generate()
+        self.assertEqual(spec["parameters"]["limit"]["default"], 50)
+
+        swagger, spec = self.generate(param_ref=True, resp_ref=True)
+        validate(spec)
+        self.assertEqual(list(spec["parameters"]), ["id", "limit", "offset", "limit_2"])
+        self.assertEqual(spec["parameters"]["limit"]["default"], 20)
+        self.assertEqual(spec["parameters"]["limit_2"]["default"], 50)
+        # identical responses registered under different names are merged
+        self.assertEqual(list(spec["responses"]), ["Schema", "NotFoundResponseSchema"])
+        search = spec["paths"]["/search/{id}"]["get"]
+        self.assertEqual(search["parameters"][0], {"$ref": "#/parameters/limit_2"})
+        self.assertEqual(
+            search["responses"]["404"], {"$ref": "#/responses/NotFoundResponseSchema"}
+        )
+
+    def test_parallel_and_cached_generation_are_identical(self):
+        kwargs = dict(param_ref=True, resp_ref=True, def_ref_depth=1, def_dedup=True)
+        serial = json.dumps(self.generate(**kwargs)[1])
+        swagger = CorniceSwagger(self.services, param_dedup=True, resp_dedup=True, **kwargs)
+        self.assertEqual(
+            json.dumps(swagger.generate(title="IceCreamAPI", version="4.2", workers=3)), serial
+        )
+        swagger.cache_fragments = True
+        for _ in range(2):
+            spec = swagger.generate(title="IceCreamAPI", version="4.2")
+            self.assertEqual(json.dumps(spec), serial)
+
+    def test_iterencode(self):
+        swagger = CorniceSwagger(self.services, param_dedup=True, resp_dedup=True, def_dedup=True)
+        spec = json.loads("".join(swagger.iterencode(title="IceCreamAPI", version="4.2")))
+        validate(spec)
+        self.assertEqual(list(spec["parameters"]), ["id", "limit", "offset"])
+        self.assertEqual(list(spec["responses"]), ["Response200", "Envelope"])
+        self.assertEqual(list(spec["definitions"]), ["Envelope"])
+        # the first occurrences are written before being known as shared
+        flavours = spec["paths"]["/flavours/{id}"]
+        self.assertEqual(flavours["parameters"][0]["name"], "id")
+        toppings = spec["paths"]["/toppings/{id}"]
+        self.assertEqual(toppings["parameters"], [{"$ref": "#/parameters/id"}])
+        self.assertIsNone(swagger.dedup_report)
+
+    def test_without_paths(self):
+        swagger = CorniceSwagger([], param_dedup=True)
+        self.assertNotIn("parameters", swagger.generate())
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from unittest import mock
+
+from cornice import Service
+from cornice.service import clear_services
+from pyramid import testing
+from pyramid.config import Configurator
+
+from cornice_swagger.cache import SpecFile
+from cornice_swagger.scripts import main
+
+
+def includeme(config):
+    service = Service("IceCream", "/icecream/{flavour}")
+    service.add_view("GET", lambda request: None)
+    config.include("cornice")
+    config.include("cornice_swagger")
+    config.cornice_enable_openapi_view(title="IceCreamAPI", version="4.2")
+    config.add_cornice_service(service)
+
+
+def make_app(global_config, **settings):
+    config = Configurator(settings=settings)
+    config.include(includeme)
+    return config.make_wsgi_app()
+
+
+def make_file_app(global_config, **settings):
+    config = Configurator(settings=settings)
+    config.include(includeme)
+    config.cornice_enable_openapi_view(
+        title="IceCreamAPI", version="4.2", spec_file=settings["spec_file"]
+    )
+    return config.make_wsgi_app()
+
+
+class GenerateCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.output = os.path.join(self.path, "swagger.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        clear_services()
+        testing.tearDown()
+
+    def check_output(self):
+        with open(self.output) as spec_file:
+            spec = json.load(spec_file)
+        self.assertEqual(spec["info"]["title"], "IceCreamAPI")
+        self.assertIn("/icecream/{flavour}", spec["paths"])
+
+        spec_file = SpecFile(self.output)
+        self.assertIn("gzip", spec_file.encodings)
+        # without fingerprint file the ETag is computed from the document
+        os.remove(self.output + ".sha256")
+        self.assertEqual(SpecFile(self.output).etag, spec_file.etag)
+
+    def test_generate_from_includeme(self):
+        with mock.patch("sys.stdout", new_callable=StringIO) as stdout:
+            code = main(["generate", "--includeme", "tests.test_scripts", "-o", self.output])
+        self.assertEqual(code, 0)
+        self.assertIn(self.output, stdout.getvalue())
+        self.check_output()
+
+    def test_generate_from_ini(self):
+        config_uri = os.path.join(self.path, "app.ini")
+        with open(config_uri, "w") as ini_file:
+            ini_file.write("[app:main]\nuse = call:tests.test_scripts:make_app\n")
+        with mock.patch("sys.stdout", new_callable=StringIO):
+            code = main(["generate", "--ini", config_uri, "-o", self.output])
+        self.assertEqual(code, 0)
+        self.check_output()
+
+    def test_generate_from_app_serving_the_file(self):
+        config_uri = os.path.join(self.path, "app.ini")
+        with open(config_uri, "w") as ini_file:
+            ini_file.write("[app:main]\nuse = call:tests.test_scripts:make_file_app\n")
+            ini_file.write("spec_file = {}\n".format(self.output))
+        with mock.patch("sys.stdout", new_callable=StringIO):
+            code = main(["generate", "--ini", config_uri, "-o", self.output])
+        self.assertEqual(code, 0)
+        self.check_output()
+
+    def test_source_is_required(self):
+        with mock.patch("sys.stderr", new_callable=StringIO):
+            with self.assertRaises(SystemExit):
+                main(["generate"])
+
+
+class AnalyzeCommandTest(unittest.TestCase):
+    def tearDown(self):
+        clear_services()
+        testing.tearDown()
+
+    def test_analyze_application(self):
+        with mock.patch("sys.stdout", new_callable=StringIO) as stdout:
+            code = main(["analyze", "--includeme", "tests.test_scripts", "-n", "3"])
+        self.assertEqual(code, 0)
+        output = stdout.getvalue()
+        self.assertTrue(output.startswith("Total: "))
+        self.assertIn("/icecream/{flavour}", output)
+        self.assertIn("description stripping", output)
+
+    def test_analyze_file(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        output = os.path.join(path, "swagger.json")
+        with mock.patch("sys.stdout", new_callable=StringIO):
+            main(["generate", "--includeme", "tests.test_scripts", "-o", output])
+        with open(output) as spec_file:
+            size = len(json.dumps(json.load(spec_file), separators=(",", ":")))
+
+        with mock.patch("sys.stdout", new_callable=StringIO) as stdout:
+            code = main(["analyze", "--file", output, "--json", "--min-size", "10"])
+        self.assertEqual(code, 0)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report["total"], size)
+        self.assertIn("/icecream/{flavour}", report["paths"])
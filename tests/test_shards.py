@@ -0,0 +1,144 @@
+import unittest
+
+from flex.core import validate
+
+from cornice_swagger.shards import extract_shard, get_prefix_shard_name, match_prefix, split_spec
+
+
+class SplitSpecTest(unittest.TestCase):
+    def setUp(self):
+        self.spec = {
+            "swagger": "2.0",
+            "info": {"title": "IceCreamAPI", "version": "4.2"},
+            "basePath": "/",
+            "tags": [{"name": "ice"}, {"name": "cream"}],
+            "paths": {
+                "/icecream/{flavour}": {
+                    "parameters": [{"$ref": "#/parameters/flavour"}],
+                    "get": {
+                        "tags": ["ice", "cream"],
+                        "responses": {"200": {"$ref": "#/responses/IceCream"}},
+                    },
+                    "put": {
+                        "tags": ["ice"],
+                        "responses": {"default": {"description": "UNDOCUMENTED RESPONSE"}},
+                    },
+                },
+                "/icecream/admin/stock": {
+                    "get": {
+                        "responses": {"default": {"description": "UNDOCUMENTED RESPONSE"}},
+                    },
+                },
+                "/sorbet": {
+                    "get": {
+                        "tags": ["cream"],
+                        "responses": {
+                            "200": {
+                                "description": "Sorbet",
+                                "schema": {"$ref": "#/definitions/Sorbet"},
+                            },
+                        },
+                    },
+                },
+            },
+            "parameters": {
+                "flavour": {"name": "flavour", "in": "path", "required": True, "type": "string"},
+                "unused": {"name": "unused", "in": "query", "type": "string"},
+            },
+            "responses": {
+                "IceCream": {
+                    "description": "Ice cream",
+                    "schema": {"$ref": "#/definitions/IceCream"},
+                },
+            },
+            "definitions": {
+                "IceCream": {
+                    "type": "object",
+                    "title": "IceCream",
+                    "properties": {"cone": {"$ref": "#/definitions/Cone"}},
+                },
+                "Cone": {"type": "object", "title": "Cone"},
+                "Sorbet": {"type": "object", "title": "Sorbet"},
+            },
+        }
+        validate(self.spec)
+
+    def test_split_by_tags(self):
+        shards = split_spec(self.spec, "tags")
+        self.assertEqual(list(shards), ["ice", "cream", "default"])
+        for shard in shards.values():
+            validate(shard)
+
+        ice = shards["ice"]
+        self.assertEqual(list(ice["paths"]), ["/icecream/{flavour}"])
+        self.assertEqual(sorted(ice["paths"]["/icecream/{flavour}"]), ["get", "parameters", "put"])
+        self.assertEqual(ice["tags"], [{"name": "ice"}, {"name": "cream"}])
+        self.assertEqual(ice["info"], self.spec["info"])
+        self.assertEqual(list(ice["parameters"]), ["flavour"])
+        self.assertEqual(list(ice["responses"]), ["IceCream"])
+        self.assertEqual(sorted(ice["definitions"]), ["Cone", "IceCream"])
+
+        cream = shards["cream"]
+        self.assertEqual(list(cream["paths"]), ["/icecream/{flavour}", "/sorbet"])
+        self.assertEqual(sorted(cream["paths"]["/icecream/{flavour}"]), ["get", "parameters"])
+        self.assertEqual(sorted(cream["definitions"]), ["Cone", "IceCream", "Sorbet"])
+
+        default = shards["default"]
+        self.assertEqual(list(default["paths"]), ["/icecream/admin/stock"])
+        self.assertNotIn("tags", default)
+        self.assertNotIn("definitions", default)
+
+    def test_split_by_prefixes(self):
+        shards = split_spec(self.spec, ["/icecream", "/icecream/admin"])
+        self.assertEqual(list(shards), ["icecream", "icecream-admin", "default"])
+        for shard in shards.values():
+            validate(shard)
+
+        self.assertEqual(list(shards["icecream"]["paths"]), ["/icecream/{flavour}"])
+        self.assertEqual(list(shards["icecream-admin"]["paths"]), ["/icecream/admin/stock"])
+        self.assertEqual(list(shards["default"]["paths"]), ["/sorbet"])
+        self.assertEqual(list(shards["default"]["definitions"]), ["Sorbet"])
+
+    def test_prefixes_match_whole_segments(self):
+        self.spec["paths"]["/icecreams"] = self.spec["paths"].pop("/icecream/admin/stock")
+        shards = split_spec(self.spec, ["/icecream", "/sorbet/"])
+        self.assertEqual(list(shards["icecream"]["paths"]), ["/icecream/{flavour}"])
+        self.assertEqual(list(shards["default"]["paths"]), ["/icecreams"])
+        self.assertEqual(list(shards["sorbet"]["paths"]), ["/sorbet"])
+
+    def test_match_prefix(self):
+        self.assertTrue(match_prefix("/users", "/users"))
+        self.assertTrue(match_prefix("/users/{id}", "/users"))
+        self.assertTrue(match_prefix("/users/{id}", "/users/"))
+        self.assertTrue(match_prefix("/users", "/users/"))
+        self.assertTrue(match_prefix("/users", "/"))
+        self.assertFalse(match_prefix("/usersettings", "/users"))
+        self.assertFalse(match_prefix("/users-admin/x", "/users"))
+
+    def test_prefix_shard_name(self):
+        self.assertEqual(get_prefix_shard_name("/users/admin/"), "users-admin")
+        self.assertEqual(get_prefix_shard_name("/"), "default")
+
+    def test_external_and_dangling_refs_are_ignored(self):
+        paths = {
+            "/cone": {
+                "get": {
+                    "responses": {
+                        "200": {
+                            "description": "Cone",
+                            "schema": {
+                                "type": "array",
+                                "items": [
+                                    {"$ref": "other.json#/definitions/Cone"},
+                                    {"$ref": "#/definitions/Missing"},
+                                    {"$ref": "#/definitions/Cone"},
+                                    {"$ref": "#/definitions/Cone"},
+                                ],
+                            },
+                        }
+                    }
+                }
+            }
+        }
+        shard = extract_shard(self.spec, paths)
+        self.assertEqual(shard["definitions"], {"Cone": {"type": "object", "title": "Cone"}})
@@ -0,0 +1,216 @@
+import unittest
+from unittest import mock
+
+import colander
+from cornice.service import Service
+from cornice.validators import colander_body_validator, colander_validator
+
+from cornice_swagger import swagger as swagger_module
+from cornice_swagger.stats import (
+    CostProfiler,
+    GenerationStats,
+    get_class_name,
+    get_profiler,
+    get_stats,
+    phase,
+)
+from cornice_swagger.swagger import CorniceSwagger
+
+from .support import BodySchema, GetRequestSchema, PutRequestSchema, response_schemas
+
+
+PHASES = {
+    "definitions",
+    "merge",
+    "operations",
+    "parameters",
+    "responses",
+    "routes",
+    "schema_transform",
+    "type_conversion",
+}
+
+
+class GenerationStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.services = []
+        for name in ("IceCream", "Sorbet"):
+            service = Service(name, "/{}/{{flavour}}".format(name.lower()))
+            service.add_view(
+                "GET",
+                lambda request: None,
+                validators=(colander_validator,),
+                schema=GetRequestSchema(),
+                response_schemas=response_schemas,
+            )
+            service.add_view(
+                "PUT",
+                lambda request: None,
+                validators=(colander_validator,),
+                schema=PutRequestSchema(),
+            )
+            self.services.append(service)
+
+    def test_generate(self):
+        stats = GenerationStats()
+        swagger = CorniceSwagger(self.services, def_ref_depth=1, param_ref=True)
+        with self.assertLogs("cornice_swagger.swagger", "DEBUG") as logs:
+            spec = swagger.generate(stats=stats)
+        self.assertEqual(
+            spec, CorniceSwagger(self.services, def_ref_depth=1, param_ref=True).generate()
+        )
+        self.assertIn("Phases:", logs.output[0])
+
+        self.assertEqual(set(stats.phases), PHASES)
+        self.assertGreater(stats.total, 0)
+        self.assertLessEqual(sum(stats.phases.values()), stats.total)
+        counts = stats.counts
+        self.assertEqual(counts["services"], 2)
+        self.assertEqual(counts["services_converted"], 2)
+        self.assertEqual(counts["operations"], 4)
+        self.assertEqual(counts["definitions_emitted"], len(spec["definitions"]))
+        self.assertEqual(counts["parameters_emitted"], len(spec["parameters"]))
+        self.assertEqual(counts["responses_emitted"], 0)
+        self.assertGreater(counts["nodes_converted"], 0)
+        names = [name for name, _ in stats.slowest_services]
+        self.assertEqual(sorted(names), ["IceCream", "Sorbet"])
+        times = [elapsed for _, elapsed in stats.slowest_services]
+        self.assertEqual(times, sorted(times, reverse=True))
+        self.assertIsNone(get_stats())
+
+    def test_parallel_generate(self):
+        stats = GenerationStats(slowest=1)
+        CorniceSwagger(self.services).generate(stats=stats, workers=2)
+        self.assertEqual(set(stats.phases), PHASES)
+        self.assertEqual(stats.counts["services_converted"], 2)
+        self.assertEqual(len(stats.slowest_services), 1)
+
+    def test_cached_generate(self):
+        swagger = CorniceSwagger(self.services)
+        swagger.cache_fragments = True
+        swagger.generate()
+        stats = GenerationStats()
+        swagger.generate(stats=stats)
+        self.assertEqual(stats.counts["services"], 2)
+        self.assertNotIn("services_converted", stats.counts)
+
+    def test_disabled(self):
+        with mock.patch.object(swagger_module.logger, "debug") as debug:
+            CorniceSwagger(self.services).generate()
+        debug.assert_not_called()
+        with phase("merge"):
+            self.assertIsNone(get_stats())
+
+    def test_nested_phases(self):
+        stats = GenerationStats()
+        with stats.collect():
+            with phase("responses"):
+                with phase("type_conversion"):
+                    with phase("type_conversion"):
+                        self.assertIs(get_stats(), stats)
+        self.assertEqual(set(stats.phases), {"responses", "type_conversion"})
+        self.assertLessEqual(
+            stats.phases["responses"] + stats.phases["type_conversion"], stats.total
+        )
+
+    def test_report(self):
+        stats = GenerationStats()
+        CorniceSwagger(self.services).generate(stats=stats)
+        report = stats.as_dict()
+        self.assertEqual(sorted(report), ["counts", "phases", "slowest_services", "total"])
+        self.assertEqual(report["counts"]["operations"], 4)
+        text = str(stats)
+        self.assertTrue(text.startswith("Total: "))
+        self.assertIn("type_conversion", text)
+        self.assertIn("Slowest services:", text)
+
+
+class CostProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.service = Service("IceCream", "/icecream/{flavour}")
+        self.service.add_view(
+            "GET",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=GetRequestSchema(),
+            response_schemas=response_schemas,
+        )
+        self.service.add_view(
+            "PUT",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=PutRequestSchema(),
+        )
+
+    def test_generate(self):
+        profiler = CostProfiler()
+        swagger = CorniceSwagger([self.service])
+        spec = swagger.generate(profiler=profiler)
+        self.assertEqual(spec, CorniceSwagger([self.service]).generate())
+        self.assertIsNone(get_profiler())
+
+        schemas = {entry.key: entry for entry in profiler.top(kind="schemas", by="calls")}
+        body = schemas["tests.support.BodySchema"]
+        self.assertEqual(body.calls, 3)
+        self.assertGreater(body.time, 0)
+        self.assertGreater(body.size, 0)
+
+        requests = [entry.key for entry in profiler.top(kind="requests", by="size")]
+        self.assertEqual(
+            requests, ["tests.support.PutRequestSchema", "tests.support.GetRequestSchema"]
+        )
+        responses = profiler.top(kind="responses")
+        self.assertEqual([entry.key for entry in responses], ["tests.support.ResponseSchema"])
+        self.assertEqual(responses[0].calls, 2)
+        operations = profiler.top(1, kind="operations")
+        self.assertEqual(len(operations), 1)
+        self.assertIn(
+            operations[0].key, [("/icecream/{flavour}", "GET"), ("/icecream/{flavour}", "PUT")]
+        )
+
+    def test_requests_are_profiled_by_given_class(self):
+        class SorbetSchema(colander.MappingSchema):
+            flavour = colander.SchemaNode(colander.String())
+
+        sorbet = Service("Sorbet", "/sorbet")
+        sorbet.add_view(
+            "PUT", lambda request: None, validators=(colander_body_validator,), schema=BodySchema()
+        )
+        sorbet.add_view(
+            "POST",
+            lambda request: None,
+            validators=(colander_body_validator,),
+            schema=SorbetSchema,
+        )
+        profiler = CostProfiler()
+        CorniceSwagger([sorbet]).generate(profiler=profiler)
+        requests = sorted(entry.key for entry in profiler.top(kind="requests"))
+        self.assertEqual(requests, ["tests.support.BodySchema", get_class_name(SorbetSchema)])
+
+    def test_parallel_generate(self):
+        profiler = CostProfiler()
+        CorniceSwagger([self.service]).generate(profiler=profiler, workers=2)
+        operations = [entry.key for entry in profiler.top(kind="operations", by="calls")]
+        self.assertEqual(len(operations), 2)
+        self.assertEqual(profiler.top(kind="responses")[0].calls, 2)
+
+    def test_with_stats(self):
+        profiler = CostProfiler()
+        stats = GenerationStats()
+        CorniceSwagger([self.service]).generate(stats=stats, profiler=profiler)
+        self.assertEqual(stats.counts["operations"], 2)
+        self.assertEqual(len(profiler.top(kind="operations")), 2)
+
+    def test_disabled(self):
+        with mock.patch.object(CostProfiler, "record") as record:
+            CorniceSwagger([self.service]).generate()
+        record.assert_not_called()
+
+    def test_report(self):
+        profiler = CostProfiler()
+        CorniceSwagger([self.service]).generate(profiler=profiler)
+        text = str(profiler)
+        self.assertTrue(text.startswith("Top 10 schemas by time:"))
+        self.assertIn("Top 10 operations by time:", text)
+        self.assertIn("/icecream/{flavour} PUT", text)
+        self.assertIn("tests.support.BodySchema", profiler.report(1, by="size"))
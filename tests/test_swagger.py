@@ -1,10 +1,20 @@
+import asyncio
+import datetime
+import json
+import sys
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 from unittest import mock
 
+import colander
 from cornice.service import Service
 from cornice.validators import colander_body_validator, colander_validator
 from flex.core import validate
 
+from cornice_swagger import swagger as swagger_module
+from cornice_swagger.stats import CostProfiler, GenerationStats
 from cornice_swagger.swagger import CorniceSwagger, CorniceSwaggerException
 
 from .support import BodySchema, GetRequestSchema, HeaderSchema, PutRequestSchema, response_schemas
@@ -109,6 +119,531 @@ class CorniceSwaggerGeneratorTest(unittest.TestCase):
         mocked.assert_called_with(msg, DeprecationWarning)
 
 
+class IterencodeTest(unittest.TestCase):
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}", tags=["ice"])
+
+        class IceCream(object):
+            @service.get(
+                validators=(colander_validator,),
+                schema=GetRequestSchema(),
+                response_schemas=response_schemas,
+                tags=["cream"],
+            )
+            def view_get(self, request):
+                """Serve ice cream"""
+                return self.request.validated
+
+            @service.put(validators=(colander_validator,), schema=PutRequestSchema())
+            def view_put(self, request):
+                """Add flavour"""
+                return self.request.validated
+
+        sorbet = Service("Sorbet", "/sorbet")
+        sorbet.add_view("GET", lambda request: None)
+        self.services = [service, sorbet]
+
+    def assert_same_as_generate(self, swagger_kwargs=None, **kwargs):
+        swagger_kwargs = swagger_kwargs or {}
+        spec = CorniceSwagger(self.services, **swagger_kwargs).generate(**kwargs)
+        chunks = list(CorniceSwagger(self.services, **swagger_kwargs).iterencode(**kwargs))
+        streamed = json.loads("".join(chunks))
+        validate(streamed)
+        self.assertEqual(streamed, spec)
+        return streamed
+
+    def test_same_as_generate(self):
+        self.assert_same_as_generate(title="IceCreamAPI", version="4.2")
+
+    def test_same_as_generate_with_refs(self):
+        swagger_kwargs = dict(def_ref_depth=-1, param_ref=True, resp_ref=True)
+        spec = self.assert_same_as_generate(swagger_kwargs)
+        self.assertIn("definitions", spec)
+        self.assertIn("parameters", spec)
+        self.assertIn("responses", spec)
+
+    def test_same_as_generate_with_provided_sections(self):
+        swagger = {
+            "tags": [{"name": "cream", "description": "Creamy"}],
+            "paths": {
+                "/icecream/{flavour}": {"get": {"summary": "Get ice cream"}},
+                "/cone": {"get": {"responses": {"200": {"description": "A cone"}}}},
+            },
+            "definitions": {"Cone": {"type": "object"}},
+        }
+        spec = self.assert_same_as_generate(swagger=swagger)
+        self.assertEqual(spec["paths"]["/icecream/{flavour}"]["get"]["summary"], "Get ice cream")
+        self.assertIn("/cone", spec["paths"])
+
+    def test_same_as_generate_with_provided_paths_only(self):
+        swagger = {"paths": {"/cone": {"get": {"responses": {"200": {"description": "A cone"}}}}}}
+        self.services = []
+        self.assert_same_as_generate(swagger=swagger)
+
+    def test_services_are_converted_lazily(self):
+        swagger = CorniceSwagger(self.services)
+        with mock.patch.object(swagger, "_build_path") as build_path:
+            chunks = swagger.iterencode()
+            self.assertEqual(next(chunks), "{")
+            next(chunks)
+            self.assertFalse(build_path.called)
+
+
+class IterOperationsTest(unittest.TestCase):
+    def setUp(self):
+        service = Service("IceCream", "/icecream/{flavour}")
+        service.add_view(
+            "GET",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=GetRequestSchema(),
+            response_schemas=response_schemas,
+        )
+        service.add_view(
+            "PUT",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=PutRequestSchema(),
+        )
+        self.swagger = CorniceSwagger([service], def_ref_depth=1, param_ref=True)
+
+    def test_operations(self):
+        operations = list(self.swagger.iter_operations())
+        self.assertEqual(
+            [(path, method) for path, method, _ in operations],
+            [
+                ("/icecream/{flavour}", "parameters"),
+                ("/icecream/{flavour}", "get"),
+                ("/icecream/{flavour}", "put"),
+            ],
+        )
+        spec = CorniceSwagger(self.swagger.services, def_ref_depth=1, param_ref=True).generate()
+        for path, method, operation in operations:
+            self.assertEqual(spec["paths"][path][method], operation)
+
+    def test_registries_are_filled_while_iterating(self):
+        self.assertEqual(list(self.swagger.iter_registries()), [])
+        operations = self.swagger.iter_operations()
+        next(operations)
+        self.assertIn(
+            ("parameters", "flavour", self.swagger.parameters.parameter_registry["flavour"]),
+            list(self.swagger.iter_registries()),
+        )
+        list(operations)
+        sections = {section for section, _, _ in self.swagger.iter_registries()}
+        self.assertEqual(sections, {"definitions", "parameters"})
+
+    def test_write(self):
+        output = StringIO()
+        self.swagger.write(output, title="IceCreamAPI", version="4.2")
+        spec = CorniceSwagger(self.swagger.services, def_ref_depth=1, param_ref=True).generate(
+            title="IceCreamAPI", version="4.2"
+        )
+        self.assertEqual(json.loads(output.getvalue()), spec)
+
+
+class FragmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.icecream = Service("IceCream", "/icecream/{flavour}")
+        self.icecream.add_view(
+            "GET",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=GetRequestSchema(),
+            response_schemas=response_schemas,
+        )
+        self.sorbet = Service("Sorbet", "/sorbet")
+        self.sorbet.add_view(
+            "PUT",
+            lambda request: None,
+            validators=(colander_validator,),
+            schema=PutRequestSchema(),
+        )
+        self.swagger = CorniceSwagger(
+            [self.icecream, self.sorbet], def_ref_depth=1, param_ref=True, resp_ref=True
+        )
+        self.swagger.cache_fragments = True
+
+    def generate_uncached(self):
+        swagger = CorniceSwagger(
+            self.swagger.services, def_ref_depth=1, param_ref=True, resp_ref=True
+        )
+        return swagger.generate(title="IceCreamAPI", version="4.2")
+
+    def generate(self):
+        build_path = CorniceSwagger._build_path
+        with mock.patch.object(
+            CorniceSwagger, "_build_path", autospec=True, side_effect=build_path
+        ) as mocked:
+            spec = self.swagger.generate(title="IceCreamAPI", version="4.2")
+        return spec, [call.args[1] for call in mocked.call_args_list]
+
+    def test_unchanged_services_are_not_converted_again(self):
+        first, converted = self.generate()
+        self.assertEqual(converted, [self.icecream, self.sorbet])
+        second, converted = self.generate()
+        self.assertEqual(converted, [])
+        self.assertEqual(first, second)
+        self.assertEqual(second, self.generate_uncached())
+
+    def test_changed_service_is_converted_again(self):
+        self.generate()
+        self.sorbet.add_view("GET", lambda request: None, tags=["sorbet"])
+        spec, converted = self.generate()
+        self.assertEqual(converted, [self.sorbet])
+        self.assertEqual(spec, self.generate_uncached())
+
+    def test_new_service_is_converted(self):
+        self.generate()
+        cone = Service("Cone", "/cone/{size}")
+        cone.add_view("GET", lambda request: None)
+        self.swagger.services = self.swagger.services + [cone]
+        spec, converted = self.generate()
+        self.assertEqual(converted, [cone])
+        self.assertEqual(spec, self.generate_uncached())
+
+    def test_removed_service_contributions_are_dropped(self):
+        spec, _ = self.generate()
+        self.assertIn("bar", spec["parameters"])
+        self.swagger.services = [self.icecream]
+        spec, converted = self.generate()
+        self.assertEqual(converted, [])
+        self.assertNotIn("bar", spec["parameters"])
+        self.assertEqual(spec, self.generate_uncached())
+        self.assertEqual(len(self.swagger._fragments), 1)
+
+    def test_settings_change_invalidates_fragments(self):
+        self.generate()
+        self.swagger.default_tags = ["icecream"]
+        spec, converted = self.generate()
+        self.assertEqual(converted, [self.icecream, self.sorbet])
+        self.assertEqual(spec["paths"]["/sorbet"]["put"]["tags"], ["icecream"])
+
+    def test_fragments_are_not_altered_by_documents(self):
+        spec, _ = self.generate()
+        spec["paths"]["/sorbet"]["put"]["tags"] = ["altered"]
+        spec["parameters"].clear()
+        self.assertEqual(self.generate()[0], self.generate_uncached())
+
+    def test_fragments_marshal_can_not_serialize(self):
+        class DaySchema(colander.MappingSchema):
+            day = colander.SchemaNode(colander.Date(), missing=datetime.date(2020, 1, 1))
+
+        self.sorbet.add_view(
+            "POST",
+            lambda request: None,
+            validators=(colander_body_validator,),
+            schema=DaySchema(),
+        )
+        spec, _ = self.generate()
+        spec["paths"]["/sorbet"]["post"]["parameters"].clear()
+        spec, converted = self.generate()
+        self.assertEqual(converted, [])
+        self.assertEqual(spec, self.generate_uncached())
+
+
+def get_sorbet(request):
+    """Serve a sorbet"""
+
+
+class ParallelGenerationTest(unittest.TestCase):
+    def setUp(self):
+        services = []
+        for i in range(12):
+            service = Service("IceCream%d" % i, "/icecream%d/{flavour}" % i, tags=["ice%d" % i])
+            service.add_view(
+                "GET",
+                get_sorbet,
+                validators=(colander_validator,),
+                schema=GetRequestSchema(),
+                response_schemas=response_schemas,
+                tags=["cream", "ice%d" % (i % 3)],
+            )
+            service.add_view(
+                "PUT",
+                get_sorbet,
+                validators=(colander_validator,),
+                schema=PutRequestSchema(),
+            )
+            services.append(service)
+        self.services = services
+
+    def generate(self, **kwargs):
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True, resp_ref=True)
+        spec = swagger.generate(title="IceCreamAPI", version="4.2", **kwargs)
+        return json.dumps(spec)
+
+    def test_threads_output_is_identical(self):
+        self.assertEqual(self.generate(workers=4), self.generate())
+
+    def test_processes_output_is_identical(self):
+        self.assertEqual(self.generate(workers=4, pool="process"), self.generate())
+
+    def test_iterencode(self):
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True)
+        serial = "".join(swagger.iterencode())
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True)
+        self.assertEqual("".join(swagger.iterencode(workers=3)), serial)
+
+    def test_with_cached_fragments(self):
+        swagger = CorniceSwagger(self.services, param_ref=True)
+        swagger.cache_fragments = True
+        spec = swagger.generate(workers=4)
+        self.assertEqual(swagger.generate(workers=4), spec)
+        self.assertEqual(CorniceSwagger(self.services, param_ref=True).generate(), spec)
+
+    def test_errors_are_raised(self):
+        self.services[5].add_view("POST", get_sorbet, tags="not a list")
+        swagger = CorniceSwagger(self.services)
+        with self.assertRaises(CorniceSwaggerException):
+            swagger.generate(workers=4)
+
+    def test_unknown_pool(self):
+        swagger = CorniceSwagger(self.services)
+        with self.assertRaises(CorniceSwaggerException):
+            swagger.generate(workers=4, pool="fiber")
+
+    def test_worker_process_functions(self):
+        swagger = CorniceSwagger(self.services, param_ref=True)
+        swagger_module._init_worker(swagger)
+        self.addCleanup(swagger_module._init_worker, None)
+        path, path_obj, tags, contributions = swagger_module._build_worker_fragment(2)
+        self.assertEqual(path, "/icecream2/{flavour}")
+        self.assertEqual(tags, ["ice2", "cream"])
+        self.assertIn("flavour", contributions[1])
+
+
+class ConcurrentGenerationTest(unittest.TestCase):
+    threads = 8
+    calls = 5
+
+    def setUp(self):
+        # switch threads as often as possible to interleave generations
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        self.services = []
+        for i in range(6):
+            service = Service("IceCream%d" % i, "/icecream%d/{flavour}" % i)
+            service.add_view(
+                "GET",
+                get_sorbet,
+                validators=(colander_validator,),
+                schema=GetRequestSchema(),
+                response_schemas=response_schemas,
+            )
+            service.add_view(
+                "PUT", get_sorbet, validators=(colander_validator,), schema=PutRequestSchema()
+            )
+            self.services.append(service)
+
+    def run_concurrently(self, func):
+        barrier = threading.Barrier(self.threads)
+
+        def run(index):
+            barrier.wait()
+            return [func(index) for _ in range(self.calls)]
+
+        with ThreadPoolExecutor(self.threads) as executor:
+            return list(executor.map(run, range(self.threads)))
+
+    def check_generate(self, **kwargs):
+        swagger = CorniceSwagger(self.services, **kwargs)
+        info = {"description": "Ice creams"}
+
+        def generate(index):
+            return swagger.generate("IceCreamAPI%d" % index, "4.2", info=info)
+
+        results = self.run_concurrently(generate)
+        for index, specs in enumerate(results):
+            expected = CorniceSwagger(self.services, **kwargs).generate(
+                "IceCreamAPI%d" % index, "4.2", info={"description": "Ice creams"}
+            )
+            for spec in specs:
+                self.assertEqual(spec, expected)
+        self.assertEqual(info, {"description": "Ice creams"})
+        self.assertEqual(CorniceSwagger.swagger, {"info": {}})
+
+    def test_generate(self):
+        self.check_generate(def_ref_depth=-1, param_ref=True, resp_ref=True)
+
+    def test_generate_with_dedup(self):
+        self.check_generate(def_dedup=True, param_dedup=True, resp_dedup=True)
+
+    def test_generate_with_cached_fragments(self):
+        class CachingSwagger(CorniceSwagger):
+            cache_fragments = True
+
+        swagger = CachingSwagger(self.services, param_ref=True)
+        expected = CorniceSwagger(self.services, param_ref=True).generate()
+        specs = self.run_concurrently(lambda index: swagger.generate())
+        self.assertEqual(specs, [[expected] * self.calls] * self.threads)
+
+    def test_generate_with_workers(self):
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1)
+        expected = CorniceSwagger(self.services, def_ref_depth=-1).generate()
+        specs = self.run_concurrently(lambda index: swagger.generate(workers=2))
+        self.assertEqual(specs, [[expected] * self.calls] * self.threads)
+
+    def test_iterencode(self):
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True)
+        expected = "".join(
+            CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True).iterencode()
+        )
+        specs = self.run_concurrently(lambda index: "".join(swagger.iterencode()))
+        self.assertEqual(specs, [[expected] * self.calls] * self.threads)
+
+    def test_applications_are_isolated(self):
+        sorbet = Service("Sorbet", "/sorbet")
+        sorbet.add_view(
+            "PUT", get_sorbet, validators=(colander_body_validator,), schema=BodySchema()
+        )
+        generators = [
+            CorniceSwagger(self.services, def_ref_depth=-1),
+            CorniceSwagger([sorbet], def_ref_depth=-1),
+        ]
+        expected = [generator.generate() for generator in generators]
+        specs = self.run_concurrently(lambda index: generators[index % 2].generate())
+        for index, results in enumerate(specs):
+            self.assertEqual(results, [expected[index % 2]] * self.calls)
+
+    def test_registries_of_the_last_call_are_kept(self):
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1)
+        spec = swagger.generate()
+        registries = list(swagger.iter_registries())
+        self.assertEqual(
+            registries,
+            [("definitions", name, value) for name, value in spec["definitions"].items()],
+        )
+        registry = swagger.definitions.definition_registry
+        self.run_concurrently(lambda index: swagger.generate())
+        self.assertIsNot(swagger.definitions.definition_registry, registry)
+        self.assertEqual(list(swagger.iter_registries()), registries)
+        "".join(swagger.iterencode())
+        self.assertEqual(list(swagger.iter_registries()), registries)
+
+    def test_default_handlers_are_not_shared(self):
+        parameters = swagger_module.ParameterHandler()
+        other = swagger_module.ParameterHandler()
+        self.assertIsNot(parameters.definitions, other.definitions)
+        self.assertIs(parameters.definitions.type_converter, parameters.type_converter)
+        self.assertIs(parameters.parameter_converter.definition_handler, parameters.type_converter)
+        responses = swagger_module.ResponseHandler()
+        self.assertIsNot(responses.definitions, parameters.definitions)
+        self.assertIsNot(
+            swagger_module.DefinitionHandler().type_converter,
+            swagger_module.DefinitionHandler().type_converter,
+        )
+
+
+class AsyncGenerationTest(unittest.TestCase):
+    def setUp(self):
+        self.services = []
+        for i in range(6):
+            service = Service("IceCream%d" % i, "/icecream%d/{flavour}" % i)
+            service.add_view(
+                "GET",
+                get_sorbet,
+                validators=(colander_validator,),
+                schema=GetRequestSchema(),
+                response_schemas=response_schemas,
+            )
+            self.services.append(service)
+
+    def run_with_ticker(self, coroutine):
+        """Run a coroutine along with a task counting the loop iterations."""
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def main():
+            ticker = asyncio.ensure_future(tick())
+            try:
+                return await coroutine
+            finally:
+                ticker.cancel()
+
+        return asyncio.run(main()), len(ticks)
+
+    def test_same_document_as_generate(self):
+        swagger = CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True)
+        spec = asyncio.run(swagger.agenerate("IceCreamAPI", "4.2", info={"description": "Yum"}))
+        expected = CorniceSwagger(self.services, def_ref_depth=-1, param_ref=True).generate(
+            "IceCreamAPI", "4.2", info={"description": "Yum"}
+        )
+        self.assertEqual(spec, expected)
+
+    def test_same_document_as_generate_with_dedup(self):
+        kwargs = dict(def_dedup=True, param_dedup=True, resp_dedup=True)
+        swagger = CorniceSwagger(self.services, **kwargs)
+        spec = asyncio.run(swagger.agenerate())
+        expected_swagger = CorniceSwagger(self.services, **kwargs)
+        self.assertEqual(spec, expected_swagger.generate())
+        self.assertEqual(swagger.dedup_report, expected_swagger.dedup_report)
+        self.assertEqual(list(swagger.iter_registries()), list(expected_swagger.iter_registries()))
+
+    def test_yields_between_services(self):
+        swagger = CorniceSwagger(self.services)
+        _, ticks = self.run_with_ticker(swagger.agenerate())
+        self.assertGreaterEqual(ticks, len(self.services))
+
+    def test_yields_between_batches(self):
+        swagger = CorniceSwagger(self.services)
+        _, ticks = self.run_with_ticker(swagger.agenerate(batch=3))
+        self.assertLess(ticks, len(self.services))
+        self.assertGreaterEqual(ticks, 2)
+
+    def test_stats(self):
+        stats = GenerationStats()
+        swagger = CorniceSwagger(self.services)
+        spec = asyncio.run(swagger.agenerate(stats=stats))
+        self.assertEqual(spec, CorniceSwagger(self.services).generate())
+        self.assertEqual(stats.counts["services"], len(self.services))
+        self.assertEqual(stats.counts["services_converted"], len(self.services))
+        self.assertIn("operations", stats.phases)
+        self.assertGreater(stats.total, 0)
+
+    def test_profiler(self):
+        profiler = CostProfiler()
+        stats = GenerationStats()
+        swagger = CorniceSwagger(self.services)
+        asyncio.run(swagger.agenerate(stats=stats, profiler=profiler))
+        operations = profiler.top(kind="operations", by="calls")
+        self.assertEqual(len(operations), len(self.services))
+        self.assertEqual(stats.counts["operations"], len(self.services))
+
+    def test_workers_are_rejected(self):
+        swagger = CorniceSwagger(self.services)
+        with self.assertRaises(CorniceSwaggerException):
+            asyncio.run(swagger.agenerate(workers=2))
+        with self.assertRaises(CorniceSwaggerException):
+            asyncio.run(swagger.agenerate(pool="process"))
+
+    def test_cancellation_leaves_generator_unchanged(self):
+        class CachingSwagger(CorniceSwagger):
+            cache_fragments = True
+
+        swagger = CachingSwagger(self.services, param_ref=True)
+
+        async def cancel():
+            task = asyncio.ensure_future(swagger.agenerate())
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cancel())
+        self.assertEqual(swagger._fragments, {})
+        self.assertIsNone(swagger.dedup_report)
+        self.assertEqual(list(swagger.iter_registries()), [])
+        expected = CorniceSwagger(self.services, param_ref=True).generate()
+        self.assertEqual(swagger.generate(), expected)
+        self.assertEqual(len(swagger._fragments), len(self.services))
+
+
 class ExtractContentTypesTest(unittest.TestCase):
     def test_default_renderer(self):
         service = Service("IceCream", "/icecream/{flavour}")
@@ -345,6 +880,74 @@ class ExtractTransformSchemaTest(unittest.TestCase):
         # ensure service schema is left untouched
         self.assertNotIn("header", service_args["schema"])
 
+    def test_transformed_schemas_are_cached(self):
+        swagger = CorniceSwagger([self.service])
+        service_args = dict(schema=BodySchema, validators=(colander_body_validator,))
+        full_schema = swagger._extract_transform_colander_schema(service_args)
+        self.assertIs(swagger._extract_transform_colander_schema(service_args), full_schema)
+        other_args = dict(schema=BodySchema, validators=(colander_validator,))
+        self.assertIsNot(swagger._extract_transform_colander_schema(other_args), full_schema)
+
+    def test_transformed_schemas_cache_is_bounded(self):
+        swagger = CorniceSwagger([self.service])
+        swagger.transformed_schemas_cache_size = 2
+        schemas = [BodySchema() for _ in range(3)]
+        first = swagger._extract_transform_colander_schema(dict(schema=schemas[0]))
+        swagger._extract_transform_colander_schema(dict(schema=schemas[1]))
+        # the first schema is used again, the second is the least recently used
+        self.assertIs(swagger._extract_transform_colander_schema(dict(schema=schemas[0])), first)
+        swagger._extract_transform_colander_schema(dict(schema=schemas[2]))
+        self.assertEqual(len(swagger._transformed_schemas), 2)
+        self.assertIs(swagger._extract_transform_colander_schema(dict(schema=schemas[0])), first)
+
+    def test_transformers_args_keys_are_cached(self):
+        swagger = CorniceSwagger([self.service])
+
+        def content_type_transform(schema, args):
+            schema.description = args.get("content_type")
+            return schema
+
+        content_type_transform.args_keys = ("content_type",)
+        swagger.schema_transformers = [content_type_transform]
+        json_schema = swagger._extract_transform_colander_schema(
+            dict(schema=BodySchema, content_type="application/json")
+        )
+        xml_schema = swagger._extract_transform_colander_schema(
+            dict(schema=BodySchema, content_type="text/xml")
+        )
+        self.assertEqual(json_schema.description, "application/json")
+        self.assertEqual(xml_schema.description, "text/xml")
+
+    def test_non_mutating_transformers_skip_clone(self):
+        swagger = CorniceSwagger([self.service])
+        schema = BodySchema()
+        service_args = dict(schema=schema, validators=(colander_body_validator,))
+        with mock.patch.object(schema, "clone") as clone:
+            full_schema = swagger._extract_transform_colander_schema(service_args)
+        clone.assert_not_called()
+        self.assertEqual(full_schema["body"].children, schema.children)
+        # the given schema is left untouched
+        self.assertEqual(schema.name, "")
+
+    def test_mutating_transformers_get_a_clone(self):
+        swagger = CorniceSwagger([self.service])
+        swagger.schema_transformers = [lambda schema, args: schema]
+        schema = BodySchema()
+        full_schema = swagger._extract_transform_colander_schema(dict(schema=schema))
+        self.assertIsNot(full_schema, schema)
+
+    def test_generation_leaves_schemas_untouched(self):
+        schema = PutRequestSchema()
+        self.service.add_view(
+            "PUT",
+            lambda request: None,
+            schema=schema,
+            response_schemas=response_schemas,
+        )
+        CorniceSwagger([self.service]).generate()
+        self.assertEqual(schema["body"].title, "Body")
+        self.assertEqual(response_schemas["200"]["body"].title, "Body")
+
 
 class ExtractTagsTest(unittest.TestCase):
     def test_service_defined_tags(self):